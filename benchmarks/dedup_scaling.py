@@ -0,0 +1,80 @@
+import argparse
+import json
+import time
+
+import numpy as np
+
+from engine.near_duplicates import exact_near_duplicates, find_near_duplicates
+from engine.vector_index import normalize_rows
+
+
+def synthetic_collection(n, dim=384, duplicate_fraction=0.1, noise=0.15, seed=0):
+    """Unit vectors around random topics, a `duplicate_fraction` of them slightly perturbed copies of others"""
+    rng = np.random.default_rng(seed)
+    topics = rng.standard_normal((max(n // 100, 1), dim))
+    vectors = topics[rng.integers(0, len(topics), n)] + rng.standard_normal((n, dim))
+    copies = rng.choice(n, int(n * duplicate_fraction), replace=False)
+    sources = rng.integers(0, n, len(copies))
+    vectors[copies] = vectors[sources] + noise * rng.standard_normal((len(copies), dim))
+    return normalize_rows(vectors)
+
+
+def measure(vectors, threshold, n_tables, exact):
+    start = time.perf_counter()
+    _, pairs = find_near_duplicates(vectors, threshold, n_tables=n_tables)
+    result = {'vectors': len(vectors), 'lsh_seconds': round(time.perf_counter() - start, 3), 'pairs': len(pairs)}
+    if exact:
+        start = time.perf_counter()
+        _, exact_pairs = exact_near_duplicates(vectors, threshold)
+        result['exact_seconds'] = round(time.perf_counter() - start, 3)
+        found = {tuple(pair) for pair in pairs.tolist()}
+        result['pair_recall'] = round(sum(tuple(pair) in found for pair in exact_pairs.tolist()) / max(len(exact_pairs), 1), 4)
+    return result
+
+
+def scaling_exponent(results, key):
+    """Slope of log(time) against log(N): about 1 for linear, 2 for quadratic growth"""
+    points = [(r['vectors'], r[key]) for r in results if r.get(key)]
+    if len(points) < 2:
+        return None
+    sizes, seconds = np.log(np.array(points)).T
+    return round(float(np.polyfit(sizes, seconds, 1)[0]), 2)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time LSH near-duplicate detection against all-pairs comparison as N grows")
+    parser.add_argument('--sizes', default='10000,20000,40000,80000,160000', help="Comma-separated collection sizes")
+    parser.add_argument('--exact-max', type=int, default=40000, help="Largest size also run with all-pairs comparison")
+    parser.add_argument('--threshold', type=float, default=0.9)
+    parser.add_argument('--tables', type=int, default=16)
+    parser.add_argument('--embeddings', help=".npy file of real embeddings to sample from instead of synthetic ones")
+    parser.add_argument('--output', help="Write the report as JSON to this file")
+    args = parser.parse_args()
+
+    sizes = [int(size) for size in args.sizes.split(',')]
+    if args.embeddings:
+        collection = normalize_rows(np.load(args.embeddings, mmap_mode='r')[:max(sizes)])
+    else:
+        collection = synthetic_collection(max(sizes))
+
+    results = []
+    for size in sizes:
+        result = measure(collection[:size], args.threshold, args.tables, exact=size <= args.exact_max)
+        print(json.dumps(result))
+        results.append(result)
+
+    report = {
+        'threshold': args.threshold,
+        'tables': args.tables,
+        'results': results,
+        'lsh_exponent': scaling_exponent(results, 'lsh_seconds'),
+        'exact_exponent': scaling_exponent(results, 'exact_seconds'),
+    }
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
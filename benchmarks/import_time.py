@@ -0,0 +1,72 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def import_times(module):
+    """Import `module` in a fresh interpreter, returns {imported module: (self ms, cumulative ms)}"""
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join([ROOT, os.path.join(ROOT, 'src')]))
+    process = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        cwd=ROOT, env=env, capture_output=True, text=True
+    )
+    if process.returncode:
+        raise SystemExit(f"Importing {module} failed:\n{process.stderr[-2000:]}")
+
+    times = {}
+    for line in process.stderr.splitlines():
+        # "import time: self [us] | cumulative | imported package", nesting shown by indentation
+        if not line.startswith('import time:') or 'imported package' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        times[name.strip()] = (int(self_us) / 1000, int(cumulative_us) / 1000)
+    return times
+
+
+def measure(module, repeats):
+    """Cold import time of `module` (best of `repeats` fresh interpreters) and its slowest imports"""
+    runs = [import_times(module) for _ in range(repeats)]
+    best = min(runs, key=lambda times: times[module][1])
+    return best[module][1], best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check the cold import time of the entry points against a budget")
+    parser.add_argument('--modules', default='app,nlp_engine', help="Comma-separated modules to import")
+    parser.add_argument('--budget-ms', type=float, default=float(os.environ.get('NLP_IMPORT_BUDGET_MS', 1500)),
+                        help="Maximum cold import time per module")
+    parser.add_argument('--repeats', type=int, default=3, help="Fresh interpreters per module, the fastest counts")
+    parser.add_argument('--top', type=int, default=15, help="Slowest imported modules to report")
+    parser.add_argument('--output', help="Write the report as JSON to this file")
+    args = parser.parse_args()
+
+    report = {'budget_ms': args.budget_ms, 'modules': {}}
+    over_budget = []
+    for module in args.modules.split(','):
+        total_ms, times = measure(module, args.repeats)
+        slowest = sorted(times.items(), key=lambda item: item[1][0], reverse=True)[:args.top]
+        report['modules'][module] = {
+            'import_ms': round(total_ms, 1),
+            'slowest': [{'module': name, 'self_ms': round(self_ms, 1), 'cumulative_ms': round(cumulative_ms, 1)}
+                        for name, (self_ms, cumulative_ms) in slowest],
+        }
+        status = 'ok' if total_ms <= args.budget_ms else 'OVER BUDGET'
+        print(f"{module}: {total_ms:.0f} ms ({status})", file=sys.stderr)
+        if total_ms > args.budget_ms:
+            over_budget.append(module)
+
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    if over_budget:
+        print(f"Import time budget of {args.budget_ms:.0f} ms exceeded by: {', '.join(over_budget)}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
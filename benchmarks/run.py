@@ -0,0 +1,240 @@
+import argparse
+import json
+import os
+import platform
+import random
+import resource
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from benchmarks.tiny_models import CORPUS
+
+# Words the synthetic inputs are drawn from
+WORDS = [word.strip('.,$').lower() for line in CORPUS for word in line.split()]
+
+QUESTION = "What is the city known for?"
+
+
+def make_text(words, rng):
+    """Return a synthetic text of `words` words, split into sentences of about 12 words"""
+    tokens = [rng.choice(WORDS) for _ in range(words)]
+    sentences = [' '.join(tokens[i:i + 12]).capitalize() + '.' for i in range(0, len(tokens), 12)]
+    return ' '.join(sentences)
+
+
+def _consume_stream(engine, prompt, max_length):
+    with engine.stream_text(prompt, max_length=max_length) as stream:
+        return ''.join(stream)
+
+
+# Task -> (single-input call, batch call). Batch calls take a list of inputs, a
+# task without one is always run one input per call.
+TASKS = {
+    'sentiment': (
+        lambda engine, text, words: engine.analyze_sentiment(text),
+        lambda engine, texts, words: engine.analyze_sentiment_batch(texts, batch_size=len(texts)),
+    ),
+    'summarize': (
+        lambda engine, text, words: engine.summarize_text(text, max_length=60, min_length=10),
+        lambda engine, texts, words: engine.summarize_batch(texts, max_length=60, min_length=10, batch_size=len(texts)),
+    ),
+    'summarize_long': (
+        lambda engine, text, words: engine.summarize_long_text(text, max_length=60, min_length=10),
+        None,
+    ),
+    'summarize_compressed': (
+        lambda engine, text, words: engine.summarize_compressed_text(text, max_length=60, min_length=10),
+        None,
+    ),
+    'ner': (
+        lambda engine, text, words: engine.extract_entities(text),
+        lambda engine, texts, words: engine.extract_entities_batch(texts, batch_size=len(texts)),
+    ),
+    'ner_long': (
+        lambda engine, text, words: engine.extract_entities_long(text),
+        None,
+    ),
+    'qa': (
+        lambda engine, text, words: engine.answer_question(question=QUESTION, context=text),
+        lambda engine, texts, words: engine.answer_question_batch([QUESTION] * len(texts), texts, batch_size=len(texts)),
+    ),
+    'qa_long': (
+        lambda engine, text, words: engine.answer_question_long(question=QUESTION, context=text),
+        None,
+    ),
+    'generate': (
+        lambda engine, text, words: engine.generate_text(text, max_length=2 * words + 32),
+        lambda engine, texts, words: engine.generate_text_batch(texts, max_length=2 * words + 32, batch_size=len(texts)),
+    ),
+    'stream': (
+        lambda engine, text, words: _consume_stream(engine, text, max_length=2 * words + 32),
+        None,
+    ),
+    'embeddings': (
+        lambda engine, text, words: engine.get_embeddings(text),
+        lambda engine, texts, words: engine.get_embeddings(texts, batch_size=len(texts)),
+    ),
+}
+
+
+def peak_rss_bytes():
+    """Return the peak resident set size of this process so far"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def run_scenario(engine, task, words, batch_size, concurrency, requests):
+    """Time `requests` calls of `task`, with up to `concurrency` calls in flight at once.
+
+    Every call gets `batch_size` fresh inputs of `words` words, so caches never
+    turn a request into a lookup. Returns the latency percentiles (per call),
+    the throughput (inputs per second) and the peak RSS after the run.
+    """
+    single, batch = TASKS[task]
+    # Seeded per scenario: inputs are reproducible, but never repeated across scenarios
+    rng = random.Random(f"{task}/{words}/{batch_size}/{concurrency}")
+    # Warmup call, also loads the model
+    single(engine, make_text(words, rng), words)
+
+    inputs = [[make_text(words, rng) for _ in range(batch_size)] for _ in range(requests)]
+
+    def call(texts):
+        start = time.perf_counter()
+        if batch_size == 1:
+            single(engine, texts[0], words)
+        else:
+            batch(engine, texts, words)
+        return time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        latencies = list(pool.map(call, inputs))
+    wall = time.perf_counter() - start
+
+    latencies_ms = np.array(latencies) * 1000
+    return {
+        'task': task,
+        'words': words,
+        'batch_size': batch_size,
+        'concurrency': concurrency,
+        'requests': requests,
+        'p50_ms': round(float(np.percentile(latencies_ms, 50)), 2),
+        'p95_ms': round(float(np.percentile(latencies_ms, 95)), 2),
+        'p99_ms': round(float(np.percentile(latencies_ms, 99)), 2),
+        'items_per_sec': round(requests * batch_size / wall, 2),
+        'peak_rss_bytes': peak_rss_bytes(),
+    }
+
+
+def scenario_key(result):
+    return f"{result['task']}/words={result['words']}/batch={result['batch_size']}/concurrency={result['concurrency']}"
+
+
+def compare_to_baseline(results, baseline, tolerance=0.2):
+    """Return the scenarios that regressed by more than `tolerance` against a baseline report.
+
+    A scenario regresses when its p95 latency grows, or its throughput drops,
+    by more than `tolerance` (a fraction). Scenarios missing from the baseline
+    are ignored.
+    """
+    previous = {scenario_key(result): result for result in baseline['results']}
+    regressions = []
+    for result in results:
+        old = previous.get(scenario_key(result))
+        if old is None:
+            continue
+        if result['p95_ms'] > old['p95_ms'] * (1 + tolerance):
+            regressions.append({'scenario': scenario_key(result), 'metric': 'p95_ms', 'baseline': old['p95_ms'], 'current': result['p95_ms']})
+        if result['items_per_sec'] < old['items_per_sec'] * (1 - tolerance):
+            regressions.append({'scenario': scenario_key(result), 'metric': 'items_per_sec', 'baseline': old['items_per_sec'], 'current': result['items_per_sec']})
+    return regressions
+
+
+def _int_list(value):
+    return [int(item) for item in value.split(',')]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the NLPEngine tasks")
+    parser.add_argument('--tasks', default=','.join(TASKS), help="Comma-separated tasks to run")
+    parser.add_argument('--lengths', type=_int_list, default=[16, 128], help="Input lengths in words")
+    parser.add_argument('--batch-sizes', type=_int_list, default=[1, 8], help="Inputs per call")
+    parser.add_argument('--concurrency', type=_int_list, default=[1, 4], help="Calls in flight at once")
+    parser.add_argument('--requests', type=int, default=20, help="Timed calls per scenario")
+    parser.add_argument('--scheduler', action='store_true', help="Send the calls through the micro-batching scheduler")
+    parser.add_argument('--quantized', action='store_true', help="Use the int8 quantized CPU models")
+    parser.add_argument('--tiny', nargs='?', const=os.path.join(tempfile.gettempdir(), 'hf-ecosystem-tiny-models'),
+                        help="Run offline against tiny random models (built in this directory on first use)")
+    parser.add_argument('--output', help="Write the report as JSON to this file")
+    parser.add_argument('--baseline', help="Report to compare against, exits with status 1 on a regression")
+    parser.add_argument('--tolerance', type=float, default=0.2, help="Allowed regression as a fraction of the baseline")
+    args = parser.parse_args()
+
+    tasks = args.tasks.split(',')
+    unknown = [task for task in tasks if task not in TASKS]
+    if unknown:
+        parser.error(f"Unknown tasks: {', '.join(unknown)}")
+
+    model_ids = None
+    if args.tiny:
+        # Never reach for the hub, everything comes from the local tiny models
+        os.environ['HF_HUB_OFFLINE'] = '1'
+        os.environ['TRANSFORMERS_OFFLINE'] = '1'
+        from benchmarks.tiny_models import load_or_build_tiny_models
+        model_ids = load_or_build_tiny_models(args.tiny)
+
+    import torch
+    from nlp_engine import NLPEngine
+
+    engine = NLPEngine(device=-1, embedding_cache_dir=False, quantized=args.quantized, model_ids=model_ids)
+    if args.scheduler:
+        from engine.scheduler import MicroBatchScheduler
+        engine = MicroBatchScheduler(engine)
+
+    results = []
+    for task in tasks:
+        batch_sizes = args.batch_sizes if TASKS[task][1] else [1]
+        for words in args.lengths:
+            for batch_size in batch_sizes:
+                for concurrency in args.concurrency:
+                    result = run_scenario(engine, task, words, batch_size, concurrency, args.requests)
+                    print(f"{scenario_key(result)}: p50 {result['p50_ms']} ms, p95 {result['p95_ms']} ms, "
+                          f"{result['items_per_sec']} items/s", file=sys.stderr)
+                    results.append(result)
+
+    report = {
+        'environment': {
+            'python': platform.python_version(),
+            'torch': torch.__version__,
+            'torch_threads': torch.get_num_threads(),
+            'tiny_models': bool(args.tiny),
+            'quantized': args.quantized,
+            'scheduler': args.scheduler,
+        },
+        'results': results,
+    }
+
+    regressions = []
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare_to_baseline(results, json.load(f), args.tolerance)
+        report['regressions'] = regressions
+
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    if args.scheduler:
+        engine.shutdown()
+    if regressions:
+        print(f"{len(regressions)} regression(s) against {args.baseline}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+import json
+import os
+import string
+
+# Text the tiny tokenizers are trained on, also the word pool of the benchmark inputs
+CORPUS = [
+    "The Hugging Face ecosystem provides a wide array of tools and models for natural language processing.",
+    "Apple Inc. is looking at buying U.K. startup for $1 billion. Tim Cook is the CEO. The meeting is in New York.",
+    "The capital of France is Paris. It is known for the Eiffel Tower and the Louvre Museum.",
+    "In a world powered by AI, the weather is sunny today and I enjoy walking in the park.",
+    "This movie was absolutely terrible. The acting was poor and the plot made no sense.",
+    "The city council voted to approve the development project after a long debate about traffic, jobs, parks and small businesses.",
+    "The concert was amazing, the band played for hours and the crowd in London was so energetic.",
+]
+
+NER_LABELS = ['O', 'B-MISC', 'I-MISC', 'B-PER', 'I-PER', 'B-ORG', 'I-ORG', 'B-LOC', 'I-LOC']
+
+
+def build_tiny_models(out_dir, seed=0):
+    """Save tiny randomly initialized models with the same architectures as the engine's models.
+
+    Every model (DistilBERT sentiment, BART summarizer, BERT NER, RoBERTa QA,
+    GPT-2 generator with its draft and a MiniLM-style BERT sentence model) is built from a
+    small config and a tokenizer trained on a handful of sentences, so the whole
+    engine can be exercised offline in seconds. The outputs are meaningless, only
+    the code paths and relative costs are realistic.
+
+    Returns {model name: local path}, also written to `out_dir/models.json`.
+    """
+    import torch
+    from sentence_transformers import SentenceTransformer, models
+    from tokenizers import ByteLevelBPETokenizer
+    from transformers import (
+        BartConfig, BartForConditionalGeneration, BartTokenizerFast,
+        BertConfig, BertForTokenClassification, BertModel, BertTokenizerFast,
+        DistilBertConfig, DistilBertForSequenceClassification, DistilBertTokenizerFast,
+        GPT2Config, GPT2LMHeadModel, GPT2TokenizerFast,
+        RobertaConfig, RobertaForQuestionAnswering, RobertaTokenizerFast,
+    )
+
+    torch.manual_seed(seed)
+    os.makedirs(out_dir, exist_ok=True)
+
+    # Byte-level BPE vocabulary for BART, RoBERTa and GPT-2
+    bpe_dir = os.path.join(out_dir, '_bpe')
+    os.makedirs(bpe_dir, exist_ok=True)
+    bpe = ByteLevelBPETokenizer()
+    bpe.train_from_iterator(
+        CORPUS * 10,
+        vocab_size=1000,
+        min_frequency=1,
+        special_tokens=['<s>', '<pad>', '</s>', '<unk>', '<mask>', '<|endoftext|>']
+    )
+    bpe.save_model(bpe_dir)
+    vocab_file = os.path.join(bpe_dir, 'vocab.json')
+    merges_file = os.path.join(bpe_dir, 'merges.txt')
+
+    # WordPiece vocabulary for the BERT family
+    words = sorted({word.strip(string.punctuation).lower() for line in CORPUS for word in line.split()} - {''})
+    chars = list(string.ascii_lowercase + string.digits + string.punctuation)
+    wordpiece_vocab = ['[PAD]', '[UNK]', '[CLS]', '[SEP]', '[MASK]'] + chars + ['##' + c for c in chars] + words
+    vocab_txt = os.path.join(out_dir, '_vocab.txt')
+    with open(vocab_txt, 'w') as f:
+        f.write('\n'.join(wordpiece_vocab))
+
+    small_bert = dict(hidden_size=32, num_hidden_layers=2, num_attention_heads=2, intermediate_size=64, max_position_embeddings=512)
+
+    def save(name, model, tokenizer):
+        path = os.path.join(out_dir, name)
+        model.save_pretrained(path)
+        tokenizer.save_pretrained(path)
+        return path
+
+    def bert_tokenizer():
+        return BertTokenizerFast(vocab_file=vocab_txt, do_lower_case=True, model_max_length=512)
+
+    paths = {}
+
+    config = DistilBertConfig(
+        vocab_size=len(wordpiece_vocab), dim=32, n_layers=2, n_heads=2, hidden_dim=64,
+        id2label={0: 'NEGATIVE', 1: 'POSITIVE'}, label2id={'NEGATIVE': 0, 'POSITIVE': 1}
+    )
+    paths['sentiment'] = save(
+        'sentiment',
+        DistilBertForSequenceClassification(config),
+        DistilBertTokenizerFast(vocab_file=vocab_txt, do_lower_case=True, model_max_length=512)
+    )
+
+    tokenizer = BartTokenizerFast(vocab_file=vocab_file, merges_file=merges_file, model_max_length=1024)
+    config = BartConfig(
+        vocab_size=len(tokenizer), d_model=32, encoder_layers=1, decoder_layers=1,
+        encoder_attention_heads=2, decoder_attention_heads=2, encoder_ffn_dim=64, decoder_ffn_dim=64,
+        max_position_embeddings=1024, pad_token_id=tokenizer.pad_token_id, bos_token_id=tokenizer.bos_token_id,
+        eos_token_id=tokenizer.eos_token_id, decoder_start_token_id=tokenizer.eos_token_id,
+        forced_bos_token_id=tokenizer.bos_token_id, forced_eos_token_id=tokenizer.eos_token_id
+    )
+    paths['summarizer'] = save('summarizer', BartForConditionalGeneration(config), tokenizer)
+
+    config = BertConfig(
+        vocab_size=len(wordpiece_vocab),
+        id2label=dict(enumerate(NER_LABELS)), label2id={label: i for i, label in enumerate(NER_LABELS)},
+        **small_bert
+    )
+    paths['ner'] = save('ner', BertForTokenClassification(config), bert_tokenizer())
+
+    tokenizer = RobertaTokenizerFast(vocab_file=vocab_file, merges_file=merges_file, model_max_length=512)
+    config = RobertaConfig(
+        vocab_size=len(tokenizer), pad_token_id=tokenizer.pad_token_id,
+        **{**small_bert, 'max_position_embeddings': 514}
+    )
+    paths['qa'] = save('qa', RobertaForQuestionAnswering(config), tokenizer)
+
+    tokenizer = GPT2TokenizerFast(vocab_file=vocab_file, merges_file=merges_file, model_max_length=1024)
+    config = GPT2Config(
+        vocab_size=len(tokenizer), n_embd=32, n_layer=2, n_head=2, n_positions=1024,
+        bos_token_id=tokenizer.bos_token_id, eos_token_id=tokenizer.eos_token_id
+    )
+    generator = GPT2LMHeadModel(config)
+    paths['generator'] = save('generator', generator, tokenizer)
+    # The draft is the generator's first layer, so it agrees with it often enough for speculative decoding
+    config.n_layer = 1
+    draft = GPT2LMHeadModel(config)
+    draft.load_state_dict(generator.state_dict(), strict=False)
+    paths['draft_generator'] = save('draft_generator', draft, tokenizer)
+
+    config = BertConfig(vocab_size=len(wordpiece_vocab), **small_bert)
+    transformer = models.Transformer(save('_sentence_bert', BertModel(config), bert_tokenizer()), max_seq_length=256)
+    pooling = models.Pooling(transformer.get_word_embedding_dimension(), 'mean')
+    paths['sentence_model'] = os.path.join(out_dir, 'sentence_model')
+    SentenceTransformer(modules=[transformer, pooling, models.Normalize()]).save(paths['sentence_model'])
+
+    with open(os.path.join(out_dir, 'models.json'), 'w') as f:
+        json.dump(paths, f, indent=2)
+    return paths
+
+
+def load_or_build_tiny_models(out_dir):
+    """Return the paths of the tiny models in `out_dir`, building them the first time"""
+    manifest = os.path.join(out_dir, 'models.json')
+    if os.path.exists(manifest):
+        with open(manifest) as f:
+            return json.load(f)
+    return build_tiny_models(out_dir)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Build tiny random models with the engine's architectures")
+    parser.add_argument('out_dir')
+    args = parser.parse_args()
+    print(json.dumps(build_tiny_models(args.out_dir), indent=2))
@@ -0,0 +1,93 @@
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from concurrent.futures import wait
+
+from benchmarks.run import make_text
+from engine.worker_pool import METHOD_TASKS, WorkerPool, cpu_total
+
+# Task -> (batch method, arguments for a batch of texts)
+WORKLOADS = {
+    'sentiment': ('analyze_sentiment_batch', lambda texts: (texts,)),
+    'ner': ('extract_entities_batch', lambda texts: (texts,)),
+    'qa': ('answer_question_batch', lambda texts: (["What is the city known for?"] * len(texts), texts)),
+    'embeddings': ('get_embeddings', lambda texts: (texts,)),
+    'summarize': ('summarize_batch', lambda texts: (texts,)),
+}
+
+
+def measure(pool, task, requests, batch_size, words, seed):
+    """Submit every request at once and return the throughput in items per second"""
+    method, make_args = WORKLOADS[task]
+    rng = random.Random(seed)
+    batches = [[make_text(words, rng) for _ in range(batch_size)] for _ in range(requests)]
+
+    # Warm every worker up (the first call loads the model)
+    wait([pool.submit(method, *make_args([make_text(words, rng)])) for _ in range(len(pool.stats()) * 2)])
+
+    start = time.perf_counter()
+    futures = [pool.submit(method, *make_args(batch)) for batch in batches]
+    for future in futures:
+        future.result()
+    return requests * batch_size / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure throughput of the worker pool from 1 to N workers")
+    parser.add_argument('--task', choices=list(WORKLOADS), default='sentiment')
+    parser.add_argument('--max-workers', type=int, default=cpu_total())
+    parser.add_argument('--requests', type=int, default=64, help="Batches submitted per measurement")
+    parser.add_argument('--batch-size', type=int, default=8)
+    parser.add_argument('--words', type=int, default=64, help="Words per input")
+    parser.add_argument('--inter-op-threads', type=int, default=1)
+    parser.add_argument('--no-affinity', action='store_true', help="Don't pin workers to CPUs")
+    parser.add_argument('--tiny', nargs='?', const=os.path.join(tempfile.gettempdir(), 'hf-ecosystem-tiny-models'),
+                        help="Run offline against tiny random models")
+    parser.add_argument('--output', help="Write the report as JSON to this file")
+    args = parser.parse_args()
+
+    engine_kwargs = {'embedding_cache_dir': False}
+    if args.tiny:
+        os.environ['HF_HUB_OFFLINE'] = '1'
+        os.environ['TRANSFORMERS_OFFLINE'] = '1'
+        from benchmarks.tiny_models import load_or_build_tiny_models
+        engine_kwargs['model_ids'] = load_or_build_tiny_models(args.tiny)
+
+    task = METHOD_TASKS[WORKLOADS[args.task][0]]
+    results = []
+    for num_workers in range(1, args.max_workers + 1):
+        pool = WorkerPool(
+            num_workers,
+            worker_tasks=[[task]] * num_workers,
+            inter_op_threads=args.inter_op_threads,
+            cpu_affinity=None if args.no_affinity else 'auto',
+            engine_kwargs=engine_kwargs,
+        )
+        try:
+            throughput = measure(pool, args.task, args.requests, args.batch_size, args.words, seed=num_workers)
+            workers = pool.stats()
+        finally:
+            pool.shutdown()
+        result = {
+            'workers': num_workers,
+            'items_per_sec': round(throughput, 2),
+            'speedup': round(throughput / results[0]['items_per_sec'], 2) if results else 1.0,
+            'cpus': [worker['cpus'] for worker in workers],
+            'torch_threads': [worker['torch_threads'] for worker in workers],
+        }
+        print(f"{num_workers} worker(s): {result['items_per_sec']} items/s, speedup {result['speedup']}x", file=sys.stderr)
+        results.append(result)
+
+    report = {'task': args.task, 'batch_size': args.batch_size, 'words': args.words, 'results': results}
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
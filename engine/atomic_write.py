@@ -0,0 +1,29 @@
+import os
+import threading
+from contextlib import contextmanager
+
+
+@contextmanager
+def atomic_path(path, overwrite=True):
+    """Yield a temporary path to write `path` through, published only if the block succeeds.
+
+    The file is written next to its destination and then renamed over it, so a
+    crash can't leave a truncated file behind, and readers see either the old
+    file or the complete new one. With `overwrite=False` the file is published
+    with a hard link instead, which fails if another process published it first:
+    the existing file is kept, so every process ends up using the same one.
+    """
+    # Keep the extension, some writers (e.g. numpy) add theirs when it's missing
+    tmp_path = f"{path}.{os.getpid()}-{threading.get_ident()}.tmp{os.path.splitext(path)[1]}"
+    try:
+        yield tmp_path
+        if overwrite:
+            os.replace(tmp_path, path)
+        else:
+            try:
+                os.link(tmp_path, path)
+            except FileExistsError:
+                pass
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
@@ -0,0 +1,41 @@
+def token_lengths(tokenizer, texts):
+    """Return the number of tokens in each text (without special tokens or truncation)"""
+    encoded = tokenizer(list(texts), add_special_tokens=False, verbose=False)
+    return [len(ids) for ids in encoded['input_ids']]
+
+
+def length_buckets(lengths, batch_size, exact=False):
+    """Group item indices into batches of similar length, shortest first.
+
+    With `exact`, a batch only holds items of the same length, so nothing is padded.
+    """
+    order = sorted(range(len(lengths)), key=lambda i: lengths[i])
+    if not exact:
+        return [order[i:i + batch_size] for i in range(0, len(order), batch_size)]
+
+    buckets = []
+    for i in order:
+        if buckets and lengths[buckets[-1][-1]] == lengths[i] and len(buckets[-1]) < batch_size:
+            buckets[-1].append(i)
+        else:
+            buckets.append([i])
+    return buckets
+
+
+def run_bucketed(items, fn, lengths, batch_size, exact=False):
+    """Run `fn` over length-bucketed batches of `items` and return the results in input order.
+
+    Sorting by length before batching means each batch is only padded to the
+    longest item among similarly sized inputs instead of the longest overall.
+    `exact` batches only items of the same length, for models whose output
+    changes with padding. `fn` takes a list of items and returns one result per item.
+    """
+    items = list(items)
+    results = [None] * len(items)
+    for indices in length_buckets(lengths, max(1, batch_size), exact):
+        batch_results = fn([items[i] for i in indices])
+        if len(batch_results) != len(indices):
+            raise ValueError(f"Expected {len(indices)} results from batch, got {len(batch_results)}")
+        for i, result in zip(indices, batch_results):
+            results[i] = result
+    return results
@@ -0,0 +1,312 @@
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from itertools import islice
+
+from engine.atomic_write import atomic_path
+
+# Task -> (input fields, function running a batch through the engine)
+TASKS = {
+    'sentiment': (['text'], lambda engine, columns, args: [
+        result[0] for result in engine.analyze_sentiment_batch(columns[0], batch_size=args.batch_size)
+    ]),
+    'ner': (['text'], lambda engine, columns, args: engine.extract_entities_batch(columns[0], batch_size=args.batch_size)),
+    'qa': (['question', 'context'], lambda engine, columns, args: engine.answer_question_batch(
+        columns[0], columns[1], batch_size=args.batch_size
+    )),
+    'summarize': (['text'], lambda engine, columns, args: [
+        result[0] for result in engine.summarize_batch(
+            columns[0], max_length=args.max_length, min_length=args.min_length, batch_size=args.batch_size
+        )
+    ]),
+    'embeddings': (['text'], lambda engine, columns, args: engine.get_embeddings(columns[0], batch_size=args.batch_size).tolist()),
+}
+
+
+def read_records(path, input_format=None):
+    """Yield the records of a JSONL or CSV file one at a time, as dicts"""
+    input_format = input_format or ('csv' if path.endswith('.csv') else 'jsonl')
+    with open(path, newline='' if input_format == 'csv' else None, encoding='utf-8') as f:
+        if input_format == 'csv':
+            yield from csv.DictReader(f)
+        else:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+
+def count_records(path, input_format=None):
+    return sum(1 for _ in read_records(path, input_format))
+
+
+def read_texts(path, field='text'):
+    """Texts from a plain text file (one per line), or from the `field` of a JSONL or CSV file"""
+    if path.endswith('.txt'):
+        with open(path, encoding='utf-8') as f:
+            return [line.strip() for line in f if line.strip()]
+    return [record[field] for record in read_records(path)]
+
+
+def read_chunks(records, chunk_size):
+    """Group records into numbered chunks of `chunk_size`, only one chunk is held at a time"""
+    records = iter(records)
+    chunk_id = 0
+    while True:
+        chunk = list(islice(records, chunk_size))
+        if not chunk:
+            return
+        yield chunk_id, chunk
+        chunk_id += 1
+
+
+def _jsonable(value):
+    # Pipelines return numpy scalars for scores
+    return value.item() if hasattr(value, 'item') else str(value)
+
+
+class Checkpoint:
+    """Which chunks of the input are already in the output, and how many output bytes they take.
+
+    Chunks below `completed_below` are all done, plus the ones in `completed`
+    (chunks can finish out of order with unordered output). On resume the output
+    is truncated to `output_bytes`, dropping anything written after the last
+    checkpoint, and the completed chunks are skipped.
+    """
+
+    def __init__(self, path, job):
+        self.path = path
+        self.job = job
+        self.completed_below = 0
+        self.completed = set()
+        self.output_bytes = 0
+        self.records = 0
+        self.errors = 0
+
+    @classmethod
+    def load(cls, path, job):
+        checkpoint = cls(path, job)
+        if not os.path.exists(path):
+            return checkpoint
+        with open(path) as f:
+            state = json.load(f)
+        if state['job'] != job:
+            raise SystemExit(f"Checkpoint {path} belongs to another job ({state['job']}), remove it to start over")
+        checkpoint.completed_below = state['completed_below']
+        checkpoint.completed = set(state['completed'])
+        checkpoint.output_bytes = state['output_bytes']
+        checkpoint.records = state['records']
+        checkpoint.errors = state['errors']
+        return checkpoint
+
+    def is_done(self, chunk_id):
+        return chunk_id < self.completed_below or chunk_id in self.completed
+
+    def mark_done(self, chunk_id, records, errors):
+        self.completed.add(chunk_id)
+        while self.completed_below in self.completed:
+            self.completed.remove(self.completed_below)
+            self.completed_below += 1
+        self.records += records
+        self.errors += errors
+
+    def save(self, output_bytes):
+        self.output_bytes = output_bytes
+        state = {
+            'job': self.job,
+            'completed_below': self.completed_below,
+            'completed': sorted(self.completed),
+            'output_bytes': self.output_bytes,
+            'records': self.records,
+            'errors': self.errors,
+        }
+        with atomic_path(self.path) as tmp_path, open(tmp_path, 'w') as f:
+            json.dump(state, f)
+
+
+class Progress:
+    """Throughput and ETA readout on stderr, refreshed at most every `interval` seconds"""
+
+    def __init__(self, total=None, already_done=0, interval=1.0):
+        self.total = total
+        self.done = already_done
+        self.processed = 0
+        self.start = time.perf_counter()
+        self.interval = interval
+        self._last = 0
+
+    def update(self, records, force=False):
+        self.done += records
+        self.processed += records
+        now = time.perf_counter()
+        if not force and now - self._last < self.interval:
+            return
+        self._last = now
+        rate = self.processed / max(now - self.start, 1e-9)
+        line = f"\r{self.done:,} records, {rate:,.1f} records/s"
+        if self.total:
+            remaining = max(self.total - self.done, 0)
+            eta = time.strftime('%H:%M:%S', time.gmtime(remaining / rate)) if rate else '--:--:--'
+            line += f", {self.done / self.total:.1%}, ETA {eta}"
+        # Pad so a shorter line fully overwrites the previous one
+        print(line.ljust(80), end='', file=sys.stderr, flush=True)
+
+
+def process_chunk(engine, task, chunk_id, chunk, args):
+    """Run one chunk through the engine, returns (chunk_id, output lines, errors)"""
+    fields, run = TASKS[task]
+    first_index = chunk_id * args.chunk_size
+    outputs = [{'index': first_index + i} for i in range(len(chunk))]
+    for output, record in zip(outputs, chunk):
+        if args.id_field:
+            output['id'] = record.get(args.id_field)
+
+    # Records missing an input field are reported, not sent to the model
+    valid = [i for i, record in enumerate(chunk) if all(isinstance(record.get(args.fields[name]), str) for name in fields)]
+    for i in set(range(len(chunk))) - set(valid):
+        outputs[i]['error'] = f"Missing input field(s): {', '.join(args.fields[name] for name in fields)}"
+
+    def run_records(indices):
+        columns = [[chunk[i][args.fields[name]] for i in indices] for name in fields]
+        return run(engine, columns, args)
+
+    if valid:
+        try:
+            results = run_records(valid)
+        except Exception:
+            # One bad record shouldn't fail the whole chunk, retry them one by one
+            results = []
+            for i in valid:
+                try:
+                    results.append(run_records([i])[0])
+                except Exception as e:
+                    results.append(e)
+        for i, result in zip(valid, results):
+            if isinstance(result, Exception):
+                outputs[i]['error'] = f"{type(result).__name__}: {result}"
+            else:
+                outputs[i]['result'] = result
+
+    lines = ''.join(json.dumps(output, default=_jsonable) + '\n' for output in outputs)
+    return chunk_id, lines, sum('error' in output for output in outputs)
+
+
+def run_bulk(engine, task, input_path, output_path, args):
+    """Stream `input_path` through `task` into `output_path` (JSONL), resuming from a checkpoint if there is one"""
+    checkpoint_path = args.checkpoint or output_path + '.checkpoint'
+    # Everything that changes the output, so a checkpoint is only resumed by the same job on the same input
+    input_stat = os.stat(input_path)
+    job = {
+        'task': task,
+        'input': os.path.abspath(input_path),
+        'input_size': input_stat.st_size,
+        'input_mtime': input_stat.st_mtime,
+        'input_format': args.input_format,
+        'chunk_size': args.chunk_size,
+        'text_field': args.text_field,
+        'question_field': args.question_field,
+        'context_field': args.context_field,
+        'id_field': args.id_field,
+        'max_length': args.max_length,
+        'min_length': args.min_length,
+        # The engine's effective settings, which also come from the environment (NLP_QUANTIZE,
+        # NLP_SENTIMENT_CASCADE, ...), not just the flags
+        'quantized': engine.quantized,
+        'sentiment_cascade': engine.sentiment_cascade.cache_id if engine.sentiment_cascade else None,
+        'model_ids': engine.model_ids,
+    }
+    checkpoint = Checkpoint.load(checkpoint_path, job)
+    if checkpoint.records:
+        print(f"Resuming after {checkpoint.records:,} records", file=sys.stderr)
+
+    total = None if args.no_count else count_records(input_path, args.input_format)
+    progress = Progress(total, already_done=checkpoint.records)
+
+    # Binary mode, so tell() and truncate() work on byte offsets
+    mode = 'r+b' if checkpoint.records and os.path.exists(output_path) else 'wb'
+    with open(output_path, mode) as output, ThreadPoolExecutor(max_workers=args.workers) as pool:
+        # Drop whatever was written after the last checkpoint
+        output.truncate(checkpoint.output_bytes)
+        output.seek(checkpoint.output_bytes)
+
+        pending = deque()  # Futures in submission order
+        chunks_since_checkpoint = 0
+
+        def write(chunk_id, lines, errors):
+            nonlocal chunks_since_checkpoint
+            output.write(lines.encode('utf-8'))
+            records = lines.count('\n')
+            checkpoint.mark_done(chunk_id, records, errors)
+            progress.update(records)
+            chunks_since_checkpoint += 1
+            if chunks_since_checkpoint >= args.checkpoint_every:
+                output.flush()
+                os.fsync(output.fileno())
+                checkpoint.save(output.tell())
+                chunks_since_checkpoint = 0
+
+        def drain(block_until):
+            # Keep at most `block_until` chunks in flight, so memory stays bounded
+            while len(pending) > block_until:
+                if args.unordered:
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        pending.remove(future)
+                        write(*future.result())
+                else:
+                    write(*pending.popleft().result())
+
+        records = read_records(input_path, args.input_format)
+        for chunk_id, chunk in read_chunks(records, args.chunk_size):
+            if checkpoint.is_done(chunk_id):
+                continue
+            pending.append(pool.submit(process_chunk, engine, task, chunk_id, chunk, args))
+            drain(args.workers)
+        drain(0)
+
+        output.flush()
+        os.fsync(output.fileno())
+        checkpoint.save(output.tell())
+
+    progress.update(0, force=True)
+    print(file=sys.stderr)
+    return {'records': checkpoint.records, 'errors': checkpoint.errors, 'seconds': round(time.perf_counter() - progress.start, 2)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run an NLP task over a JSONL or CSV file, writing JSONL results")
+    parser.add_argument('task', choices=list(TASKS))
+    parser.add_argument('input', help="JSONL or CSV file with one record per line/row")
+    parser.add_argument('output', help="JSONL file receiving {index, id, result or error} per record")
+    parser.add_argument('--input-format', choices=['jsonl', 'csv'], help="Default: from the file extension")
+    parser.add_argument('--text-field', default='text')
+    parser.add_argument('--question-field', default='question')
+    parser.add_argument('--context-field', default='context')
+    parser.add_argument('--id-field', help="Copy this field of each record to the output")
+    parser.add_argument('--batch-size', type=int, default=32, help="Inputs per forward pass")
+    parser.add_argument('--chunk-size', type=int, default=512, help="Records read and processed together")
+    parser.add_argument('--workers', type=int, default=1, help="Chunks processed concurrently")
+    parser.add_argument('--unordered', action='store_true', help="Write chunks as they finish instead of in input order")
+    parser.add_argument('--checkpoint', help="Checkpoint file (default: OUTPUT.checkpoint)")
+    parser.add_argument('--checkpoint-every', type=int, default=10, help="Chunks between checkpoints")
+    parser.add_argument('--no-count', action='store_true', help="Don't count the input records first (no ETA)")
+    parser.add_argument('--max-length', type=int, default=150, help="Summary length (summarize)")
+    parser.add_argument('--min-length', type=int, default=30, help="Summary length (summarize)")
+    parser.add_argument('--quantized', action='store_true', help="Use the int8 quantized CPU models")
+    args = parser.parse_args()
+    args.fields = {'text': args.text_field, 'question': args.question_field, 'context': args.context_field}
+
+    import torch
+    from nlp_engine import NLPEngine
+
+    engine = NLPEngine(device=0 if torch.cuda.is_available() else -1, quantized=args.quantized or None)
+    summary = run_bulk(engine, args.task, args.input, args.output, args)
+    print(json.dumps(summary))
+
+
+if __name__ == "__main__":
+    main()
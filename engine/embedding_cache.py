@@ -0,0 +1,170 @@
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows, appends are only guarded within the process
+    fcntl = None
+
+
+def normalize_text(text):
+    """Collapse whitespace so trivially different copies of a text share a cache entry"""
+    return " ".join(text.split())
+
+
+class EmbeddingCache:
+    """Content-addressed cache of sentence embeddings.
+
+    Entries are keyed by a hash of (model name, normalized text). Recently used
+    vectors are kept in an in-memory LRU; every vector is also appended to a
+    float32 matrix on disk that is memory-mapped on read, so the cache survives
+    restarts and large corpora don't have to fit in RAM.
+
+    On-disk layout (one directory per model):
+        vectors.f32   row-major float32 matrix, one row per entry
+        keys.txt      hex key of each row, one per line, in row order
+        meta.json     {"model": ..., "dim": ...}
+    """
+
+    def __init__(self, model_name, cache_dir=None, max_memory_items=20000):
+        self.model_name = model_name
+        self.max_memory_items = max_memory_items
+        self.hits = 0
+        self.misses = 0
+
+        self._memory = OrderedDict()
+        self._rows = {}
+        self._dim = None
+        self._matrix = None
+        self._lock = threading.Lock()
+
+        self.path = None
+        if cache_dir:
+            safe_name = model_name.replace('/', '--')
+            self.path = os.path.join(cache_dir, safe_name)
+            os.makedirs(self.path, exist_ok=True)
+            self._load_index()
+
+    def key(self, text):
+        return hashlib.sha1(f"{self.model_name}\0{normalize_text(text)}".encode('utf-8')).hexdigest()
+
+    def get_many(self, keys):
+        """Return {key: vector} for the keys that are cached"""
+        found = {}
+        with self._lock:
+            for key in keys:
+                if key in found:
+                    continue
+                if key in self._memory:
+                    self._memory.move_to_end(key)
+                    found[key] = self._memory[key]
+                elif key in self._rows:
+                    vector = np.array(self._disk_matrix()[self._rows[key]])
+                    self._remember(key, vector)
+                    found[key] = vector
+            self.hits += sum(1 for key in keys if key in found)
+            self.misses += sum(1 for key in keys if key not in found)
+        return found
+
+    def put_many(self, keys, vectors):
+        """Store one vector per key in both tiers"""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        with self._lock:
+            for key, vector in zip(keys, vectors):
+                self._remember(key, vector)
+            if self.path:
+                self._append(keys, vectors)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'memory_items': len(self._memory),
+                'disk_items': len(self._rows),
+                'hits': self.hits,
+                'misses': self.misses,
+            }
+
+    def _remember(self, key, vector):
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_items:
+            self._memory.popitem(last=False)
+
+    def _load_index(self):
+        meta_path = os.path.join(self.path, 'meta.json')
+        if not os.path.exists(meta_path):
+            return
+        with open(meta_path) as f:
+            self._dim = json.load(f)['dim']
+
+        vectors_path = os.path.join(self.path, 'vectors.f32')
+        keys_path = os.path.join(self.path, 'keys.txt')
+        if not os.path.exists(vectors_path):
+            return
+        # Under the append lock, so no other process is halfway through writing an entry
+        with open(vectors_path, 'r+b') as vector_file:
+            if fcntl:
+                fcntl.flock(vector_file, fcntl.LOCK_EX)
+            try:
+                keys = []
+                if os.path.exists(keys_path):
+                    with open(keys_path) as f:
+                        content = f.read()
+                    # A key without its newline was cut off by a crash
+                    keys = content.split('\n')[:-1]
+                    keys = keys[:os.path.getsize(vectors_path) // (self._dim * 4)]
+                    if len(content) != sum(len(key) + 1 for key in keys):
+                        with open(keys_path, 'w') as f:
+                            f.write(''.join(f"{key}\n" for key in keys))
+                # Vectors are written before keys, so a crash can leave vector rows without a
+                # key: drop them, or the next append would give its keys the wrong rows
+                vector_file.truncate(len(keys) * self._dim * 4)
+            finally:
+                if fcntl:
+                    fcntl.flock(vector_file, fcntl.LOCK_UN)
+        self._rows = {key: row for row, key in enumerate(keys)}
+
+    def _disk_rows(self):
+        vectors_path = os.path.join(self.path, 'vectors.f32')
+        if not os.path.exists(vectors_path):
+            return 0
+        return os.path.getsize(vectors_path) // (self._dim * 4)
+
+    def _disk_matrix(self):
+        rows = self._disk_rows()
+        if self._matrix is None or self._matrix.shape[0] != rows:
+            self._matrix = np.memmap(os.path.join(self.path, 'vectors.f32'), dtype=np.float32, mode='r', shape=(rows, self._dim))
+        return self._matrix
+
+    def _append(self, keys, vectors):
+        new = list({key: vector for key, vector in zip(keys, vectors) if key not in self._rows}.items())
+        if not new:
+            return
+
+        if self._dim is None:
+            self._dim = vectors.shape[1]
+            with open(os.path.join(self.path, 'meta.json'), 'w') as f:
+                json.dump({'model': self.model_name, 'dim': self._dim}, f)
+
+        with open(os.path.join(self.path, 'vectors.f32'), 'ab') as vector_file, \
+                open(os.path.join(self.path, 'keys.txt'), 'a') as key_file:
+            if fcntl:
+                fcntl.flock(vector_file, fcntl.LOCK_EX)
+            try:
+                # Other processes may have appended too, so take the row number from the file size
+                start = vector_file.seek(0, os.SEEK_END) // (self._dim * 4)
+                vector_file.write(np.stack([vector for _, vector in new]).tobytes())
+                vector_file.flush()
+                key_file.write(''.join(f"{key}\n" for key, _ in new))
+                key_file.flush()
+            finally:
+                if fcntl:
+                    fcntl.flock(vector_file, fcntl.LOCK_UN)
+
+        for offset, (key, _) in enumerate(new):
+            self._rows[key] = start + offset
@@ -0,0 +1,75 @@
+import bisect
+
+
+def split_windows(text, tokenizer, window_tokens=400, overlap_tokens=64):
+    """Split `text` into overlapping windows of at most `window_tokens` tokens.
+
+    Windows start and end between whitespace-separated words, so no word is cut
+    in two. Returns (start, end) character offsets of each window in `text`.
+    """
+    offsets = tokenizer(text, add_special_tokens=False, return_offsets_mapping=True)['offset_mapping']
+    if len(offsets) <= window_tokens:
+        return [(0, len(text))] if offsets else []
+
+    # Token i starts a new word when there is whitespace between it and token i - 1
+    word_starts = [i for i in range(len(offsets)) if i == 0 or offsets[i][0] > offsets[i - 1][1]]
+    windows = []
+    first = 0
+    while True:
+        last = min(first + window_tokens, len(offsets))
+        if last < len(offsets):
+            # End before the word the limit falls in, unless the window holds a single word
+            boundary = word_starts[bisect.bisect_right(word_starts, last) - 1]
+            last = boundary if boundary > first else last
+        windows.append((first, last))
+        if last == len(offsets):
+            break
+        # The next window starts about `overlap_tokens` back, at a word start, and always moves forward
+        i = bisect.bisect_left(word_starts, max(last - overlap_tokens, first + 1))
+        first = min(word_starts[i], last) if i < len(word_starts) else last
+    return [(offsets[first][0], offsets[last - 1][1]) for first, last in windows]
+
+
+def merge_window_entities(windows, window_entities):
+    """Combine the entities found in overlapping windows into one list with offsets into the full text.
+
+    Entities found in more than one window, or overlapping each other, are
+    resolved in favour of the one that isn't cut off at a window edge, then the
+    one from the window whose half of the overlap it is in (where the model saw
+    the most context around it), then the longer span, then the higher score.
+    """
+    text_start, text_end = windows[0][0], windows[-1][1]
+    candidates = []
+    for i, ((start, end), entities) in enumerate(zip(windows, window_entities)):
+        # Characters closer to this window than to its neighbours
+        own_start = (windows[i - 1][1] + start) // 2 if i > 0 else text_start
+        own_end = (end + windows[i + 1][0]) // 2 if i + 1 < len(windows) else text_end
+        for entity in entities:
+            entity = {**entity, 'start': entity['start'] + start, 'end': entity['end'] + start}
+            cut = (entity['start'] == start and start > text_start) or (entity['end'] == end and end < text_end)
+            owned = own_start <= entity['start'] < own_end
+            candidates.append(((not cut, owned, entity['end'] - entity['start'], entity['score']), entity))
+
+    merged = []
+    for rank, entity in sorted(candidates, key=lambda c: (c[1]['start'], -c[1]['end'])):
+        if merged and entity['start'] < merged[-1][1]['end']:
+            if rank > merged[-1][0]:
+                merged[-1] = (rank, entity)
+            continue
+        merged.append((rank, entity))
+    return [entity for _, entity in merged]
+
+
+def extract_entities_long(engine, text, window_tokens=400, overlap_tokens=64, batch_size=8):
+    """Extract entities from a text longer than BERT's 512-token context.
+
+    The text is split into overlapping windows that run through the NER model as
+    one batch, and the entities are merged across window boundaries. `start`/`end`
+    are offsets into the original `text`, like the ones returned by `extract_entities`.
+    """
+    with engine.models.use('ner') as ner:
+        windows = split_windows(text, ner.tokenizer, window_tokens, overlap_tokens)
+        if len(windows) <= 1:
+            return engine.extract_entities(text)
+        window_entities = engine.extract_entities_batch([text[start:end] for start, end in windows], batch_size=batch_size)
+    return merge_window_entities(windows, window_entities)
@@ -0,0 +1,90 @@
+import json
+import os
+
+import numpy as np
+
+from engine.vector_index import normalize_rows
+
+
+class MemmapExactIndex:
+    """Exact cosine top-k search over normalized embeddings stored in a memory-mapped file.
+
+    Only `block_size` rows are read at a time: each block is scored against all
+    queries with one matrix multiply and merged into a running top-k per query,
+    so memory use stays bounded by the block size no matter how large the corpus
+    is, and several queries share each pass over the data.
+
+    The matrix is stored at `path` (float32 or float16) with its shape and dtype
+    in `path + '.json'`. Row numbers are the ids returned by `search`.
+    """
+
+    def __init__(self, path, dim=None, dtype='float32', block_size=65536):
+        self.path = path
+        self.block_size = block_size
+        meta_path = path + '.json'
+
+        if os.path.exists(meta_path):
+            with open(meta_path) as f:
+                meta = json.load(f)
+            self.dim = meta['dim']
+            self.dtype = np.dtype(meta['dtype'])
+        else:
+            if dim is None:
+                raise ValueError(f"{path} doesn't exist yet, pass dim to create it")
+            self.dim = dim
+            self.dtype = np.dtype(dtype)
+            with open(meta_path, 'w') as f:
+                json.dump({'dim': self.dim, 'dtype': self.dtype.name}, f)
+            open(path, 'wb').close()
+
+    def __len__(self):
+        return os.path.getsize(self.path) // (self.dim * self.dtype.itemsize)
+
+    def add(self, vectors):
+        """Append normalized vectors, returns their row ids"""
+        start = len(self)
+        vectors = normalize_rows(vectors).astype(self.dtype)
+        with open(self.path, 'ab') as f:
+            f.write(vectors.tobytes())
+        return np.arange(start, start + len(vectors))
+
+    def matrix(self):
+        """Return the stored embeddings as a read-only memory map"""
+        return np.memmap(self.path, dtype=self.dtype, mode='r', shape=(len(self), self.dim))
+
+    def search(self, queries, k=10, block_size=None):
+        """Return (scores, ids), each of shape (n_queries, k), best match first.
+
+        Missing results (fewer than k stored vectors) have id -1.
+        """
+        queries = normalize_rows(queries)
+        block_size = block_size or self.block_size
+        n_queries = len(queries)
+
+        best_scores = np.full((n_queries, k), -np.inf, dtype=np.float32)
+        best_ids = np.full((n_queries, k), -1, dtype=np.int64)
+        if len(self) == 0:
+            return best_scores, best_ids
+
+        matrix = self.matrix()
+        for start in range(0, len(matrix), block_size):
+            block = np.asarray(matrix[start:start + block_size], dtype=np.float32)
+            scores = queries @ block.T  # (n_queries, rows in block)
+
+            # Top-k of this block per query...
+            block_k = min(k, scores.shape[1])
+            positions = np.argpartition(-scores, block_k - 1, axis=1)[:, :block_k]
+            block_scores = np.take_along_axis(scores, positions, axis=1)
+
+            # ...merged with the running top-k
+            merged_scores = np.concatenate([best_scores, block_scores], axis=1)
+            merged_ids = np.concatenate([best_ids, positions + start], axis=1)
+            keep = np.argpartition(-merged_scores, k - 1, axis=1)[:, :k]
+            best_scores = np.take_along_axis(merged_scores, keep, axis=1)
+            best_ids = np.take_along_axis(merged_ids, keep, axis=1)
+
+        order = np.argsort(-best_scores, axis=1, kind='stable')
+        best_scores = np.take_along_axis(best_scores, order, axis=1)
+        best_ids = np.take_along_axis(best_ids, order, axis=1)
+        best_ids[~np.isfinite(best_scores)] = -1
+        return best_scores, best_ids
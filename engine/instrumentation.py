@@ -0,0 +1,287 @@
+import bisect
+import functools
+import inspect
+import os
+import threading
+import time
+from collections import deque
+from collections.abc import Mapping
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+SECONDS_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+TOKEN_BUCKETS = (8, 16, 32, 64, 128, 256, 512, 1024, 2048)
+BATCH_BUCKETS = (1, 2, 4, 8, 16, 32, 64)
+
+# Pipelines whose forward pass is a generate() loop
+GENERATIVE_TASKS = {'summarizer', 'generator'}
+
+
+class Histogram:
+    """Cumulative bucket counts (for Prometheus) plus a rolling window of recent values (for percentiles)"""
+
+    def __init__(self, buckets, window=1000):
+        self.buckets = buckets
+        self.bucket_counts = [0] * (len(buckets) + 1)  # The last one is +Inf
+        self.count = 0
+        self.sum = 0.0
+        self.recent = deque(maxlen=window)
+
+    def observe(self, value):
+        self.bucket_counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.recent.append(value)
+
+    def percentiles(self, qs=(50, 95, 99)):
+        if not self.recent:
+            return {q: None for q in qs}
+        values = np.percentile(np.fromiter(self.recent, dtype=float), qs)
+        return dict(zip(qs, values.tolist()))
+
+
+class Metrics:
+    """Thread-safe registry of labelled histograms.
+
+    Every metric is identified by its name and a set of labels, e.g.
+    `nlp_stage_seconds{stage="forward",task="ner"}`.
+    """
+
+    def __init__(self, enabled=True, window=1000):
+        self.enabled = enabled
+        self.window = window
+        self._histograms = {}  # (name, labels) -> Histogram
+        self._help = {}
+        self._lock = threading.Lock()
+
+    def observe(self, name, value, buckets=SECONDS_BUCKETS, **labels):
+        if not self.enabled:
+            return
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram(buckets, self.window)
+            histogram.observe(value)
+
+    @contextmanager
+    def span(self, stage, **labels):
+        """Time the block and record it under `nlp_stage_seconds{stage=...}`"""
+        if not self.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe('nlp_stage_seconds', time.perf_counter() - start, stage=stage, **labels)
+
+    def describe(self, name, text):
+        self._help[name] = text
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+
+    def snapshot(self):
+        """Return [{name, labels, count, sum, p50, p95, p99}] over the rolling window"""
+        with self._lock:
+            items = [(name, dict(labels), histogram) for (name, labels), histogram in self._histograms.items()]
+            rows = []
+            for name, labels, histogram in sorted(items, key=lambda item: (item[0], sorted(item[1].items()))):
+                percentiles = histogram.percentiles()
+                rows.append({
+                    'name': name,
+                    'labels': labels,
+                    'count': histogram.count,
+                    'sum': histogram.sum,
+                    'p50': percentiles[50],
+                    'p95': percentiles[95],
+                    'p99': percentiles[99],
+                })
+            return rows
+
+    def render_prometheus(self):
+        """Return every histogram in the Prometheus text exposition format"""
+        lines = []
+        with self._lock:
+            by_name = {}
+            for (name, labels), histogram in self._histograms.items():
+                by_name.setdefault(name, []).append((labels, histogram))
+
+            for name in sorted(by_name):
+                if name in self._help:
+                    lines.append(f"# HELP {name} {self._help[name]}")
+                lines.append(f"# TYPE {name} histogram")
+                for labels, histogram in sorted(by_name[name], key=lambda item: item[0]):
+                    cumulative = 0
+                    for bound, count in zip(list(histogram.buckets) + ['+Inf'], histogram.bucket_counts):
+                        cumulative += count
+                        lines.append(f"{name}_bucket{_format_labels(labels + (('le', bound),))} {cumulative}")
+                    lines.append(f"{name}_sum{_format_labels(labels)} {histogram.sum!r}")
+                    lines.append(f"{name}_count{_format_labels(labels)} {histogram.count}")
+        return '\n'.join(lines) + '\n'
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in labels)
+    return '{' + ','.join(f'{key}="{value}"' for (key, _), value in zip(labels, escaped)) + '}'
+
+
+# Process-wide registry, instrumentation can be switched off with NLP_METRICS=0
+METRICS = Metrics(enabled=os.environ.get('NLP_METRICS', '1') != '0')
+METRICS.describe('nlp_request_seconds', "Latency of NLPEngine method calls")
+METRICS.describe('nlp_stage_seconds', "Time spent per stage (tokenization, forward, generation, postprocess, ui_postprocess, render)")
+METRICS.describe('nlp_input_tokens', "Input tokens per item of a forward pass")
+METRICS.describe('nlp_batch_size', "Items per forward pass")
+METRICS.describe('nlp_generated_tokens', "Tokens generated per sequence")
+METRICS.describe('nlp_generation_step_seconds', "Average time per generated token of a generate() call")
+METRICS.describe('nlp_time_to_first_token_seconds', "Time to the first streamed token")
+METRICS.describe('nlp_http_request_seconds', "Latency of HTTP requests to the NLP server")
+
+
+def timed(method):
+    """Decorator recording the latency of an NLPEngine method under `nlp_request_seconds{method=...}`"""
+    @functools.wraps(method)
+    def wrapper(*args, **kwargs):
+        if not METRICS.enabled:
+            return method(*args, **kwargs)
+        start = time.perf_counter()
+        try:
+            return method(*args, **kwargs)
+        finally:
+            METRICS.observe('nlp_request_seconds', time.perf_counter() - start, method=method.__name__)
+    return wrapper
+
+
+def timed_stage(stage):
+    """Decorator recording a function's run time as a stage span labelled with the function's name"""
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with METRICS.span(stage, function=function.__name__):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def _timed_generator(iterator, stage, task):
+    # Chunked pipelines (NER, QA) yield their preprocessed chunks lazily, time each step
+    done = object()
+    while True:
+        start = time.perf_counter()
+        item = next(iterator, done)
+        if item is done:
+            return
+        METRICS.observe('nlp_stage_seconds', time.perf_counter() - start, stage=stage, task=task)
+        yield item
+
+
+def _record_inputs(model_inputs, task):
+    # Tokenizer outputs are BatchEncodings, which are mappings but not dicts
+    input_ids = model_inputs.get('input_ids') if isinstance(model_inputs, Mapping) else None
+    if input_ids is None or not hasattr(input_ids, 'shape') or input_ids.dim() != 2:
+        return None
+    attention_mask = model_inputs.get('attention_mask')
+    lengths = attention_mask.sum(dim=1).tolist() if attention_mask is not None else [input_ids.shape[1]] * input_ids.shape[0]
+    METRICS.observe('nlp_batch_size', input_ids.shape[0], buckets=BATCH_BUCKETS, task=task)
+    for length in lengths:
+        METRICS.observe('nlp_input_tokens', length, buckets=TOKEN_BUCKETS, task=task)
+    return input_ids.shape[1]
+
+
+def _record_generation(outputs, input_length, seconds, task):
+    if 'generated_sequence' in outputs:
+        # Decoder-only models return the prompt followed by the new tokens
+        sequences = outputs['generated_sequence']
+        generated = sequences.shape[-1] - (input_length or 0)
+    elif 'output_ids' in outputs:
+        generated = outputs['output_ids'].shape[-1]
+    else:
+        return
+    if generated > 0:
+        METRICS.observe('nlp_generated_tokens', generated, buckets=TOKEN_BUCKETS, task=task)
+        METRICS.observe('nlp_generation_step_seconds', seconds / generated, task=task)
+
+
+def instrument_pipeline(pipe, task):
+    """Record tokenization, forward (or generation) and postprocess spans of a transformers pipeline.
+
+    The pipeline's `preprocess`, `_forward` and `postprocess` are wrapped on the
+    instance, which also covers the batched path through the pipeline's data
+    loader. The forward wrapper records batch sizes and input token counts.
+    """
+    preprocess, forward, postprocess = pipe.preprocess, pipe._forward, pipe.postprocess
+    forward_stage = 'generation' if task in GENERATIVE_TASKS else 'forward'
+
+    def timed_preprocess(*args, **kwargs):
+        start = time.perf_counter()
+        result = preprocess(*args, **kwargs)
+        if inspect.isgenerator(result):
+            return _timed_generator(result, 'tokenization', task)
+        METRICS.observe('nlp_stage_seconds', time.perf_counter() - start, stage='tokenization', task=task)
+        return result
+
+    def timed_forward(model_inputs, *args, **kwargs):
+        input_length = _record_inputs(model_inputs, task)
+        start = time.perf_counter()
+        outputs = forward(model_inputs, *args, **kwargs)
+        seconds = time.perf_counter() - start
+        METRICS.observe('nlp_stage_seconds', seconds, stage=forward_stage, task=task)
+        if forward_stage == 'generation' and isinstance(outputs, Mapping):
+            _record_generation(outputs, input_length, seconds, task)
+        return outputs
+
+    def timed_postprocess(*args, **kwargs):
+        with METRICS.span('postprocess', task=task):
+            return postprocess(*args, **kwargs)
+
+    if METRICS.enabled:
+        pipe.preprocess, pipe._forward, pipe.postprocess = timed_preprocess, timed_forward, timed_postprocess
+    return pipe
+
+
+def instrument_sentence_model(model, task='embeddings'):
+    """Record tokenization and forward spans, batch sizes and token counts of a SentenceTransformer's encode()"""
+    tokenize, forward = model.tokenize, model.forward
+
+    def timed_tokenize(*args, **kwargs):
+        with METRICS.span('tokenization', task=task):
+            return tokenize(*args, **kwargs)
+
+    def timed_forward(features, *args, **kwargs):
+        _record_inputs(features, task)
+        with METRICS.span('forward', task=task):
+            return forward(features, *args, **kwargs)
+
+    if METRICS.enabled:
+        model.tokenize, model.forward = timed_tokenize, timed_forward
+    return model
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split('?')[0] != '/metrics':
+            self.send_error(404)
+            return
+        body = METRICS.render_prometheus().encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve_metrics(port, host='0.0.0.0'):
+    """Serve the metrics at http://host:port/metrics from a background thread, returns the server"""
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+    print(f"Serving metrics on http://{host}:{port}/metrics")
+    return server
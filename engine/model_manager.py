@@ -0,0 +1,221 @@
+import gc
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager, nullcontext
+
+
+def current_rss_bytes():
+    """Return the resident set size of this process in bytes, or None if it can't be read"""
+    try:
+        with open('/proc/self/statm') as f:
+            resident_pages = int(f.read().split()[1])
+        return resident_pages * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def model_size_bytes(obj):
+    """Return the bytes held by the weights and buffers of a model (or a pipeline's model)"""
+    model = getattr(obj, 'model', obj)
+    if not hasattr(model, 'state_dict'):
+        return 0
+
+    # The state dict also covers weights that aren't parameters, like the packed
+    # weights of dynamically quantized linear layers
+    tensors = []
+    for value in model.state_dict().values():
+        tensors.extend(value if isinstance(value, (tuple, list)) else [value])
+
+    total = 0
+    seen = set()
+    for tensor in tensors:
+        if not hasattr(tensor, 'element_size'):
+            continue
+        # Tied weights (e.g. GPT-2's lm_head / wte) share storage, count them once
+        if tensor.data_ptr() in seen:
+            continue
+        seen.add(tensor.data_ptr())
+        total += tensor.numel() * tensor.element_size()
+    return total
+
+
+class ModelManager:
+    """Load models on first use and keep the resident set under a memory budget.
+
+    Models are registered with a zero-argument loader. They are materialized the
+    first time they are requested and kept in LRU order; when the total resident
+    size goes over `memory_budget_mb`, the least recently used models that are
+    not currently in use are evicted. The most recently used model is never
+    evicted for the budget, even if it alone exceeds it.
+
+    Calls on the same model are serialized: fast tokenizers can't be used from
+    two threads at once (they raise "Already borrowed" when the truncation or
+    padding settings change under a running call).
+    """
+
+    def __init__(self, memory_budget_mb=None, on_event=None, max_events=200):
+        self.memory_budget = int(memory_budget_mb * 1024 * 1024) if memory_budget_mb else None
+        self.events = deque(maxlen=max_events)
+
+        self._loaders = {}
+        self._models = OrderedDict()  # name -> model, least recently used first
+        self._sizes = {}
+        self._in_use = {}
+        self._load_locks = {}
+        self._call_locks = {}
+        self._over_budget = set()  # Models already warned about
+        self._lock = threading.RLock()
+        self._listeners = [on_event] if on_event else []
+
+    def register(self, name, loader):
+        """Register a zero-argument callable that builds the model `name`"""
+        with self._lock:
+            self._loaders[name] = loader
+            self._load_locks[name] = threading.Lock()
+            self._call_locks[name] = threading.RLock()
+
+    def add_listener(self, callback):
+        """Call `callback(event)` for every load/evict event"""
+        self._listeners.append(callback)
+
+    def get(self, name):
+        """Return the model `name`, loading it if needed"""
+        with self.use(name, exclusive=False) as model:
+            return model
+
+    @contextmanager
+    def use(self, name, exclusive=True):
+        """Context manager that pins the model `name` so it can't be evicted while in use.
+
+        With `exclusive`, other threads wait until the block is done before using
+        the model (the same thread can nest `use` calls).
+        """
+        model = self._acquire(name)
+        try:
+            with self._call_locks[name] if exclusive else nullcontext():
+                yield model
+        finally:
+            with self._lock:
+                self._in_use[name] -= 1
+                evicted = self._enforce_budget()
+            if evicted:
+                self._collect()
+
+    def is_loaded(self, name):
+        with self._lock:
+            return name in self._models
+
+    def evict(self, name):
+        """Drop the model `name` from memory. Returns False if it is in use or not loaded"""
+        with self._lock:
+            if name not in self._models or self._in_use.get(name, 0):
+                return False
+            self._drop(name, reason='manual')
+        self._collect()
+        return True
+
+    def resident_sizes(self):
+        """Return {name: bytes} for the currently loaded models, least recently used first"""
+        with self._lock:
+            return OrderedDict((name, self._sizes[name]) for name in self._models)
+
+    def resident_bytes(self):
+        with self._lock:
+            return sum(self._sizes[name] for name in self._models)
+
+    def stats(self):
+        """Return a summary of the loaded models and the memory budget"""
+        with self._lock:
+            return {
+                'registered': list(self._loaders),
+                'loaded': list(self._models),
+                'resident_bytes': self.resident_bytes(),
+                'memory_budget_bytes': self.memory_budget,
+                'models': {
+                    name: {'bytes': self._sizes[name], 'in_use': self._in_use.get(name, 0)}
+                    for name in self._models
+                },
+            }
+
+    def _acquire(self, name):
+        if name not in self._loaders:
+            raise KeyError(f"Unknown model: {name}")
+
+        with self._lock:
+            if name in self._models:
+                return self._checkout(name)
+
+        # Loading can take a while, so only block other requests for the same model
+        with self._load_locks[name]:
+            with self._lock:
+                if name in self._models:
+                    return self._checkout(name)
+
+            rss_before = current_rss_bytes()
+            start = time.perf_counter()
+            model = self._loaders[name]()
+            seconds = time.perf_counter() - start
+            rss_after = current_rss_bytes()
+
+            with self._lock:
+                self._models[name] = model
+                self._sizes[name] = model_size_bytes(model)
+                self._in_use[name] = 0
+                self._emit({
+                    'event': 'load',
+                    'model': name,
+                    'bytes': self._sizes[name],
+                    'rss_delta_bytes': rss_after - rss_before if rss_before is not None and rss_after is not None else None,
+                    'seconds': round(seconds, 3),
+                })
+                return self._checkout(name)
+
+    def _checkout(self, name):
+        self._models.move_to_end(name)
+        self._in_use[name] += 1
+        return self._models[name]
+
+    def _enforce_budget(self):
+        if self.memory_budget is None:
+            return False
+
+        # The most recently used model always stays: evicting a model that alone is over
+        # the budget would only reload it on the next call
+        *candidates, most_recent = self._models or [None]
+        evicted = False
+        for name in candidates:
+            if self.resident_bytes() <= self.memory_budget:
+                break
+            if self._in_use.get(name, 0) == 0:
+                self._drop(name, reason='budget')
+                evicted = True
+
+        if self.resident_bytes() > self.memory_budget and len(self._models) == 1 and most_recent not in self._over_budget:
+            self._over_budget.add(most_recent)
+            print(f"Model '{most_recent}' alone ({self._sizes[most_recent] / 1024 ** 2:.0f} MB) exceeds the memory budget, "
+                  f"keeping it loaded.")
+        return evicted
+
+    def _drop(self, name, reason):
+        del self._models[name]
+        size = self._sizes.pop(name)
+        self._in_use.pop(name, None)
+        self._emit({'event': 'evict', 'model': name, 'bytes': size, 'reason': reason})
+
+    def _emit(self, event):
+        event['time'] = time.time()
+        event['resident_bytes'] = self.resident_bytes()
+        self.events.append(event)
+        for callback in self._listeners:
+            callback(event)
+
+    def _collect(self):
+        gc.collect()
+        try:
+            import torch
+            if torch.cuda.is_available():
+                torch.cuda.empty_cache()
+        except ImportError:
+            pass
@@ -0,0 +1,236 @@
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import sys
+import time
+
+from engine.atomic_write import atomic_path
+
+MANIFEST = 'manifest.json'
+FORMAT_VERSION = 1
+
+# Model -> a short call on the loaded model, run at startup so the first real request
+# doesn't pay for lazy kernel initialization and allocator growth
+WARMUP_INPUTS = {
+    'sentiment': lambda pipe: pipe("Warming up the sentiment model."),
+    'summarizer': lambda pipe: pipe("Warming up the summarization model. " * 8, max_length=20, min_length=5, do_sample=False),
+    'ner': lambda pipe: pipe("Warming up the entity model in Paris."),
+    'qa': lambda pipe: pipe(question="What is warming up?", context="The question answering model is warming up."),
+    'generator': lambda pipe: pipe("Warming up the", max_new_tokens=8, do_sample=False),
+    'draft_generator': lambda pipe: pipe("Warming up the", max_new_tokens=8, do_sample=False),
+    'sentence_model': lambda model: model.encode(["Warming up the sentence model."]),
+}
+
+
+class ModelPackError(Exception):
+    pass
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _checksums(directory):
+    return {
+        os.path.relpath(os.path.join(root, name), directory): file_sha256(os.path.join(root, name))
+        for root, _, names in os.walk(directory) for name in sorted(names)
+    }
+
+
+def build_model_pack(out_dir, model_ids=None, names=None):
+    """Snapshot the engine's models and tokenizers into `out_dir`, with a manifest of checksums.
+
+    Every model is loaded once (from the hub or its cache) and saved with
+    save_pretrained, so the pack holds exactly what the engine loads and nothing
+    else (no TensorFlow or Flax weights).
+    """
+    from sentence_transformers import SentenceTransformer
+    from transformers import pipeline
+
+    from nlp_engine import PIPELINES, SENTENCE_MODEL
+
+    ids = {name: model_id for name, (_, model_id, _) in PIPELINES.items()}
+    ids['sentence_model'] = SENTENCE_MODEL
+    ids.update(model_ids or {})
+    names = names or list(ids)
+
+    os.makedirs(out_dir, exist_ok=True)
+    # Packing some of the models again keeps the others
+    manifest = {'models': {}}
+    if os.path.exists(os.path.join(out_dir, MANIFEST)):
+        manifest = read_manifest(out_dir)
+    manifest.update(format_version=FORMAT_VERSION, created=time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()))
+    for name in names:
+        start = time.perf_counter()
+        path = os.path.join(out_dir, name)
+        # Save next to the final directory and swap it in, so a failed build leaves the old copy intact
+        tmp_path = path + '.tmp'
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        if name == 'sentence_model':
+            SentenceTransformer(ids[name]).save(tmp_path)
+        else:
+            task, _, kwargs = PIPELINES[name]
+            pipeline(task, model=ids[name], **kwargs).save_pretrained(tmp_path)
+        shutil.rmtree(path, ignore_errors=True)
+        os.replace(tmp_path, path)
+
+        files = _checksums(path)
+        manifest['models'][name] = {
+            'model_id': ids[name],
+            'path': name,
+            'bytes': sum(os.path.getsize(os.path.join(path, file)) for file in files),
+            'files': files,
+        }
+        print(f"Packed '{name}' ({ids[name]}) in {time.perf_counter() - start:.1f}s", file=sys.stderr)
+
+    with atomic_path(os.path.join(out_dir, MANIFEST)) as tmp_path, open(tmp_path, 'w') as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+def read_manifest(pack_dir):
+    path = os.path.join(pack_dir, MANIFEST)
+    if not os.path.exists(path):
+        raise ModelPackError(f"No model pack in {pack_dir} ({MANIFEST} is missing), build one with: python -m engine.model_pack build {pack_dir}")
+    with open(path) as f:
+        manifest = json.load(f)
+    if manifest.get('format_version') != FORMAT_VERSION:
+        raise ModelPackError(f"Model pack {pack_dir} has format version {manifest.get('format_version')}, expected {FORMAT_VERSION}")
+    return manifest
+
+
+def verify_model_pack(pack_dir):
+    """Check every file of the pack against its manifest checksum, raises ModelPackError listing the bad ones"""
+    problems = []
+    for name, entry in read_manifest(pack_dir)['models'].items():
+        model_dir = os.path.join(pack_dir, entry['path'])
+        for file, checksum in entry['files'].items():
+            path = os.path.join(model_dir, file)
+            if not os.path.exists(path):
+                problems.append(f"{name}/{file}: missing")
+            elif file_sha256(path) != checksum:
+                problems.append(f"{name}/{file}: checksum mismatch")
+    if problems:
+        raise ModelPackError(f"Model pack {pack_dir} is corrupt:\n" + '\n'.join(problems))
+
+
+def load_model_pack(pack_dir, verify=False):
+    """Return {model name: local path} for the models in the pack"""
+    pack_dir = os.path.abspath(pack_dir)
+    manifest = read_manifest(pack_dir)
+    if verify:
+        verify_model_pack(pack_dir)
+    paths = {}
+    for name, entry in manifest['models'].items():
+        path = os.path.join(pack_dir, entry['path'])
+        if not os.path.isdir(path):
+            raise ModelPackError(f"Model pack {pack_dir} is missing '{name}' ({path})")
+        paths[name] = path
+    return paths
+
+
+def warm_up(engine, names=None, passes=1):
+    """Load the models and run `passes` warmup calls on each, returns the startup time per model"""
+    # The draft model is only used for speculative decoding
+    names = names or [name for name in WARMUP_INPUTS if name != 'draft_generator' or engine.speculative]
+    report = {}
+    for name in names:
+        start = time.perf_counter()
+        engine.models.get(name)
+        load_seconds = time.perf_counter() - start
+
+        call_seconds = []
+        with engine.models.use(name) as model:
+            for _ in range(passes):
+                start = time.perf_counter()
+                WARMUP_INPUTS[name](model)
+                call_seconds.append(time.perf_counter() - start)
+        report[name] = {
+            'load_seconds': round(load_seconds, 3),
+            'first_call_seconds': round(call_seconds[0], 3),
+            'warm_call_seconds': round(call_seconds[-1], 3),
+        }
+    return report
+
+
+def cold_start_report(pack_dir, names=None, passes=2, verify=False):
+    """Start an engine from the pack and time its construction, and the load and warmup of every model"""
+    start = time.perf_counter()
+    from nlp_engine import NLPEngine
+    import_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    engine = NLPEngine(device=-1, embedding_cache_dir=False, model_pack=pack_dir, verify_model_pack=verify)
+    init_seconds = time.perf_counter() - start
+
+    # The engine imports these on first use, time them apart so they aren't charged to the first model
+    start = time.perf_counter()
+    import sentence_transformers  # noqa: F401
+    import transformers.pipelines  # noqa: F401
+    library_seconds = time.perf_counter() - start
+
+    models = warm_up(engine, names or list(engine.model_pack), passes=passes)
+    return {
+        'import_seconds': round(import_seconds, 3),
+        'engine_init_seconds': round(init_seconds, 3),
+        'library_import_seconds': round(library_seconds, 3),
+        'models': models,
+        'total_seconds': round(
+            import_seconds + init_seconds + library_seconds
+            + sum(m['load_seconds'] + m['first_call_seconds'] for m in models.values()), 3
+        ),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build, verify and time offline model packs")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    build = commands.add_parser('build', help="Snapshot the models and tokenizers into a directory")
+    build.add_argument('pack_dir')
+    build.add_argument('--models', help="Comma-separated models to pack (default: all)")
+    build.add_argument('--model-ids', help="JSON file of {model: model id or path} overriding the defaults")
+
+    verify = commands.add_parser('verify', help="Check the pack's files against the manifest checksums")
+    verify.add_argument('pack_dir')
+
+    cold_start = commands.add_parser('coldstart', help="Report the cold-start time per model when loading from the pack")
+    cold_start.add_argument('pack_dir')
+    cold_start.add_argument('--models', help="Comma-separated models to load (default: all in the pack)")
+    cold_start.add_argument('--warmup', type=int, default=2, help="Warmup calls per model")
+    cold_start.add_argument('--verify', action='store_true', help="Check the checksums before loading")
+    cold_start.add_argument('--output', help="Write the report as JSON to this file")
+    args = parser.parse_args()
+
+    try:
+        if args.command == 'build':
+            model_ids = None
+            if args.model_ids:
+                with open(args.model_ids) as f:
+                    model_ids = json.load(f)
+            manifest = build_model_pack(args.pack_dir, model_ids, args.models.split(',') if args.models else None)
+            total_mb = sum(entry['bytes'] for entry in manifest['models'].values()) / 1024 ** 2
+            print(f"Model pack written to {args.pack_dir} ({total_mb:.0f} MB)")
+        elif args.command == 'verify':
+            verify_model_pack(args.pack_dir)
+            print(f"Model pack {args.pack_dir} is intact")
+        else:
+            report = cold_start_report(
+                args.pack_dir, args.models.split(',') if args.models else None, passes=args.warmup, verify=args.verify
+            )
+            print(json.dumps(report, indent=2))
+            if args.output:
+                with open(args.output, 'w') as f:
+                    json.dump(report, f, indent=2)
+    except ModelPackError as e:
+        raise SystemExit(str(e))
+
+
+if __name__ == "__main__":
+    main()
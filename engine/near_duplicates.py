@@ -0,0 +1,151 @@
+import argparse
+import json
+import math
+import sys
+import time
+
+import numpy as np
+
+from engine.bulk import read_texts
+from engine.vector_index import normalize_rows
+
+
+def embed_collection(engine, texts, chunk_size=4096, batch_size=64):
+    """Embed `texts` chunk by chunk into one float32 matrix of unit vectors"""
+    embeddings = None
+    for start in range(0, len(texts), chunk_size):
+        chunk = engine.get_embeddings(list(texts[start:start + chunk_size]), batch_size=batch_size).numpy()
+        if embeddings is None:
+            embeddings = np.empty((len(texts), chunk.shape[1]), dtype=np.float32)
+        embeddings[start:start + len(chunk)] = normalize_rows(chunk)
+    return embeddings
+
+
+def default_bits(n):
+    # About 16 vectors per bucket: enough bits that buckets stay small as the collection grows
+    return min(max(int(math.log2(max(n, 1) / 16)), 4), 24)
+
+
+def lsh_buckets(vectors, n_bits, seed=0, chunk_size=65536):
+    """Bucket vectors by the signs of `n_bits` random projections (random-hyperplane LSH).
+
+    The more similar two vectors are, the more likely they fall on the same side
+    of every hyperplane. Returns the row numbers of every bucket holding more than
+    one vector.
+    """
+    planes = np.random.default_rng(seed).standard_normal((vectors.shape[1], n_bits)).astype(np.float32)
+    powers = 1 << np.arange(n_bits, dtype=np.int64)
+    signatures = np.empty(len(vectors), dtype=np.int64)
+    for start in range(0, len(vectors), chunk_size):
+        signatures[start:start + chunk_size] = ((vectors[start:start + chunk_size] @ planes) > 0) @ powers
+
+    order = np.argsort(signatures, kind='stable')
+    boundaries = np.flatnonzero(np.diff(signatures[order])) + 1
+    return [bucket for bucket in np.split(order, boundaries) if len(bucket) > 1]
+
+
+def _similar_pairs(vectors, rows, threshold, block_size=1024):
+    """Pairs (i, j), i < j, of `rows` whose cosine similarity is at least `threshold`"""
+    pairs = []
+    for start in range(0, len(rows), block_size):
+        similarities = vectors[rows[start:start + block_size]] @ vectors[rows].T
+        i, j = np.nonzero(similarities >= threshold)
+        keep = j > i + start  # Each pair once, no self-pairs
+        pairs.append(np.stack([rows[i[keep] + start], rows[j[keep]]], axis=1))
+    return np.concatenate(pairs) if pairs else np.zeros((0, 2), dtype=np.int64)
+
+
+def connected_groups(n, pairs):
+    """Groups of more than one row connected by `pairs`, largest first"""
+    labels = np.arange(n)
+    if len(pairs):
+        # Every row takes the smallest label among its neighbours, then labels point to
+        # their own labels (pointer jumping) until nothing changes
+        while True:
+            smallest = np.minimum(labels[pairs[:, 0]], labels[pairs[:, 1]])
+            updated = labels.copy()
+            np.minimum.at(updated, pairs[:, 0], smallest)
+            np.minimum.at(updated, pairs[:, 1], smallest)
+            updated = updated[updated]
+            if np.array_equal(updated, labels):
+                break
+            labels = updated
+
+    order = np.argsort(labels, kind='stable')
+    boundaries = np.flatnonzero(np.diff(labels[order])) + 1
+    groups = [group.tolist() for group in np.split(order, boundaries) if len(group) > 1]
+    return sorted(groups, key=len, reverse=True)
+
+
+def find_near_duplicates(vectors, threshold=0.9, n_bits=None, n_tables=16, seed=0):
+    """Group near-duplicate vectors without comparing every pair.
+
+    Vectors are bucketed with random-hyperplane LSH in `n_tables` independent
+    tables, and only vectors sharing a bucket are compared exactly, so the work
+    grows with the bucket sizes rather than with N². More tables find more of the
+    true pairs (fewer bits per table does too, at the price of larger buckets).
+    Rows linked by a similarity of at least `threshold` end up in one group, which
+    can chain: A~B and B~C put A and C together even if they aren't similar.
+    Returns (groups, pairs), with the rows of every group and the similar pairs found.
+    """
+    vectors = normalize_rows(vectors)
+    n_bits = n_bits or default_bits(len(vectors))
+    pairs = [np.zeros((0, 2), dtype=np.int64)]
+    for table in range(n_tables):
+        for bucket in lsh_buckets(vectors, n_bits, seed=seed + table):
+            pairs.append(_similar_pairs(vectors, bucket, threshold))
+    # The same pair is usually found in several tables
+    pairs = np.unique(np.sort(np.concatenate(pairs), axis=1), axis=0)
+    return connected_groups(len(vectors), pairs), pairs
+
+
+def exact_near_duplicates(vectors, threshold=0.9):
+    """Same as find_near_duplicates, comparing every pair (O(N²), for small sets and as the ground truth)"""
+    vectors = normalize_rows(vectors)
+    pairs = _similar_pairs(vectors, np.arange(len(vectors)), threshold)
+    return connected_groups(len(vectors), pairs), pairs
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Find groups of near-duplicate texts in a collection")
+    parser.add_argument('input', help="Text file (one text per line), or JSONL/CSV file with a text field")
+    parser.add_argument('output', help="JSONL file receiving one duplicate group per line")
+    parser.add_argument('--field', default='text', help="Text field of JSONL/CSV records")
+    parser.add_argument('--threshold', type=float, default=0.9, help="Minimum cosine similarity of near-duplicates")
+    parser.add_argument('--bits', type=int, help="Hyperplanes per LSH table (default: from the collection size)")
+    parser.add_argument('--tables', type=int, default=16, help="LSH tables, more find more pairs")
+    parser.add_argument('--exact', action='store_true', help="Compare every pair instead of using LSH")
+    parser.add_argument('--batch-size', type=int, default=64)
+    args = parser.parse_args()
+
+    from nlp_engine import NLPEngine
+
+    engine = NLPEngine(device=-1)
+    texts = read_texts(args.input, args.field)
+
+    start = time.perf_counter()
+    vectors = embed_collection(engine, texts, batch_size=args.batch_size)
+    embed_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    if args.exact:
+        groups, pairs = exact_near_duplicates(vectors, args.threshold)
+    else:
+        groups, pairs = find_near_duplicates(vectors, args.threshold, n_bits=args.bits, n_tables=args.tables)
+    search_seconds = time.perf_counter() - start
+
+    with open(args.output, 'w', encoding='utf-8') as f:
+        for number, group in enumerate(groups):
+            f.write(json.dumps({'group': number, 'size': len(group), 'indices': group, 'texts': [texts[i] for i in group]}) + '\n')
+    print(json.dumps({
+        'texts': len(texts),
+        'groups': len(groups),
+        'duplicates': sum(len(group) - 1 for group in groups),
+        'similar_pairs': len(pairs),
+        'embed_seconds': round(embed_seconds, 2),
+        'search_seconds': round(search_seconds, 2),
+    }), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,225 @@
+import argparse
+import hashlib
+import json
+import os
+import time
+
+import torch
+import transformers
+
+from engine.atomic_write import atomic_path
+
+
+def conv1d_to_linear(model):
+    """Replace the transformers Conv1D layers of `model` (GPT-2's projections) with equivalent nn.Linear layers.
+
+    Conv1D is a linear layer storing its weight transposed, quantize_dynamic
+    doesn't recognize it and would leave GPT-2 models in fp32.
+    """
+    from transformers.pytorch_utils import Conv1D
+
+    for parent in list(model.modules()):
+        for name, child in list(parent.named_children()):
+            if isinstance(child, Conv1D):
+                in_features, out_features = child.weight.shape
+                linear = torch.nn.Linear(in_features, out_features, device=child.weight.device, dtype=child.weight.dtype)
+                linear.weight = torch.nn.Parameter(child.weight.detach().t().contiguous())
+                linear.bias = child.bias
+                setattr(parent, name, linear)
+    return model
+
+
+def quantize_linear_layers(model):
+    """Apply dynamic int8 quantization to the linear layers of a model, Conv1D included (CPU only)"""
+    model.eval()
+    return torch.ao.quantization.quantize_dynamic(conv1d_to_linear(model), {torch.nn.Linear}, dtype=torch.qint8)
+
+
+class QuantizedModelCache:
+    """Keep quantized models on disk so quantization isn't redone at every start.
+
+    Quantized modules are pickled whole with torch.save, so the cache key
+    includes the torch and transformers versions: a cached file is only reused
+    by the same versions that wrote it.
+
+    Loading a cached file unpickles it, which can run arbitrary code: the cache
+    directory must only be writable by trusted users. Every file is saved with
+    its SHA-256 next to it, and a file that doesn't match (truncated, corrupted
+    or replaced without its checksum) is quantized again instead of loaded.
+    """
+
+    def __init__(self, cache_dir):
+        self.cache_dir = cache_dir
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def path(self, model_id):
+        safe_name = model_id.strip('/').replace('/', '--')
+        return os.path.join(self.cache_dir, f"{safe_name}-torch{torch.__version__}-transformers{transformers.__version__}.pt")
+
+    @staticmethod
+    def _checksum(path):
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                digest.update(block)
+        return digest.hexdigest()
+
+    def load(self, model_id):
+        path = self.path(model_id)
+        if not os.path.exists(path) or not os.path.exists(path + '.sha256'):
+            return None
+        with open(path + '.sha256') as f:
+            expected = f.read().strip()
+        if self._checksum(path) != expected:
+            print(f"Checksum mismatch for the cached quantized {model_id}, quantizing it again.")
+            return None
+        return torch.load(path, weights_only=False)
+
+    def save(self, model_id, model):
+        path = self.path(model_id)
+        # The checksum is published last: a model file without one is never loaded
+        with atomic_path(path) as tmp_path:
+            torch.save(model, tmp_path)
+            checksum = self._checksum(tmp_path)
+        with atomic_path(path + '.sha256') as tmp_path, open(tmp_path, 'w') as f:
+            f.write(checksum)
+
+    def get_or_create(self, model_id, build):
+        """Return the cached quantized model, or quantize `build()` and cache it"""
+        model = self.load(model_id)
+        if model is None:
+            model = quantize_linear_layers(build())
+            self.save(model_id, model)
+        return model
+
+
+def _rouge_agreement(summaries, reference_summaries):
+    from engine.text_metrics import rouge_scores
+
+    scores = [rouge_scores(summary, reference) for summary, reference in zip(summaries, reference_summaries)]
+    return {name: round(sum(score[name] for score in scores) / len(scores), 4) for name in scores[0]}
+
+
+def _span_agreement(spans, reference_spans):
+    """F1 between two sets of (start, end, label) spans, averaged over the inputs"""
+    f1s = []
+    for found, reference in zip(spans, reference_spans):
+        found, reference = set(found), set(reference)
+        if not found and not reference:
+            f1s.append(1.0)
+            continue
+        overlap = len(found & reference)
+        f1s.append(2 * overlap / (len(found) + len(reference)))
+    return round(sum(f1s) / len(f1s), 4)
+
+
+# Sample inputs for the comparison report (the examples shown in the app)
+REPORT_INPUTS = {
+    'sentiment': [
+        "Hugging Face is a great platform for NLP.",
+        "This movie was absolutely terrible. The acting was poor and the plot made no sense.",
+        "I had the best time at the concert! The band was amazing and the crowd was so energetic.",
+        "The weather today is okay, not great but not bad either.",
+    ],
+    'ner': [
+        "Apple Inc. is looking at buying U.K. startup for $1 billion. Tim Cook is the CEO. The meeting is in New York.",
+        "Mayor Johnson, who has championed the development since its proposal two years ago, called the decision a crucial step forward.",
+    ],
+    'qa': [
+        ("What is Paris known for?", "The capital of France is Paris. It is known for the Eiffel Tower and the Louvre Museum. Paris is located on the Seine River and is often called the City of Light."),
+        ("Which is the largest planet in the Solar System?", "The largest of these objects are the eight planets: Mercury, Venus, Earth, Mars, Jupiter, Saturn, Uranus, and Neptune. Jupiter is the largest planet, with a mass more than twice that of all the other planets combined."),
+    ],
+    'summarizer': [
+        "The city council voted yesterday to approve the controversial downtown development project, following a heated debate that lasted nearly five hours. "
+        "The $500 million project will include a 40-story residential tower, 100,000 square feet of retail space, and a public park. "
+        "Supporters argue that the development will create jobs and revitalize the downtown area, which has struggled economically in recent years. "
+        "However, opponents raised concerns about increased traffic, potential environmental impacts, and the displacement of existing small businesses in the area.",
+    ],
+    'generator': [
+        "Once upon a time",
+        "The future of artificial intelligence is",
+    ],
+}
+
+
+def _run_tasks(engine, repeats):
+    """Run every report input through the engine, return outputs and mean latency per task"""
+    tasks = {
+        'sentiment': lambda: [engine.analyze_sentiment(text)[0]['label'] for text in REPORT_INPUTS['sentiment']],
+        'ner': lambda: [
+            [(entity['start'], entity['end'], entity['entity_group']) for entity in engine.extract_entities(text)]
+            for text in REPORT_INPUTS['ner']
+        ],
+        'qa': lambda: [
+            [(answer['start'], answer['end'], 'ANSWER')]
+            for answer in (engine.answer_question(question=q, context=c) for q, c in REPORT_INPUTS['qa'])
+        ],
+        'summarizer': lambda: [engine.summarize_text(text)[0]['summary_text'] for text in REPORT_INPUTS['summarizer']],
+        # Greedy decoding, so both engines' outputs can be compared
+        'generator': lambda: [
+            engine.generate_text(prompt, max_length=40, do_sample=False, speculative=False)[0]['generated_text']
+            for prompt in REPORT_INPUTS['generator']
+        ],
+    }
+
+    outputs, latency_ms = {}, {}
+    for task, run in tasks.items():
+        outputs[task] = run()  # Warmup, also loads the model
+        start = time.perf_counter()
+        for _ in range(repeats):
+            run()
+        latency_ms[task] = round((time.perf_counter() - start) * 1000 / (repeats * len(REPORT_INPUTS[task])), 2)
+    return outputs, latency_ms
+
+
+def comparison_report(repeats=3, quantized_cache_dir=None):
+    """Compare latency, model memory and output agreement of the int8 engine against fp32"""
+    from nlp_engine import NLPEngine
+
+    fp32_engine = NLPEngine(device=-1, embedding_cache_dir=False)
+    fp32_outputs, fp32_latency = _run_tasks(fp32_engine, repeats)
+    fp32_sizes = dict(fp32_engine.models.resident_sizes())
+    del fp32_engine
+
+    int8_engine = NLPEngine(device=-1, embedding_cache_dir=False, quantized=True, quantized_cache_dir=quantized_cache_dir)
+    int8_outputs, int8_latency = _run_tasks(int8_engine, repeats)
+    int8_sizes = dict(int8_engine.models.resident_sizes())
+
+    agreement = {
+        'sentiment_label_agreement': round(
+            sum(a == b for a, b in zip(int8_outputs['sentiment'], fp32_outputs['sentiment'])) / len(fp32_outputs['sentiment']), 4
+        ),
+        'ner_span_f1': _span_agreement(int8_outputs['ner'], fp32_outputs['ner']),
+        'qa_span_exact_match': _span_agreement(int8_outputs['qa'], fp32_outputs['qa']),
+        'summary_rouge': _rouge_agreement(int8_outputs['summarizer'], fp32_outputs['summarizer']),
+        'generation_rouge': _rouge_agreement(int8_outputs['generator'], fp32_outputs['generator']),
+    }
+    return {
+        'latency_ms': {
+            task: {'fp32': fp32_latency[task], 'int8': int8_latency[task], 'speedup': round(fp32_latency[task] / int8_latency[task], 2)}
+            for task in fp32_latency
+        },
+        'model_bytes': {
+            task: {'fp32': fp32_sizes.get(task), 'int8': int8_sizes.get(task)}
+            for task in fp32_latency
+        },
+        'agreement': agreement,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the int8 quantized CPU engine against fp32")
+    parser.add_argument('--repeats', type=int, default=3, help="Timed runs over the sample inputs per task")
+    parser.add_argument('--cache-dir', help="Where quantized models are cached")
+    parser.add_argument('--output', help="Write the report as JSON to this file")
+    args = parser.parse_args()
+
+    report = comparison_report(repeats=args.repeats, quantized_cache_dir=args.cache_dir)
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
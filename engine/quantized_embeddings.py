@@ -0,0 +1,208 @@
+import argparse
+import json
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from engine.exact_search import MemmapExactIndex
+from engine.vector_index import normalize_rows, top_k
+
+PRECISIONS = ('float32', 'float16', 'int8', 'binary')
+
+# Candidates rescored in float32 per requested result: the coarser the codes, the more
+RESCORE_MULTIPLIERS = {'float32': 1, 'float16': 2, 'int8': 4, 'binary': 10}
+
+# Number of set bits in every byte value, for Hamming distances between packed bit codes
+_POPCOUNT = np.unpackbits(np.arange(256, dtype=np.uint8)[:, None], axis=1).sum(axis=1).astype(np.uint16)
+
+
+class QuantizedEmbeddingIndex:
+    """Cosine top-k search over embeddings stored at reduced precision, with exact rescoring.
+
+    Every vector is kept in memory as a compact code:
+        float16  2 bytes per dimension
+        int8     1 byte per dimension, scaled per dimension to the range seen in the first vectors added
+        binary   1 bit per dimension (its sign), compared by Hamming distance
+
+    A search scans the codes for `rescore_multiplier * k` candidates (more for
+    coarser codes, see RESCORE_MULTIPLIERS), then rescores only those with the
+    float32 vectors, which live in a memory-mapped file at `full_precision_path`
+    (only the candidates' rows are read from it). Without a path the float32
+    vectors stay in memory. Row numbers are the ids returned by `search`.
+    """
+
+    def __init__(self, dim, precision='int8', full_precision_path=None, rescore_multiplier=None, block_size=8192):
+        if precision not in PRECISIONS:
+            raise ValueError(f"Unknown precision '{precision}', expected one of {', '.join(PRECISIONS)}")
+        self.dim = dim
+        self.precision = precision
+        self.rescore_multiplier = rescore_multiplier or RESCORE_MULTIPLIERS[precision]
+        # Every block is converted to float32 to be scored, this bounds the temporary memory
+        self.block_size = block_size
+
+        code_width = (dim + 7) // 8 if precision == 'binary' else dim
+        code_dtype = {'float32': np.float32, 'float16': np.float16, 'int8': np.int8, 'binary': np.uint8}[precision]
+        self._codes = np.zeros((0, code_width), dtype=code_dtype)
+        self._scale = None  # int8 only: value of one step, per dimension
+
+        self._full = None
+        self._full_vectors = np.zeros((0, dim), dtype=np.float32)
+        if full_precision_path and precision != 'float32':
+            self._full = MemmapExactIndex(full_precision_path, dim=dim, dtype='float32')
+
+    def __len__(self):
+        return len(self._codes)
+
+    def encode(self, vectors):
+        """Compact codes of unit-normalized vectors"""
+        if self.precision == 'float32':
+            return vectors
+        if self.precision == 'float16':
+            return vectors.astype(np.float16)
+        if self.precision == 'binary':
+            return np.packbits(vectors > 0, axis=1)
+        if self._scale is None:
+            self._scale = np.maximum(np.abs(vectors).max(axis=0), 1e-6) / 127
+        return np.clip(np.rint(vectors / self._scale), -127, 127).astype(np.int8)
+
+    def add(self, vectors):
+        """Add vectors, returns their row ids"""
+        vectors = normalize_rows(vectors)
+        start = len(self)
+        self._codes = np.concatenate([self._codes, self.encode(vectors)])
+        if self.precision == 'float32':
+            pass  # The codes are the float32 vectors
+        elif self._full is not None:
+            self._full.add(vectors)
+        else:
+            self._full_vectors = np.concatenate([self._full_vectors, vectors])
+        return np.arange(start, start + len(vectors))
+
+    def memory_bytes(self):
+        """Bytes held in memory: the codes, plus the float32 vectors when they aren't memory-mapped"""
+        return self._codes.nbytes + self._full_vectors.nbytes
+
+    def _approximate_scores(self, query):
+        """Approximate cosine similarity of `query` with every stored vector, block by block"""
+        scores = np.empty(len(self), dtype=np.float32)
+        if self.precision == 'binary':
+            query_code = np.packbits(query > 0)
+        elif self.precision == 'int8':
+            # codes * scale @ query == codes @ (scale * query)
+            query = query * self._scale
+        for start in range(0, len(self), self.block_size):
+            block = self._codes[start:start + self.block_size]
+            if self.precision == 'binary':
+                # Cosine of the angle between the bit vectors, 1 - 2 * Hamming distance / dim
+                distances = _POPCOUNT[np.bitwise_xor(block, query_code)].sum(axis=1)
+                scores[start:start + len(block)] = 1 - 2 * distances / self.dim
+            else:
+                scores[start:start + len(block)] = block.astype(np.float32) @ query
+        return scores
+
+    def _full_precision(self, rows):
+        if self._full is not None:
+            return np.asarray(self._full.matrix()[rows])
+        return self._full_vectors[rows]
+
+    def search(self, queries, k=10, rescore=True):
+        """Return (scores, ids), each of shape (n_queries, k), best match first.
+
+        With `rescore`, the scores are exact float32 cosine similarities of the
+        best candidates, otherwise the approximate scores of the codes. Missing
+        results (fewer than k stored vectors) have id -1.
+        """
+        queries = normalize_rows(queries)
+        all_scores = np.full((len(queries), k), -np.inf, dtype=np.float32)
+        all_ids = np.full((len(queries), k), -1, dtype=np.int64)
+        for q, query in enumerate(queries):
+            scores = self._approximate_scores(query)
+            if rescore and self.precision != 'float32':
+                _, candidates = top_k(scores, k * self.rescore_multiplier)
+                candidates = np.sort(candidates)  # Read the memory-mapped rows in file order
+                best_scores, positions = top_k(self._full_precision(candidates) @ query, k)
+                ids = candidates[positions]
+            else:
+                best_scores, ids = top_k(scores, k)
+            all_scores[q, :len(ids)] = best_scores
+            all_ids[q, :len(ids)] = ids
+        return all_scores, all_ids
+
+
+def precision_report(corpus_vectors, query_vectors, k=10, precisions=PRECISIONS, rescore_multiplier=None):
+    """Memory, recall@k against float32 exact search and latency per storage precision"""
+    with tempfile.TemporaryDirectory(prefix='embeddings-') as tmp_dir:
+        indexes = {}
+        for precision in precisions:
+            index = QuantizedEmbeddingIndex(
+                corpus_vectors.shape[1], precision, os.path.join(tmp_dir, f'{precision}.f32'), rescore_multiplier
+            )
+            index.add(corpus_vectors)
+            indexes[precision] = index
+
+        # Exact float32 results are the ground truth
+        truth = QuantizedEmbeddingIndex(corpus_vectors.shape[1], 'float32')
+        truth.add(corpus_vectors)
+        _, exact_ids = truth.search(query_vectors, k)
+
+        def recall(ids):
+            hits = sum(len(set(found[found >= 0]) & set(expected[expected >= 0])) for found, expected in zip(ids, exact_ids))
+            return round(hits / max(int((exact_ids >= 0).sum()), 1), 4)
+
+        report = {'vectors': len(corpus_vectors), 'dim': corpus_vectors.shape[1], 'k': k, 'precisions': []}
+        for precision, index in indexes.items():
+            row = {
+                'precision': precision,
+                'rescore_multiplier': index.rescore_multiplier,
+                'bytes_per_vector': index.memory_bytes() // max(len(index), 1),
+                'memory_mb': round(index.memory_bytes() / 1024 ** 2, 2),
+            }
+            for rescore in ((False,) if precision == 'float32' else (False, True)):
+                start = time.perf_counter()
+                _, ids = index.search(query_vectors, k, rescore=rescore)
+                latency_ms = (time.perf_counter() - start) * 1000 / len(query_vectors)
+                suffix = '_rescored' if rescore else ''
+                row[f'recall{suffix}'] = recall(ids)
+                row[f'latency_ms{suffix}'] = round(latency_ms, 3)
+            report['precisions'].append(row)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare memory, recall and latency of embedding storage precisions")
+    parser.add_argument('corpus', help="Text file with one document per line")
+    parser.add_argument('--queries', help="Text file with one query per line (defaults to a sample of the corpus)")
+    parser.add_argument('--k', type=int, default=10)
+    parser.add_argument('--precisions', default=','.join(PRECISIONS), help="Comma-separated precisions to compare")
+    parser.add_argument('--rescore-multiplier', type=int, help="Candidates rescored in float32 per result (default: per precision)")
+    parser.add_argument('--output', help="Write the report as JSON to this file")
+    args = parser.parse_args()
+
+    from nlp_engine import NLPEngine
+
+    engine = NLPEngine()
+    with open(args.corpus) as f:
+        corpus = [line.strip() for line in f if line.strip()]
+    if args.queries:
+        with open(args.queries) as f:
+            queries = [line.strip() for line in f if line.strip()]
+    else:
+        queries = corpus[::max(1, len(corpus) // 100)][:100]
+
+    report = precision_report(
+        engine.get_embeddings(corpus).numpy(),
+        engine.get_embeddings(queries).numpy(),
+        k=args.k,
+        precisions=args.precisions.split(','),
+        rescore_multiplier=args.rescore_multiplier
+    )
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
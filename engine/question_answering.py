@@ -0,0 +1,58 @@
+import torch
+
+from engine.batching import token_lengths
+from engine.text_splitting import pack_sentences, sentence_spans
+
+
+def split_passages(context, tokenizer, passage_tokens=300, overlap_sentences=1):
+    """Split `context` on sentence boundaries into passages of at most `passage_tokens` tokens.
+
+    Returns (start, end) character offsets of each passage in `context`.
+    """
+    spans = sentence_spans(context)
+    if not spans:
+        return []
+    lengths = token_lengths(tokenizer, [context[start:end] for start, end in spans])
+    return [
+        (spans[first][0], spans[last - 1][1])
+        for first, last in pack_sentences(lengths, passage_tokens, overlap_sentences)
+    ]
+
+
+def answer_question_long(engine, question, context, passage_tokens=300, overlap_sentences=1, top_k=3, batch_size=8):
+    """Answer a question over a long context by only reading the most relevant passages.
+
+    The context is split into passages, the sentence embedding model picks the
+    `top_k` passages most similar to the question, and the QA model runs on
+    those as one batch. The best answer's `start`/`end` are offsets into the
+    original `context`, like the ones returned by `answer_question`.
+    """
+    with engine.models.use('qa') as qa:
+        passages = split_passages(context, qa.tokenizer, passage_tokens, overlap_sentences)
+        if not passages:
+            return engine.answer_question(question=question, context=context)
+
+        passage_texts = [context[start:end] for start, end in passages]
+        selected = list(range(len(passages)))
+        if len(passages) > top_k:
+            question_embedding = engine.get_embeddings(question).unsqueeze(0)
+            passage_embeddings = engine.get_embeddings(passage_texts)
+            similarities = torch.nn.functional.cosine_similarity(question_embedding, passage_embeddings, dim=1)
+            selected = similarities.topk(top_k).indices.tolist()
+
+        answers = engine.answer_question_batch(
+            [question] * len(selected),
+            [passage_texts[i] for i in selected],
+            batch_size=batch_size
+        )
+
+    # Map the best span back to offsets in the full context
+    best, passage = max(zip(answers, selected), key=lambda pair: pair[0]['score'])
+    offset = passages[passage][0]
+    return {
+        **best,
+        'start': best['start'] + offset,
+        'end': best['end'] + offset,
+        'passages_read': len(selected),
+        'passages_total': len(passages),
+    }
@@ -0,0 +1,229 @@
+import copy
+import hashlib
+import inspect
+import json
+import os
+import pickle
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+
+from engine.atomic_write import atomic_path
+from engine.embedding_cache import normalize_text
+
+# Engine method -> (model it runs, names of the text arguments, whether whitespace
+# in them can be normalized). Only the uncased WordPiece sentiment model ignores
+# whitespace: the byte-level BPE models (BART, RoBERTa, GPT-2) tokenize it, and NER
+# and QA return character offsets into their input, so those are keyed on the exact text.
+MEMOIZED_METHODS = {
+    'analyze_sentiment': ('sentiment', ['text'], True),
+    'summarize_text': ('summarizer', ['text'], False),
+    'summarize_long_text': ('summarizer', ['text'], False),
+    'summarize_compressed_text': ('summarizer', ['text'], False),
+    'extract_entities': ('ner', ['text'], False),
+    'extract_entities_long': ('ner', ['text'], False),
+    'answer_question': ('qa', ['question', 'context'], False),
+    'answer_question_long': ('qa', ['question', 'context'], False),
+    'generate_text': ('generator', ['prompt'], False),
+}
+
+
+class ResultCache:
+    """Two-tier cache of engine results with single-flight computation.
+
+    Results are kept in an in-memory LRU whose entries expire after
+    `ttl_seconds`, and optionally pickled to `cache_dir` so they survive
+    restarts. Concurrent requests for the same key share one computation: the
+    first caller computes, the others wait for its result.
+    """
+
+    def __init__(self, max_items=1024, ttl_seconds=3600, cache_dir=None):
+        self.max_items = max_items
+        self.ttl = ttl_seconds
+        self.cache_dir = cache_dir
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+
+        self.counters = {'hits': 0, 'disk_hits': 0, 'misses': 0, 'coalesced': 0, 'evictions': 0, 'expirations': 0}
+        self._memory = OrderedDict()  # key -> (expires_at, result), least recently used first
+        self._in_flight = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(task, model, inputs, params):
+        payload = json.dumps([task, model, inputs, params], sort_keys=True, default=repr)
+        return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+    def get_or_compute(self, key, compute):
+        """Return the cached result for `key`, or compute it (once, however many callers ask)"""
+        with self._lock:
+            result = self._get_memory(key)
+            if result is not None:
+                self.counters['hits'] += 1
+                return copy.deepcopy(result)
+
+            future = self._in_flight.get(key)
+            owner = future is None
+            if owner:
+                future = self._in_flight[key] = Future()
+                self.counters['misses'] += 1
+            else:
+                self.counters['coalesced'] += 1
+
+        if not owner:
+            return copy.deepcopy(future.result())
+
+        try:
+            result = self._get_disk(key)
+            if result is not None:
+                with self._lock:
+                    self.counters['disk_hits'] += 1
+            else:
+                result = compute()
+                self._put_disk(key, result)
+            with self._lock:
+                self._put_memory(key, result)
+            future.set_result(result)
+        except BaseException as e:
+            # Failures aren't cached, the next request tries again
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                del self._in_flight[key]
+        return copy.deepcopy(result)
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+
+    def stats(self):
+        with self._lock:
+            return {**self.counters, 'memory_items': len(self._memory), 'in_flight': len(self._in_flight)}
+
+    def _get_memory(self, key):
+        entry = self._memory.get(key)
+        if entry is None:
+            return None
+        expires_at, result = entry
+        if expires_at < time.monotonic():
+            del self._memory[key]
+            self.counters['expirations'] += 1
+            return None
+        self._memory.move_to_end(key)
+        return result
+
+    def _put_memory(self, key, result):
+        self._memory[key] = (time.monotonic() + self.ttl, result)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_items:
+            self._memory.popitem(last=False)
+            self.counters['evictions'] += 1
+
+    def _disk_path(self, key):
+        return os.path.join(self.cache_dir, key[:2], f"{key}.pkl")
+
+    def _get_disk(self, key):
+        if not self.cache_dir:
+            return None
+        path = self._disk_path(key)
+        try:
+            # The modification time is the write time, so the TTL applies on disk too
+            if time.time() - os.path.getmtime(path) > self.ttl:
+                os.remove(path)
+                with self._lock:
+                    self.counters['expirations'] += 1
+                return None
+            with open(path, 'rb') as f:
+                return pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError):
+            return None
+
+    def _put_disk(self, key, result):
+        if not self.cache_dir:
+            return
+        path = self._disk_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with atomic_path(path) as tmp_path, open(tmp_path, 'wb') as f:
+            pickle.dump(result, f)
+
+
+def generator_samples(model_id):
+    """Whether the text-generation pipeline samples by default with `model_id`, from its config files alone"""
+    from transformers import AutoConfig, GenerationConfig, TextGenerationPipeline
+
+    config = AutoConfig.from_pretrained(model_id)
+    try:
+        generation_config = GenerationConfig.from_pretrained(model_id)
+    except OSError:  # No generation_config.json
+        generation_config = GenerationConfig.from_model_config(config)
+    # Same priority as the pipeline: its own default, then the model's generation config
+    # where it differs from the library default, then the model's task-specific parameters
+    samples = getattr(TextGenerationPipeline, '_default_generation_config', GenerationConfig()).do_sample
+    if generation_config.do_sample != GenerationConfig().do_sample:
+        samples = generation_config.do_sample
+    params = (config.task_specific_params or {}).get('text-generation', {})
+    return bool(params.get('do_sample', samples))
+
+
+class MemoizedEngine:
+    """Serve repeated engine calls from a ResultCache.
+
+    Wraps an `NLPEngine` (or anything exposing its methods, like the
+    micro-batching scheduler) and memoizes the deterministic tasks in
+    `MEMOIZED_METHODS`, keyed on (task, model, normalized input, parameters).
+    Text generation is only memoized when it doesn't sample, or when a seed is
+    fixed: both give the same output whether or not the scheduler batches the
+    call (generate_text_batch neither pads prompts nor shares a seed between
+    them). Every other attribute is forwarded to the wrapped engine.
+    """
+
+    def __init__(self, engine, cache):
+        self.engine = engine
+        self.result_cache = cache
+        # Quantized models give slightly different results, keep them apart
+        suffix = '-int8' if getattr(engine, 'quantized', False) else ''
+        self.cache_model_ids = {name: model_id + suffix for name, model_id in engine.model_ids.items()}
+
+        # Argument names come from the NLPEngine itself, wrappers like the scheduler take *args
+        base = engine
+        while hasattr(base, 'engine'):
+            base = base.engine
+        self._signatures = {name: inspect.signature(getattr(base, name)) for name in MEMOIZED_METHODS}
+        # The sentiment cascade's answers depend on its linear model and threshold
+        if getattr(base, 'sentiment_cascade', None):
+            self.cache_model_ids['sentiment'] += '-' + base.sentiment_cascade.cache_id
+        self._generator_samples = None
+
+    def __getattr__(self, name):
+        if name in MEMOIZED_METHODS:
+            method = getattr(self.engine, name)
+
+            def call(*args, **kwargs):
+                return self._call(name, method, args, kwargs)
+            call.__name__ = name
+            return call
+        return getattr(self.engine, name)
+
+    def _call(self, name, method, args, kwargs):
+        model, text_names, normalize = MEMOIZED_METHODS[name]
+        bound = self._signatures[name].bind(*args, **kwargs)
+        bound.apply_defaults()
+        params = {key: value for key, value in bound.arguments.items() if key not in text_names}
+
+        if name == 'generate_text' and params.get('seed') is None and self._samples(params.get('do_sample')):
+            return method(*args, **kwargs)
+
+        inputs = [bound.arguments[key] for key in text_names]
+        if normalize:
+            inputs = [normalize_text(text) for text in inputs]
+        key = self.result_cache.key(name, self.cache_model_ids[model], inputs, params)
+        return self.result_cache.get_or_compute(key, lambda: method(*args, **kwargs))
+
+    def _samples(self, do_sample=None):
+        if do_sample is not None:
+            return do_sample
+        if self._generator_samples is None:
+            self._generator_samples = generator_samples(self.engine.model_ids['generator'])
+        return self._generator_samples
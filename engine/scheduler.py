@@ -0,0 +1,204 @@
+import inspect
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+
+# Single-input engine method -> (batch method, names of the per-item arguments).
+# The remaining arguments are parameters: only requests with identical parameters
+# are put in the same forward pass. Concurrent generate_text prompts only share a
+# forward pass when they have the same token length (see generate_text_batch), so
+# one user's prompt can't shorten or change another's generation.
+BATCHED_METHODS = {
+    'analyze_sentiment': ('analyze_sentiment_batch', ['text']),
+    'summarize_text': ('summarize_batch', ['text']),
+    'extract_entities': ('extract_entities_batch', ['text']),
+    'answer_question': ('answer_question_batch', ['question', 'context']),
+    'generate_text': ('generate_text_batch', ['prompt']),
+    'get_embeddings': ('get_embeddings', ['text_or_texts']),
+}
+
+
+class _Request:
+    __slots__ = ('items', 'params', 'future', 'enqueued_at')
+
+    def __init__(self, items, params):
+        self.items = items
+        self.params = params
+        self.future = Future()
+        self.enqueued_at = time.perf_counter()
+
+
+class MicroBatchScheduler:
+    """Collect concurrent single-input engine calls into micro-batches.
+
+    Every batchable task gets a queue and a worker thread. The worker waits for a
+    request, then keeps collecting requests for up to `max_wait_ms` (or until
+    `max_batch_size` is reached) and runs them through the engine's batch method
+    in one forward pass, resolving each caller's future with its own result.
+
+    The scheduler exposes the same methods as `NLPEngine`, so it can be handed to
+    the UI components in place of the engine. Anything that isn't batchable is
+    forwarded to the engine unchanged.
+    """
+
+    def __init__(self, engine, max_batch_size=16, max_wait_ms=10, stats_window=500):
+        self.engine = engine
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+
+        self._queues = {}
+        self._workers = {}
+        self._stats = {}
+        self._stats_window = stats_window
+        self._lock = threading.Lock()
+        self._closed = False
+
+    def __getattr__(self, name):
+        if name in BATCHED_METHODS:
+            def call(*args, **kwargs):
+                return self.submit(name, *args, **kwargs).result()
+            call.__name__ = name
+            return call
+        return getattr(self.engine, name)
+
+    def submit(self, task, *args, **kwargs):
+        """Queue a single-input call to `task` and return a Future with its result"""
+        if self._closed:
+            raise RuntimeError("Scheduler has been shut down")
+
+        _, item_names = BATCHED_METHODS[task]
+        bound = inspect.signature(getattr(self.engine, task)).bind(*args, **kwargs)
+        bound.apply_defaults()
+        items = tuple(bound.arguments[name] for name in item_names)
+        params = {name: value for name, value in bound.arguments.items() if name not in item_names}
+
+        request = _Request(items, params)
+        self._queue_for(task).put(request)
+        return request.future
+
+    def stats(self):
+        """Return queue depth and achieved batch sizes per task"""
+        with self._lock:
+            result = {}
+            for task, stats in self._stats.items():
+                sizes = list(stats['batch_sizes'])
+                waits = list(stats['wait_ms'])
+                result[task] = {
+                    'queue_depth': self._queues[task].qsize(),
+                    'requests': stats['requests'],
+                    'batches': stats['batches'],
+                    'mean_batch_size': round(sum(sizes) / len(sizes), 2) if sizes else 0,
+                    'max_batch_size': max(sizes) if sizes else 0,
+                    'mean_wait_ms': round(sum(waits) / len(waits), 2) if waits else 0,
+                }
+            return result
+
+    def shutdown(self):
+        """Stop the worker threads after the queued requests have been served"""
+        self._closed = True
+        with self._lock:
+            for task_queue in self._queues.values():
+                task_queue.put(None)
+            workers = list(self._workers.values())
+        for worker in workers:
+            worker.join()
+
+    def _queue_for(self, task):
+        with self._lock:
+            if task not in self._queues:
+                self._queues[task] = queue.Queue()
+                self._stats[task] = {
+                    'requests': 0,
+                    'batches': 0,
+                    'batch_sizes': deque(maxlen=self._stats_window),
+                    'wait_ms': deque(maxlen=self._stats_window),
+                }
+                worker = threading.Thread(target=self._run, args=(task,), name=f"scheduler-{task}", daemon=True)
+                self._workers[task] = worker
+                worker.start()
+            return self._queues[task]
+
+    def _run(self, task):
+        task_queue = self._queues[task]
+        while True:
+            first = task_queue.get()
+            if first is None:
+                return
+
+            # Collect whatever else arrives within the wait window
+            batch = [first]
+            deadline = first.enqueued_at + self.max_wait
+            stop = False
+            while len(batch) < self.max_batch_size:
+                timeout = deadline - time.perf_counter()
+                try:
+                    request = task_queue.get(timeout=timeout) if timeout > 0 else task_queue.get_nowait()
+                except queue.Empty:
+                    break
+                if request is None:
+                    stop = True
+                    break
+                batch.append(request)
+
+            # Requests with different parameters (e.g. max_length) can't share a forward pass
+            groups = {}
+            for request in batch:
+                groups.setdefault(repr(sorted(request.params.items())), []).append(request)
+            for requests in groups.values():
+                self._dispatch(task, requests)
+
+            if stop:
+                return
+
+    def _dispatch(self, task, requests):
+        started = time.perf_counter()
+        with self._lock:
+            stats = self._stats[task]
+            stats['requests'] += len(requests)
+            stats['batches'] += 1
+            stats['batch_sizes'].append(len(requests))
+            stats['wait_ms'].extend((started - r.enqueued_at) * 1000 for r in requests)
+
+        try:
+            results = self._run_batch(task, requests)
+        except Exception as e:
+            if len(requests) == 1:
+                requests[0].future.set_exception(e)
+                return
+            # Don't let one bad input fail everyone else's request, retry them one by one
+            for request in requests:
+                self._dispatch_single(task, request)
+            return
+
+        for request, result in zip(requests, results):
+            request.future.set_result(result)
+
+    def _dispatch_single(self, task, request):
+        try:
+            request.future.set_result(self._run_batch(task, [request])[0])
+        except Exception as e:
+            request.future.set_exception(e)
+
+    def _run_batch(self, task, requests):
+        batch_method, _ = BATCHED_METHODS[task]
+        params = requests[0].params
+
+        if task == 'get_embeddings':
+            return self._run_embeddings(requests, params)
+
+        columns = [list(column) for column in zip(*(r.items for r in requests))]
+        return getattr(self.engine, batch_method)(*columns, **params, batch_size=len(requests))
+
+    def _run_embeddings(self, requests, params):
+        # Each caller passes either one text or a list of texts, encode them all together
+        texts, spans = [], []
+        for request in requests:
+            text_or_texts = request.items[0]
+            start = len(texts)
+            texts.extend([text_or_texts] if isinstance(text_or_texts, str) else text_or_texts)
+            spans.append((start, len(texts), isinstance(text_or_texts, str)))
+
+        embeddings = self.engine.get_embeddings(texts, **params)
+        return [embeddings[start] if single else embeddings[start:end] for start, end, single in spans]
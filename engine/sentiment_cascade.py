@@ -0,0 +1,235 @@
+import argparse
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+import zlib
+
+import numpy as np
+
+from engine.atomic_write import atomic_path
+from engine.bulk import read_texts
+
+TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]")
+
+
+class HashedNgramClassifier:
+    """Binary logistic regression over hashed word unigrams and bigrams, in numpy.
+
+    Words (and punctuation, "!" carries sentiment) are hashed into `n_features`
+    buckets, so there is no vocabulary to build or store. It is trained on the
+    transformer's own probabilities (distillation), so it learns to imitate the
+    model it stands in for rather than the labels of some dataset.
+    """
+
+    def __init__(self, labels, n_features=2 ** 18, ngram=2, weights=None):
+        self.labels = list(labels)  # [negative label, positive label], as named by the transformer
+        self.n_features = n_features
+        self.ngram = ngram
+        # The last weight is the bias, a feature every text has
+        self.weights = np.zeros(n_features + 1, dtype=np.float32) if weights is None else weights
+
+    @property
+    def fingerprint(self):
+        return hashlib.sha256(self.weights.tobytes()).hexdigest()[:12]
+
+    def _features(self, text):
+        tokens = TOKEN_PATTERN.findall(text.lower())
+        grams = list(tokens)
+        for n in range(2, self.ngram + 1):
+            grams += [' '.join(tokens[i:i + n]) for i in range(len(tokens) - n + 1)]
+        # crc32 rather than hash(), which is salted per process
+        return np.unique([zlib.crc32(gram.encode('utf-8')) % self.n_features for gram in grams]).astype(np.int64)
+
+    def _featurize(self, texts):
+        """Sparse rows as (feature indices, values, row of every index), every row scaled to unit norm"""
+        rows = [self._features(text) for text in texts]
+        lengths = np.array([len(row) + 1 for row in rows])
+        indices = np.concatenate([np.append(row, self.n_features) for row in rows])
+        values = np.repeat(1 / np.sqrt(lengths), lengths).astype(np.float32)
+        return indices, values, np.repeat(np.arange(len(texts)), lengths)
+
+    def _logits(self, features, n_rows):
+        indices, values, row_ids = features
+        return np.bincount(row_ids, weights=self.weights[indices] * values, minlength=n_rows)
+
+    def predict_proba(self, texts):
+        """Probability of the positive label for every text"""
+        if not texts:
+            return np.zeros(0)
+        return 1 / (1 + np.exp(-self._logits(self._featurize(texts), len(texts))))
+
+    def fit(self, texts, targets, epochs=10, batch_size=256, learning_rate=0.5, l2=1e-6, seed=0):
+        """Fit to soft targets (probabilities of the positive label) with mini-batch Adagrad"""
+        targets = np.asarray(targets, dtype=np.float64)
+        rng = np.random.default_rng(seed)
+        squared_gradients = np.full_like(self.weights, 1e-8, dtype=np.float64)
+        batches = [texts[i:i + batch_size] for i in range(0, len(texts), batch_size)]
+        features = [self._featurize(batch) for batch in batches]
+        for _ in range(epochs):
+            for b in rng.permutation(len(batches)):
+                indices, values, row_ids = features[b]
+                start = b * batch_size
+                probabilities = 1 / (1 + np.exp(-self._logits(features[b], len(batches[b]))))
+                errors = probabilities - targets[start:start + len(batches[b])]
+                gradient = np.bincount(indices, weights=errors[row_ids] * values, minlength=len(self.weights))
+                gradient = gradient / len(batches[b]) + l2 * self.weights
+                squared_gradients += gradient ** 2
+                self.weights -= (learning_rate * gradient / np.sqrt(squared_gradients)).astype(np.float32)
+        return self
+
+    def save(self, path):
+        with atomic_path(path) as tmp_path, open(tmp_path, 'wb') as f:
+            np.savez(f, weights=self.weights, labels=np.array(self.labels), ngram=self.ngram)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            weights = data['weights']
+            return cls(data['labels'].tolist(), n_features=len(weights) - 1, ngram=int(data['ngram']), weights=weights)
+
+
+class SentimentCascade:
+    """Answer with the linear model when it is confident enough, escalate the other texts to the transformer"""
+
+    def __init__(self, classifier, threshold=0.9):
+        self.classifier = classifier
+        self.threshold = threshold
+        # Updated from the scheduler, server and Streamlit threads
+        self.counts = {'linear': 0, 'transformer': 0}
+        self._lock = threading.Lock()
+
+    @property
+    def cache_id(self):
+        return f"cascade-{self.classifier.fingerprint}-{self.threshold}"
+
+    def stats(self):
+        with self._lock:
+            return dict(self.counts)
+
+    def escalation_rate(self):
+        counts = self.stats()
+        total = sum(counts.values())
+        return counts['transformer'] / total if total else None
+
+    def classify(self, texts, escalate):
+        """One [{'label', 'score'}] per text, like the sentiment pipeline; `escalate(texts)` runs the transformer"""
+        probabilities = self.classifier.predict_proba(texts)
+        confidences = np.maximum(probabilities, 1 - probabilities)
+        results = [
+            [{'label': self.classifier.labels[int(p >= 0.5)], 'score': float(c)}]
+            for p, c in zip(probabilities, confidences)
+        ]
+        uncertain = [i for i, confidence in enumerate(confidences) if confidence < self.threshold]
+        if uncertain:
+            for i, result in zip(uncertain, escalate([texts[i] for i in uncertain])):
+                results[i] = result
+        with self._lock:
+            self.counts['transformer'] += len(uncertain)
+            self.counts['linear'] += len(texts) - len(uncertain)
+        return results
+
+
+def _positive_probabilities(engine, results):
+    positive = engine.models.get('sentiment').model.config.id2label[1]
+    return [r[0]['score'] if r[0]['label'] == positive else 1 - r[0]['score'] for r in results]
+
+
+def distill(engine, texts, batch_size=32, **fit_kwargs):
+    """Train a HashedNgramClassifier on the sentiment model's outputs for `texts`"""
+    id2label = engine.models.get('sentiment').model.config.id2label
+    if len(id2label) != 2:
+        raise ValueError(f"The cascade needs a binary sentiment model, this one has {len(id2label)} labels")
+    results = engine._sentiment_batch(texts, batch_size=batch_size)
+    classifier = HashedNgramClassifier([id2label[0], id2label[1]])
+    return classifier.fit(texts, _positive_probabilities(engine, results), **fit_kwargs)
+
+
+def cascade_report(engine, texts, thresholds=(0.8, 0.9, 0.95), test_fraction=0.3, batch_size=32, seed=0):
+    """Distill a linear model on part of `texts` and compare the cascade to the transformer on the rest"""
+    texts = list(texts)
+    random.Random(seed).shuffle(texts)
+    n_test = max(1, int(len(texts) * test_fraction))
+    train, test = texts[n_test:], texts[:n_test]
+
+    start = time.perf_counter()
+    classifier = distill(engine, train, batch_size=batch_size)
+    train_seconds = time.perf_counter() - start
+
+    full_model = lambda batch: engine._sentiment_batch(batch, batch_size=batch_size)  # noqa: E731
+    full_model(test[:batch_size])  # Warm up
+    start = time.perf_counter()
+    reference = full_model(test)
+    full_rate = len(test) / (time.perf_counter() - start)
+    reference_labels = [r[0]['label'] for r in reference]
+
+    def agreement(results):
+        return sum(r[0]['label'] == label for r, label in zip(results, reference_labels)) / len(test)
+
+    # Threshold 0 never escalates: the linear model on its own
+    report = {
+        'train_texts': len(train),
+        'test_texts': len(test),
+        'train_seconds': round(train_seconds, 2),
+        'transformer': {'items_per_sec': round(full_rate, 1)},
+        'cascade': [],
+    }
+    for threshold in (0.0, *thresholds):
+        cascade = SentimentCascade(classifier, threshold)
+        start = time.perf_counter()
+        results = cascade.classify(test, full_model)
+        rate = len(test) / (time.perf_counter() - start)
+        report['cascade'].append({
+            'threshold': threshold,
+            'escalation_rate': round(cascade.escalation_rate(), 3),
+            'agreement': round(agreement(results), 3),
+            'items_per_sec': round(rate, 1),
+            'speedup': round(rate / full_rate, 2),
+        })
+    return report, classifier
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Distill a linear sentiment model from the transformer and evaluate the cascade")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    train = commands.add_parser('train', help="Train the linear model on the transformer's outputs for a corpus")
+    train.add_argument('texts', help="Text file (one text per line), or JSONL/CSV file with a text field")
+    train.add_argument('--output', required=True, help="Where to save the linear model (.npz)")
+
+    report = commands.add_parser('report', help="Escalation rate, agreement and throughput on a held-out split")
+    report.add_argument('texts', help="Text file (one text per line), or JSONL/CSV file with a text field")
+    report.add_argument('--thresholds', default='0.8,0.9,0.95', help="Comma-separated confidence thresholds")
+    report.add_argument('--test-fraction', type=float, default=0.3)
+    report.add_argument('--save', help="Also save the linear model trained on the training split (.npz)")
+    report.add_argument('--output', help="Write the report as JSON to this file")
+
+    for command in (train, report):
+        command.add_argument('--field', default='text', help="Text field of JSONL/CSV records")
+        command.add_argument('--batch-size', type=int, default=32)
+    args = parser.parse_args()
+
+    from nlp_engine import NLPEngine
+
+    engine = NLPEngine(device=-1, embedding_cache_dir=False, sentiment_cascade=False)
+    texts = read_texts(args.texts, args.field)
+    if args.command == 'train':
+        distill(engine, texts, batch_size=args.batch_size).save(args.output)
+        print(f"Linear model trained on {len(texts)} texts, saved to {args.output}")
+        return
+
+    result, classifier = cascade_report(
+        engine, texts, [float(t) for t in args.thresholds.split(',')], args.test_fraction, args.batch_size
+    )
+    print(json.dumps(result, indent=2))
+    if args.save:
+        classifier.save(args.save)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(result, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
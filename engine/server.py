@@ -0,0 +1,319 @@
+import argparse
+import asyncio
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+
+import numpy as np
+
+from engine.instrumentation import METRICS
+
+# Endpoint -> (single-input method, batch method, per-item fields, allowed parameters).
+# A body with the item fields runs one input, a body with "inputs" (a list of items,
+# or of plain strings for single-field tasks) runs them as one batch.
+ENDPOINTS = {
+    'sentiment': ('analyze_sentiment', 'analyze_sentiment_batch', ['text'], []),
+    'summarize': ('summarize_text', 'summarize_batch', ['text'], ['max_length', 'min_length']),
+    'entities': ('extract_entities', 'extract_entities_batch', ['text'], []),
+    'answer': ('answer_question', 'answer_question_batch', ['question', 'context'], []),
+    'generate': ('generate_text', 'generate_text_batch', ['prompt'], ['max_length', 'num_return_sequences', 'seed', 'speculative', 'do_sample']),
+    'embeddings': ('get_embeddings', 'get_embeddings', ['text'], []),
+}
+
+MAX_BATCH_INPUTS = 256
+
+# Request parameter -> (type, lowest, highest allowed value, whether null keeps the
+# engine's default). Lengths are capped at the models' context size so a single
+# request can't hold a slot indefinitely.
+PARAMETER_LIMITS = {
+    'max_length': (int, 1, 1024, False),
+    'min_length': (int, 0, 1024, False),
+    'num_return_sequences': (int, 1, 8, False),
+    'seed': (int, 0, 2 ** 32 - 1, True),
+    'speculative': (bool, None, None, True),
+    'do_sample': (bool, None, None, True),
+}
+
+
+class HTTPError(Exception):
+    def __init__(self, status, message, headers=None):
+        super().__init__(message)
+        self.status = status
+        self.headers = headers or {}
+
+
+def _to_json(value):
+    # Model outputs hold numpy scalars (scores) and tensors (embeddings)
+    if isinstance(value, np.generic):
+        return value.item()
+    if hasattr(value, 'tolist'):
+        return value.tolist()
+    raise TypeError(f"Can't serialize {type(value).__name__}")
+
+
+class NLPServer:
+    """Serve the engine's tasks as JSON endpoints over HTTP/1.1 with asyncio.
+
+    Model calls block, so they run on a bounded thread pool. Each task also has
+    its own concurrency limit (slow generation can't take every thread from fast
+    classification), and at most `max_queue` requests may wait for a slot before
+    new ones are turned away with 503.
+
+    Every response carries a `Server-Timing` header with the time spent waiting
+    for a slot (`queue`), in the model call (`compute`) and in total.
+    """
+
+    def __init__(self, engine, threads=4, task_concurrency=None, max_queue=64, max_body_bytes=10 * 1024 * 1024):
+        self.engine = engine
+        self.max_queue = max_queue
+        self.max_body_bytes = max_body_bytes
+        self.executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="nlp-server")
+
+        limits = {task: threads for task in ENDPOINTS}
+        limits.update(task_concurrency or {})
+        self.limits = limits
+        self._semaphores = None
+        self._waiting = {task: 0 for task in ENDPOINTS}
+
+    async def serve(self, host='0.0.0.0', port=8000):
+        self._semaphores = {task: asyncio.Semaphore(limit) for task, limit in self.limits.items()}
+        server = await asyncio.start_server(self._handle_connection, host, port)
+        print(f"Serving NLP endpoints on http://{host}:{port}")
+        async with server:
+            await server.serve_forever()
+
+    async def _handle_connection(self, reader, writer):
+        try:
+            while True:
+                request = await self._read_request(reader)
+                if request is None:
+                    break
+                method, path, headers, body = request
+                status, payload, extra_headers = await self._respond(method, path, body)
+                keep_alive = headers.get('connection', '').lower() != 'close'
+                self._write_response(writer, status, payload, extra_headers, keep_alive)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        except HTTPError as e:
+            # Malformed request, answer and drop the connection
+            self._write_response(writer, e.status, {'error': str(e)}, e.headers, keep_alive=False)
+        finally:
+            writer.close()
+
+    async def _read_request(self, reader):
+        request_line = await reader.readline()
+        if not request_line:
+            return None
+        try:
+            method, target, _ = request_line.decode('latin-1').split()
+        except ValueError:
+            raise HTTPError(HTTPStatus.BAD_REQUEST, "Malformed request line")
+
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+
+        try:
+            length = int(headers.get('content-length', 0) or 0)
+        except ValueError:
+            raise HTTPError(HTTPStatus.BAD_REQUEST, "Invalid Content-Length")
+        if length < 0:
+            raise HTTPError(HTTPStatus.BAD_REQUEST, "Invalid Content-Length")
+        if length > self.max_body_bytes:
+            raise HTTPError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, "Request body too large")
+        body = await reader.readexactly(length) if length else b''
+        return method, target.split('?')[0], headers, body
+
+    def _write_response(self, writer, status, payload, headers, keep_alive):
+        if isinstance(payload, str):
+            body, content_type = payload.encode(), 'text/plain; version=0.0.4; charset=utf-8'
+        else:
+            body, content_type = json.dumps(payload, default=_to_json).encode(), 'application/json'
+        status = HTTPStatus(status)
+        lines = [
+            f"HTTP/1.1 {status.value} {status.phrase}",
+            f"Content-Type: {content_type}",
+            f"Content-Length: {len(body)}",
+            f"Connection: {'keep-alive' if keep_alive else 'close'}",
+        ] + [f"{name}: {value}" for name, value in headers.items()]
+        writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1') + body)
+
+    async def _respond(self, method, path, body):
+        start = time.perf_counter()
+        status, payload, headers = await self._route(method, path, body, start)
+        # Unknown paths share one label, so scanners can't blow up the number of series
+        endpoint = path if status != HTTPStatus.NOT_FOUND else 'unknown'
+        METRICS.observe('nlp_http_request_seconds', time.perf_counter() - start, path=endpoint, status=int(status))
+        return status, payload, headers
+
+    async def _route(self, method, path, body, start):
+        try:
+            if method == 'GET' and path == '/health':
+                return HTTPStatus.OK, {'status': 'ok'}, {}
+            if method == 'GET' and path == '/metrics':
+                return HTTPStatus.OK, METRICS.render_prometheus(), {}
+            if method == 'GET' and path == '/stats':
+                return HTTPStatus.OK, self._stats(), {}
+
+            task = path.strip('/')
+            if task not in ENDPOINTS:
+                raise HTTPError(HTTPStatus.NOT_FOUND, f"Unknown endpoint: {path}")
+            if method != 'POST':
+                raise HTTPError(HTTPStatus.METHOD_NOT_ALLOWED, "Use POST with a JSON body", {'Allow': 'POST'})
+            try:
+                request = json.loads(body or b'{}')
+            except ValueError:
+                raise HTTPError(HTTPStatus.BAD_REQUEST, "Body is not valid JSON")
+            if not isinstance(request, dict):
+                raise HTTPError(HTTPStatus.BAD_REQUEST, "Body must be a JSON object")
+
+            call, batch_size = self._prepare_call(task, request)
+            result, queue_seconds, compute_seconds = await self._run(task, call)
+            headers = {
+                'Server-Timing': f"queue;dur={queue_seconds * 1000:.1f}, compute;dur={compute_seconds * 1000:.1f}, "
+                                 f"total;dur={(time.perf_counter() - start) * 1000:.1f}",
+                'X-Batch-Size': batch_size,
+            }
+            return HTTPStatus.OK, {'result': result}, headers
+        except HTTPError as e:
+            return e.status, {'error': str(e)}, e.headers
+        except Exception as e:
+            return HTTPStatus.INTERNAL_SERVER_ERROR, {'error': f"{type(e).__name__}: {e}"}, {}
+
+    def _prepare_call(self, task, request):
+        """Turn a request body into a zero-argument engine call, returns (call, number of inputs)"""
+        method, batch_method, fields, allowed = ENDPOINTS[task]
+        params = {name: self._parameter(name, request[name]) for name in allowed if name in request}
+
+        if 'inputs' in request:
+            inputs = request['inputs']
+            if not isinstance(inputs, list) or not inputs:
+                raise HTTPError(HTTPStatus.BAD_REQUEST, "'inputs' must be a non-empty list")
+            if len(inputs) > MAX_BATCH_INPUTS:
+                raise HTTPError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, f"At most {MAX_BATCH_INPUTS} inputs per request")
+            columns = [[] for _ in fields]
+            for item in inputs:
+                values = [item] if isinstance(item, str) and len(fields) == 1 else self._fields(item, fields)
+                for column, value in zip(columns, values):
+                    column.append(value)
+            engine_method = getattr(self.engine, batch_method)
+            return lambda: engine_method(*columns, **params), len(inputs)
+
+        values = self._fields(request, fields)
+        engine_method = getattr(self.engine, method)
+        return lambda: engine_method(*values, **params), 1
+
+    @staticmethod
+    def _parameter(name, value):
+        kind, lowest, highest, nullable = PARAMETER_LIMITS[name]
+        if value is None and nullable:
+            return value
+        # bool is a subclass of int, but true isn't a length
+        if kind is int and (not isinstance(value, int) or isinstance(value, bool)):
+            raise HTTPError(HTTPStatus.BAD_REQUEST, f"'{name}' must be an integer")
+        if kind is bool and not isinstance(value, bool):
+            raise HTTPError(HTTPStatus.BAD_REQUEST, f"'{name}' must be true, false or null")
+        if lowest is not None and not lowest <= value <= highest:
+            raise HTTPError(HTTPStatus.BAD_REQUEST, f"'{name}' must be between {lowest} and {highest}")
+        return value
+
+    @staticmethod
+    def _fields(item, fields):
+        if not isinstance(item, dict) or not all(isinstance(item.get(name), str) for name in fields):
+            raise HTTPError(HTTPStatus.BAD_REQUEST, f"Expected string fields: {', '.join(fields)}")
+        return [item[name] for name in fields]
+
+    async def _run(self, task, call):
+        """Run `call` on the thread pool once the task has a free slot"""
+        semaphore = self._semaphores[task]
+        if semaphore.locked() and self._waiting[task] >= self.max_queue:
+            raise HTTPError(HTTPStatus.SERVICE_UNAVAILABLE, f"Too many queued '{task}' requests", {'Retry-After': 1})
+
+        queued = time.perf_counter()
+        self._waiting[task] += 1
+        try:
+            await semaphore.acquire()
+        finally:
+            self._waiting[task] -= 1
+        try:
+            started = time.perf_counter()
+            result = await asyncio.get_running_loop().run_in_executor(self.executor, call)
+            return result, started - queued, time.perf_counter() - started
+        finally:
+            semaphore.release()
+
+    def _stats(self):
+        stats = {
+            'concurrency_limits': self.limits,
+            'waiting': dict(self._waiting),
+            'models': self.engine.models.stats(),
+        }
+        result_cache = getattr(self.engine, 'result_cache', None)
+        if result_cache is not None:
+            stats['result_cache'] = result_cache.stats()
+        if hasattr(self.engine, 'submit'):
+            stats['scheduler'] = self.engine.stats()
+        return stats
+
+
+def _task_limits(value):
+    """Parse 'generate=1,summarize=2' into {'generate': 1, 'summarize': 2}"""
+    limits = {}
+    for pair in filter(None, value.split(',')):
+        task, _, limit = pair.partition('=')
+        if task not in ENDPOINTS:
+            raise argparse.ArgumentTypeError(f"Unknown task: {task}")
+        limits[task] = int(limit)
+    return limits
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the NLP engine's tasks as JSON endpoints")
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=int(os.environ.get('NLP_SERVER_PORT', 8000)))
+    parser.add_argument('--threads', type=int, default=int(os.environ.get('NLP_SERVER_THREADS', 4)),
+                        help="Threads running model calls")
+    parser.add_argument('--task-concurrency', type=_task_limits, default={},
+                        help="Per-task limits on concurrent model calls, e.g. generate=1,summarize=1 (default: --threads)")
+    parser.add_argument('--max-queue', type=int, default=64, help="Requests per task allowed to wait for a slot")
+    parser.add_argument('--no-scheduler', action='store_true', help="Don't micro-batch concurrent single-input requests")
+    parser.add_argument('--no-result-cache', action='store_true', help="Don't memoize results")
+    args = parser.parse_args()
+
+    import torch
+    from nlp_engine import NLPEngine
+
+    engine = NLPEngine(device=0 if torch.cuda.is_available() else -1)
+    if not args.no_scheduler:
+        from engine.scheduler import MicroBatchScheduler
+        engine = MicroBatchScheduler(
+            engine,
+            max_batch_size=int(os.environ.get("NLP_MAX_BATCH_SIZE", 16)),
+            max_wait_ms=float(os.environ.get("NLP_BATCH_MAX_WAIT_MS", 10))
+        )
+    if not args.no_result_cache:
+        from engine.result_cache import MemoizedEngine, ResultCache
+        engine = MemoizedEngine(engine, ResultCache(
+            max_items=int(os.environ.get("NLP_RESULT_CACHE_SIZE", 1024)),
+            ttl_seconds=float(os.environ.get("NLP_RESULT_CACHE_TTL", 3600)),
+            cache_dir=os.environ.get("NLP_RESULT_CACHE_DIR")
+        ))
+
+    server = NLPServer(engine, threads=args.threads, task_concurrency=args.task_concurrency, max_queue=args.max_queue)
+    try:
+        asyncio.run(server.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+import argparse
+import ctypes
+import json
+import os
+import struct
+
+import numpy as np
+import torch
+import transformers
+from safetensors.torch import save_model
+
+from engine.atomic_write import atomic_path
+
+SAFETENSORS_DTYPES = {
+    'F64': torch.float64, 'F32': torch.float32, 'F16': torch.float16, 'BF16': torch.bfloat16,
+    'I64': torch.int64, 'I32': torch.int32, 'I16': torch.int16, 'I8': torch.int8, 'U8': torch.uint8, 'BOOL': torch.bool,
+}
+
+
+def mmap_state_dict(path):
+    """Map a safetensors file into memory and return its tensors without copying them.
+
+    The file is mapped copy-on-write: pages are read from the page cache on first
+    use and shared by every process mapping the same file. A process writing to a
+    tensor only gets a private copy of the touched pages, the file never changes.
+    """
+    with open(path, 'rb') as f:
+        header_size = struct.unpack('<Q', f.read(8))[0]
+        header = json.loads(f.read(header_size))
+    header.pop('__metadata__', None)
+
+    data = torch.from_numpy(np.memmap(path, dtype=np.uint8, mode='c'))
+    start = 8 + header_size
+    tensors = {}
+    for name, info in header.items():
+        begin, end = info['data_offsets']
+        # safetensors aligns every tensor, so the byte view can be reinterpreted in place
+        tensors[name] = data[start + begin:start + end].view(SAFETENSORS_DTYPES[info['dtype']]).reshape(info['shape'])
+    return tensors
+
+
+def _release_free_memory():
+    # The private weights just dropped may stay in glibc's heap, hand them back to the OS
+    try:
+        ctypes.CDLL('libc.so.6').malloc_trim(0)
+    except (OSError, AttributeError):
+        pass
+
+
+class SharedWeightStore:
+    """Serve model weights from memory-mapped safetensors files, shared by every process on the host.
+
+    The first process to load a model exports its weights to `cache_dir`; from
+    then on every process rebinds the model's parameters to a read-only mapping of
+    that file. N workers on one machine then hold a single physical copy of the
+    weights in the page cache instead of N private ones.
+
+    Only for models on the CPU: the mapped tensors are in host memory, so sharing
+    a GPU model would move its parameters back to the CPU. The model is still
+    loaded into private memory first and only then remapped, so this lowers the
+    memory each process holds once it is up, not its peak while loading.
+    """
+
+    def __init__(self, cache_dir):
+        self.cache_dir = cache_dir
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def path(self, model_id):
+        safe_name = model_id.strip('/').replace('/', '--')
+        return os.path.join(self.cache_dir, f"{safe_name}-transformers{transformers.__version__}.safetensors")
+
+    def share(self, model_id, model):
+        """Point the parameters and buffers of `model` at the shared file for `model_id`, returns the model"""
+        if any(parameter.device.type != 'cpu' for parameter in model.parameters()):
+            raise ValueError(f"Shared weights need a model on the CPU, {model_id} is on {next(model.parameters()).device}")
+        path = self.path(model_id)
+        if not os.path.exists(path):
+            # save_model stores tied weights once, under one of their names. If another
+            # process publishes the file first, its copy is kept so every process maps the same file.
+            with atomic_path(path, overwrite=False) as tmp_path:
+                save_model(model, tmp_path)
+
+        # Tied weights are one Parameter under several names, updating it through any name updates all
+        state = model.state_dict(keep_vars=True)
+        for name, tensor in mmap_state_dict(path).items():
+            target = state[name]
+            if target.dtype != tensor.dtype or target.shape != tensor.shape:
+                raise ValueError(f"{path} doesn't match the model: {name} is {tensor.dtype}{list(tensor.shape)}")
+            target.data = tensor
+        _release_free_memory()
+        return model
+
+
+def process_memory(pid='self'):
+    """Unique (private) and shared resident memory of a process in bytes, from /proc/PID/smaps_rollup"""
+    fields = {}
+    with open(f'/proc/{pid}/smaps_rollup') as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == 'kB':
+                fields[parts[0].rstrip(':')] = int(parts[1]) * 1024
+    return {
+        'rss': fields['Rss'],
+        # Proportional set size: shared pages divided between the processes sharing them
+        'pss': fields['Pss'],
+        'unique': fields['Private_Clean'] + fields['Private_Dirty'],
+        'shared': fields['Shared_Clean'] + fields['Shared_Dirty'],
+    }
+
+
+# Model -> a call reading all of its weights, so they are resident when memory is measured
+WARMUP_CALLS = {
+    'sentiment': ('analyze_sentiment', ["The weights are only read on first use."]),
+    'summarizer': ('summarize_text', ["The weights are only read on first use. " * 8, 20, 5]),
+    'ner': ('extract_entities', ["The weights are only read on first use in Paris."]),
+    'qa': ('answer_question', ["When are the weights read?", "The weights are only read on first use."]),
+    'generator': ('generate_text', ["The weights are only read", 20]),
+    'sentence_model': ('get_embeddings', [["The weights are only read on first use."]]),
+}
+
+
+def memory_report(workers=2, tasks=None, shared_weights_dir=None, model_ids=None):
+    """Per-worker unique and shared memory of a worker pool with private weights, then with shared weights"""
+    from engine.worker_pool import TASK_METHODS, WorkerPool
+
+    tasks = tasks or list(TASK_METHODS)
+    shared_weights_dir = shared_weights_dir or os.path.join(os.path.expanduser('~'), '.cache', 'hf-ecosystem', 'shared-weights')
+    report = {}
+    for mode, weights_dir in (('private', False), ('shared', shared_weights_dir)):
+        engine_kwargs = {'embedding_cache_dir': False, 'shared_weights_dir': weights_dir, 'model_ids': model_ids}
+        pool = WorkerPool(workers, worker_tasks=[tasks] * workers, engine_kwargs=engine_kwargs, preload=True)
+        try:
+            for task in tasks:
+                # Idle workers are picked first, so submitting one call per worker reaches them all
+                method, call_args = WARMUP_CALLS[task]
+                for future in [pool.submit(method, *call_args) for _ in range(workers)]:
+                    future.result()
+            per_worker = [process_memory(worker['pid']) for worker in pool.stats()]
+        finally:
+            pool.shutdown()
+        report[mode] = {
+            'workers': per_worker,
+            'total_unique_mb': round(sum(m['unique'] for m in per_worker) / 1024 ** 2, 1),
+            'total_pss_mb': round(sum(m['pss'] for m in per_worker) / 1024 ** 2, 1),
+        }
+    report['pss_saved_mb'] = round(report['private']['total_pss_mb'] - report['shared']['total_pss_mb'], 1)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare worker memory with private and with shared memory-mapped weights")
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--tasks', help="Comma-separated models each worker loads (default: all)")
+    parser.add_argument('--cache-dir', help="Where the shared weight files are written")
+    parser.add_argument('--output', help="Write the report as JSON to this file")
+    args = parser.parse_args()
+
+    report = memory_report(
+        workers=args.workers,
+        tasks=args.tasks.split(',') if args.tasks else None,
+        shared_weights_dir=args.cache_dir
+    )
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+import argparse
+import json
+import time
+
+SAMPLE_PROMPTS = [
+    "In a world powered by AI,",
+    "The history of the printing press begins",
+    "Once upon a time, in a small village by the sea,",
+    "The most important thing to know about neural networks is",
+]
+
+
+class ForwardCounter:
+    """Count the forward passes of a model while in use"""
+
+    def __init__(self, model):
+        self.model = model
+        self.calls = 0
+        self._handle = None
+
+    def _hook(self, module, inputs, output):
+        self.calls += 1
+
+    def __enter__(self):
+        self.calls = 0
+        self._handle = self.model.register_forward_hook(self._hook)
+        return self
+
+    def __exit__(self, *exc_info):
+        self._handle.remove()
+
+
+def _run(engine, prompts, max_length, speculative):
+    """Generate greedily from every prompt, returns (texts, seconds, generator passes, draft passes)"""
+    main_model = engine.models.get('generator').model
+    draft_model = engine.models.get('draft_generator').model
+
+    texts, seconds = [], 0.0
+    with ForwardCounter(main_model) as main_passes, ForwardCounter(draft_model) as draft_passes:
+        for prompt in prompts:
+            start = time.perf_counter()
+            result = engine.generate_text(prompt, max_length=max_length, speculative=speculative, do_sample=False)
+            seconds += time.perf_counter() - start
+            texts.append(result[0]['generated_text'])
+    return texts, seconds, main_passes.calls, draft_passes.calls
+
+
+def speculative_report(engine, prompts=SAMPLE_PROMPTS, max_length=64, draft_tokens=(2, 4, 6)):
+    """Compare speculative decoding at several draft lengths against plain greedy decoding.
+
+    Plain greedy decoding runs one generator pass per new token, which gives the
+    number of tokens generated (the same with speculative decoding, as the outputs
+    are identical). Every verification pass of the generator accepts some of the
+    draft's tokens and adds one of its own, so the accepted draft tokens are the
+    new tokens minus the generator's passes, out of one proposed token per draft pass.
+    """
+    # Load both models and warm them up before timing
+    _run(engine, prompts[:1], max_length, speculative=True)
+
+    plain_texts, plain_seconds, tokens, _ = _run(engine, prompts, max_length, speculative=False)
+    plain_rate = tokens / plain_seconds
+    report = {
+        'plain': {'tokens': tokens, 'tokens_per_sec': round(plain_rate, 1)},
+        'speculative': [],
+    }
+    original_draft_tokens = engine.draft_tokens
+    try:
+        for k in draft_tokens:
+            engine.draft_tokens = k
+            texts, seconds, main_passes, draft_passes = _run(engine, prompts, max_length, speculative=True)
+            accepted = tokens - main_passes
+            report['speculative'].append({
+                'draft_tokens': k,
+                'acceptance_rate': round(accepted / draft_passes, 3) if draft_passes else None,
+                'tokens_per_generator_pass': round(tokens / main_passes, 2),
+                'tokens_per_sec': round(tokens / seconds, 1),
+                'speedup': round(tokens / seconds / plain_rate, 2),
+                'identical_to_greedy': texts == plain_texts,
+            })
+    finally:
+        engine.draft_tokens = original_draft_tokens
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare speculative decoding with a draft model against plain greedy decoding")
+    parser.add_argument('--draft-tokens', default='2,4,6', help="Comma-separated draft lengths to try")
+    parser.add_argument('--max-length', type=int, default=64)
+    parser.add_argument('--prompts', help="File with one prompt per line (default: built-in samples)")
+    parser.add_argument('--output', help="Write the report as JSON to this file")
+    args = parser.parse_args()
+
+    prompts = SAMPLE_PROMPTS
+    if args.prompts:
+        with open(args.prompts) as f:
+            prompts = [line.strip() for line in f if line.strip()]
+
+    from nlp_engine import NLPEngine
+
+    engine = NLPEngine(device=-1, embedding_cache_dir=False)
+    report = speculative_report(
+        engine, prompts, max_length=args.max_length, draft_tokens=[int(k) for k in args.draft_tokens.split(',')]
+    )
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
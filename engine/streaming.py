@@ -0,0 +1,140 @@
+import threading
+import time
+
+import torch
+from transformers import StoppingCriteria, StoppingCriteriaList, TextIteratorStreamer
+
+
+class _TimedStreamer(TextIteratorStreamer):
+    """TextIteratorStreamer that also counts generated tokens and when the first one arrived"""
+
+    def __init__(self, tokenizer, **kwargs):
+        super().__init__(tokenizer, **kwargs)
+        self.token_count = 0
+        self.first_token_time = None
+
+    def put(self, value):
+        if not (self.skip_prompt and self.next_tokens_are_prompt):
+            self.token_count += value.numel()
+            if self.first_token_time is None:
+                self.first_token_time = time.perf_counter()
+        super().put(value)
+
+
+class _CancelCriteria(StoppingCriteria):
+    """Stop generating as soon as the cancel event is set"""
+
+    def __init__(self, cancel_event):
+        self.cancel_event = cancel_event
+
+    def __call__(self, input_ids, scores, **kwargs):
+        return torch.full((input_ids.shape[0],), self.cancel_event.is_set(), dtype=torch.bool, device=input_ids.device)
+
+
+class GenerationStream:
+    """Iterate over text chunks as the generator model decodes them.
+
+    Generation runs on a background thread and starts when iteration starts.
+    Closing the stream (or leaving the `with` block, or the consumer going away
+    mid-iteration) cancels generation at the next decoding step. Once finished,
+    `stats` holds the time to first token, token count and tokens/sec.
+    """
+
+    def __init__(self, models, prompt, max_length=50, temperature=1.0, top_p=1.0, on_complete=None):
+        self.models = models
+        self.prompt = prompt
+        self.max_length = max_length
+        self.temperature = temperature
+        self.top_p = top_p
+        self.on_complete = on_complete
+        self.stats = None
+
+        self._cancel_event = threading.Event()
+        self._iterator = None
+        self._consumer = None  # Thread iterating over the stream
+
+    def __iter__(self):
+        if self._iterator is None:
+            self._iterator = self._generate()
+        return self._iterator
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def cancel(self):
+        self._cancel_event.set()
+
+    def close(self):
+        self.cancel()
+        # Only the consuming thread may close the generator: from another thread it may
+        # be running ("generator already executing"). The cancelled generation ends the
+        # stream there and the consumer runs the cleanup in the generator's finally.
+        if self._iterator is not None and self._consumer in (None, threading.get_ident()):
+            self._iterator.close()
+
+    def _generate(self):
+        self._consumer = threading.get_ident()
+        # Not exclusive: the stream is consumed lazily (possibly closed from another
+        # thread), so only the tokenization below holds the model's lock
+        with self.models.use('generator', exclusive=False) as generator:
+            tokenizer, model = generator.tokenizer, generator.model
+            with self.models.use('generator'):
+                inputs = tokenizer(self.prompt, return_tensors='pt').to(model.device)
+            streamer = _TimedStreamer(tokenizer, skip_prompt=True, skip_special_tokens=True)
+            errors = []
+            cancel_event = self._cancel_event
+            generate_kwargs = dict(
+                max_length=self.max_length,
+                do_sample=True,
+                temperature=self.temperature,
+                top_p=self.top_p,
+                pad_token_id=tokenizer.pad_token_id,
+                streamer=streamer,
+                stopping_criteria=StoppingCriteriaList([_CancelCriteria(cancel_event)]),
+            )
+
+            # The worker must not hold a reference to the stream, or an abandoned stream
+            # could never be collected (and cancelled) while generation is still running
+            def run():
+                try:
+                    model.generate(**inputs, **generate_kwargs)
+                except Exception as e:
+                    errors.append(e)
+                    # Unblock the consumer, generate() didn't get to end the stream itself
+                    streamer.end()
+
+            start = time.perf_counter()
+            thread = threading.Thread(target=run, name="generation-stream", daemon=True)
+            thread.start()
+            finished = False
+            try:
+                for text in streamer:
+                    if text:
+                        yield text
+                finished = True
+            finally:
+                # Also reached when the consumer stops iterating early, stop generating then
+                cancel_event.set()
+                thread.join()
+                self._record(start, streamer, cancelled=not finished)
+
+            if errors:
+                raise errors[0]
+
+    def _record(self, start, streamer, cancelled):
+        total = time.perf_counter() - start
+        ttft = streamer.first_token_time - start if streamer.first_token_time else None
+        decode_time = total - ttft if ttft is not None else 0
+        self.stats = {
+            'time_to_first_token_ms': round(ttft * 1000, 1) if ttft is not None else None,
+            'total_ms': round(total * 1000, 1),
+            'tokens': streamer.token_count,
+            # Decoding speed after the first token, which also includes the prompt's forward pass
+            'tokens_per_sec': round((streamer.token_count - 1) / decode_time, 2) if decode_time > 0 and streamer.token_count > 1 else None,
+            'cancelled': cancelled,
+        }
+        if self.on_complete:
+            self.on_complete(self.stats)
@@ -0,0 +1,204 @@
+import argparse
+import json
+import time
+
+import numpy as np
+
+from engine.batching import token_lengths
+from engine.text_splitting import pack_sentences, split_sentences
+
+
+def summarize_long(engine, text, max_length=150, min_length=30, chunk_tokens=900, overlap_sentences=1,
+                   max_depth=3, chunk_max_length=None, chunk_min_length=None, batch_size=4):
+    """Map-reduce summarization for documents longer than the summarizer's context.
+
+    The text is split on sentence boundaries into chunks of at most `chunk_tokens`
+    tokens (with `overlap_sentences` shared between neighbours), the chunks are
+    summarized as a batch, and the concatenated partial summaries are reduced the
+    same way until they fit in one chunk or `max_depth` rounds have been done. The
+    final pass produces a summary of `min_length`..`max_length` tokens.
+
+    Returns {'summary_text', 'depth', 'stages'} where each stage records its
+    number of inputs, input tokens and duration.
+    """
+    chunk_max_length = chunk_max_length or max_length
+    chunk_min_length = chunk_min_length if chunk_min_length is not None else min(min_length, 20)
+    stages = []
+    depth = 0
+
+    with engine.models.use('summarizer') as summarizer:
+        while True:
+            sentences = split_sentences(text)
+            lengths = token_lengths(summarizer.tokenizer, sentences)
+            if sum(lengths) <= chunk_tokens or depth >= max_depth or len(sentences) < 2:
+                break
+
+            chunks = [" ".join(sentences[first:last]) for first, last in pack_sentences(lengths, chunk_tokens, overlap_sentences)]
+            start = time.perf_counter()
+            partials = engine.summarize_batch(
+                chunks,
+                max_length=chunk_max_length,
+                min_length=chunk_min_length,
+                batch_size=batch_size
+            )
+            stages.append({
+                'stage': 'map' if depth == 0 else 'reduce',
+                'depth': depth,
+                'inputs': len(chunks),
+                'input_tokens': sum(lengths),
+                'seconds': round(time.perf_counter() - start, 3),
+            })
+
+            text = " ".join(partial[0]['summary_text'].strip() for partial in partials)
+            depth += 1
+
+        start = time.perf_counter()
+        summary = engine.summarize_batch([text], max_length=max_length, min_length=min_length)[0]
+        stages.append({
+            'stage': 'final',
+            'depth': depth,
+            'inputs': 1,
+            'input_tokens': sum(token_lengths(summarizer.tokenizer, [text])),
+            'seconds': round(time.perf_counter() - start, 3),
+        })
+
+    return {'summary_text': summary[0]['summary_text'], 'depth': depth, 'stages': stages}
+
+
+def select_sentences(engine, text, token_budget=400, redundancy=0.85):
+    """Keep the most central sentences of `text`, without near-repeats, up to `token_budget` summarizer tokens.
+
+    Sentences at least `redundancy` similar (cosine of their MiniLM embeddings) to
+    an earlier one are dropped first, so repeated lines don't make each other
+    look central. A sentence's centrality is then its mean similarity to the
+    other remaining sentences: sentences about the document's main topic rank
+    high and boilerplate ranks low. Sentences are taken from the most central
+    down, skipping any that would exceed the budget, and returned in their
+    original order. When no sentence fits, the most central one is kept, cut to
+    the budget, and 'truncated' is set.
+
+    Returns {'text', 'sentences_kept', 'sentences_total', 'input_tokens', 'kept_tokens', 'truncated'}.
+    """
+    sentences = split_sentences(text)
+    with engine.models.use('summarizer') as summarizer:
+        lengths = token_lengths(summarizer.tokenizer, sentences)
+    result = {'text': text, 'sentences_kept': len(sentences), 'sentences_total': len(sentences),
+              'input_tokens': sum(lengths), 'kept_tokens': sum(lengths), 'truncated': False}
+    if len(sentences) < 2:
+        return result
+
+    embeddings = engine.get_embeddings(sentences).numpy()
+    embeddings = embeddings / np.maximum(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12)
+    similarities = embeddings @ embeddings.T
+
+    unique = []
+    for i in range(len(sentences)):
+        if not unique or similarities[i, unique].max() < redundancy:
+            unique.append(i)
+    unique = np.array(unique)
+    centrality = (similarities[np.ix_(unique, unique)].sum(axis=1) - 1) / max(len(unique) - 1, 1)
+
+    ranked = unique[np.argsort(-centrality, kind='stable')]
+    kept, total = [], 0
+    for i in ranked:
+        if total + lengths[i] <= token_budget:
+            kept.append(i)
+            total += lengths[i]
+    if not kept:
+        # Every sentence is longer than the budget: keep the first tokens of the most central one
+        sentence = sentences[ranked[0]]
+        with engine.models.use('summarizer') as summarizer:
+            offsets = summarizer.tokenizer(sentence, add_special_tokens=False, return_offsets_mapping=True)['offset_mapping']
+        total = min(token_budget, len(offsets))
+        text = sentence[:offsets[total - 1][1]] if total else ""
+        return {**result, 'text': text, 'sentences_kept': 1, 'kept_tokens': total, 'truncated': True}
+    kept.sort()
+    return {**result, 'text': " ".join(sentences[i] for i in kept), 'sentences_kept': len(kept), 'kept_tokens': total}
+
+
+def summarize_compressed(engine, text, max_length=150, min_length=30, token_budget=400, redundancy=0.85):
+    """Summarize only the sentences picked by `select_sentences`, so BART encodes fewer tokens.
+
+    Returns the selection's statistics with the 'summary_text' added.
+    """
+    selection = select_sentences(engine, text, token_budget=token_budget, redundancy=redundancy)
+    summary = engine.summarize_text(selection.pop('text'), max_length=max_length, min_length=min_length)
+    return {'summary_text': summary[0]['summary_text'], **selection}
+
+
+def compression_report(engine, texts, references=None, token_budgets=(256, 400), max_length=150, min_length=30):
+    """Encoder tokens, latency and ROUGE of summaries of the full texts and of their compressed versions.
+
+    ROUGE is measured against the full-text summaries (how much the compression
+    changes the output), and against `references` when given.
+    """
+    from engine.text_metrics import rouge_scores
+
+    def average(rows):
+        return {name: round(sum(row[name] for row in rows) / len(rows), 4) for name in rows[0]}
+
+    # Load the models before timing
+    summarize_compressed(engine, texts[0], max_length=max_length, min_length=min_length)
+
+    full_summaries, full_seconds = [], 0.0
+    for text in texts:
+        start = time.perf_counter()
+        full_summaries.append(engine.summarize_text(text, max_length=max_length, min_length=min_length)[0]['summary_text'])
+        full_seconds += time.perf_counter() - start
+
+    report = {'texts': len(texts), 'full': {'seconds_per_text': round(full_seconds / len(texts), 3)}, 'compressed': []}
+    if references:
+        report['full']['rouge_vs_reference'] = average([rouge_scores(s, r) for s, r in zip(full_summaries, references)])
+
+    for budget in token_budgets:
+        results, seconds = [], 0.0
+        for text in texts:
+            start = time.perf_counter()
+            results.append(summarize_compressed(engine, text, max_length=max_length, min_length=min_length, token_budget=budget))
+            seconds += time.perf_counter() - start
+        input_tokens = sum(r['input_tokens'] for r in results)
+        kept_tokens = sum(r['kept_tokens'] for r in results)
+        row = {
+            'token_budget': budget,
+            'input_tokens': input_tokens,
+            'encoder_tokens': kept_tokens,
+            'tokens_saved': round(1 - kept_tokens / max(input_tokens, 1), 3),
+            'seconds_per_text': round(seconds / len(texts), 3),
+            'latency_reduction': round(1 - seconds / full_seconds, 3),
+            'rouge_vs_full': average([rouge_scores(r['summary_text'], s) for r, s in zip(results, full_summaries)]),
+        }
+        if references:
+            row['rouge_vs_reference'] = average([rouge_scores(r['summary_text'], ref) for r, ref in zip(results, references)])
+        report['compressed'].append(row)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare summaries of full texts with summaries of their most central sentences")
+    parser.add_argument('texts', help="Text file (one document per line), or JSONL/CSV file with a text field")
+    parser.add_argument('--field', default='text', help="Text field of JSONL/CSV records")
+    parser.add_argument('--reference-field', help="Field of JSONL/CSV records holding a reference summary")
+    parser.add_argument('--token-budgets', default='256,400', help="Comma-separated budgets of the compressed input")
+    parser.add_argument('--max-length', type=int, default=150)
+    parser.add_argument('--min-length', type=int, default=30)
+    parser.add_argument('--output', help="Write the report as JSON to this file")
+    args = parser.parse_args()
+
+    from engine.bulk import read_records, read_texts
+    from nlp_engine import NLPEngine
+
+    engine = NLPEngine(device=-1)
+    texts = read_texts(args.texts, args.field)
+    references = [record[args.reference_field] for record in read_records(args.texts)] if args.reference_field else None
+    report = compression_report(
+        engine, texts, references, [int(budget) for budget in args.token_budgets.split(',')],
+        max_length=args.max_length, min_length=args.min_length
+    )
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
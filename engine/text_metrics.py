@@ -0,0 +1,48 @@
+import re
+from collections import Counter
+
+_TOKEN = re.compile(r"\w+")
+
+
+def _tokens(text):
+    return _TOKEN.findall(text.lower())
+
+
+def _f1(overlap, candidate_total, reference_total):
+    if overlap == 0:
+        return 0.0
+    precision = overlap / candidate_total
+    recall = overlap / reference_total
+    return 2 * precision * recall / (precision + recall)
+
+
+def rouge_n(candidate, reference, n=1):
+    """ROUGE-N F1 between two texts (lowercased word n-grams)"""
+    candidate_tokens, reference_tokens = _tokens(candidate), _tokens(reference)
+    candidate_ngrams = Counter(tuple(candidate_tokens[i:i + n]) for i in range(len(candidate_tokens) - n + 1))
+    reference_ngrams = Counter(tuple(reference_tokens[i:i + n]) for i in range(len(reference_tokens) - n + 1))
+    overlap = sum((candidate_ngrams & reference_ngrams).values())
+    return _f1(overlap, sum(candidate_ngrams.values()), sum(reference_ngrams.values()))
+
+
+def rouge_l(candidate, reference):
+    """ROUGE-L F1 (longest common subsequence of words) between two texts"""
+    candidate_tokens, reference_tokens = _tokens(candidate), _tokens(reference)
+    if not candidate_tokens or not reference_tokens:
+        return 0.0
+
+    previous = [0] * (len(reference_tokens) + 1)
+    for candidate_token in candidate_tokens:
+        current = [0]
+        for j, reference_token in enumerate(reference_tokens):
+            current.append(previous[j] + 1 if candidate_token == reference_token else max(previous[j + 1], current[j]))
+        previous = current
+    return _f1(previous[-1], len(candidate_tokens), len(reference_tokens))
+
+
+def rouge_scores(candidate, reference):
+    return {
+        'rouge1': round(rouge_n(candidate, reference, 1), 4),
+        'rouge2': round(rouge_n(candidate, reference, 2), 4),
+        'rougeL': round(rouge_l(candidate, reference), 4),
+    }
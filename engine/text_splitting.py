@@ -0,0 +1,57 @@
+import re
+
+# A sentence ends with . ! or ? (optionally followed by closing quotes/brackets), then
+# whitespace, then something that looks like the start of a new sentence. Requiring a
+# capital letter or digit next keeps abbreviations like "U.K. startup" in one piece.
+_SENTENCE_BOUNDARY = re.compile(r'(?:(?<=[.!?])|(?<=[.!?]["\')\]]))\s+(?=["\'(\[]?[A-Z0-9])')
+
+
+def sentence_spans(text):
+    """Return (start, end) character offsets of the sentences in `text`, without surrounding whitespace"""
+    spans = []
+    start = 0
+    for match in _SENTENCE_BOUNDARY.finditer(text):
+        spans.append((start, match.start()))
+        start = match.end()
+    spans.append((start, len(text)))
+
+    trimmed = []
+    for start, end in spans:
+        while start < end and text[start].isspace():
+            start += 1
+        while end > start and text[end - 1].isspace():
+            end -= 1
+        if start < end:
+            trimmed.append((start, end))
+    return trimmed
+
+
+def split_sentences(text):
+    return [text[start:end] for start, end in sentence_spans(text)]
+
+
+def pack_sentences(lengths, max_tokens, overlap=0):
+    """Group consecutive sentences into chunks of at most `max_tokens` tokens.
+
+    `lengths` is the token count of each sentence. Returns a list of
+    (first, last) sentence index ranges (last exclusive). Consecutive chunks share
+    `overlap` sentences so context isn't lost at the boundaries. A sentence longer
+    than the budget gets a chunk of its own.
+    """
+    chunks = []
+    end = 0  # sentences before `end` are already in a chunk
+    while end < len(lengths):
+        # Start with up to `overlap` sentences of the previous chunk, as long as they leave
+        # room for at least the next new sentence
+        first = max(end - overlap, 0)
+        while first < end and sum(lengths[first:end + 1]) > max_tokens:
+            first += 1
+
+        total = sum(lengths[first:end])
+        last = end
+        while last < len(lengths) and (last == end or total + lengths[last] <= max_tokens):
+            total += lengths[last]
+            last += 1
+        chunks.append((first, last))
+        end = last
+    return chunks
@@ -0,0 +1,284 @@
+import argparse
+import time
+
+import numpy as np
+
+
+def normalize_rows(vectors):
+    """Return float32 copies of the vectors scaled to unit length"""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if vectors.ndim == 1:
+        vectors = vectors[None, :]
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+def top_k(scores, k):
+    """Return (scores, positions) of the k largest values of a 1-D array, best first"""
+    k = min(k, len(scores))
+    if k == 0:
+        return scores[:0], np.zeros(0, dtype=np.int64)
+    positions = np.argpartition(-scores, k - 1)[:k]
+    positions = positions[np.argsort(-scores[positions], kind='stable')]
+    return scores[positions], positions
+
+
+def spherical_kmeans(vectors, n_clusters, iterations=10, seed=0, chunk_size=65536):
+    """Cluster unit vectors by cosine similarity, returns unit-length centroids"""
+    rng = np.random.default_rng(seed)
+    n_clusters = min(n_clusters, len(vectors))
+    centroids = vectors[rng.choice(len(vectors), n_clusters, replace=False)].copy()
+
+    for _ in range(iterations):
+        assignments = assign_to_centroids(vectors, centroids, chunk_size)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignments, vectors)
+        counts = np.bincount(assignments, minlength=n_clusters)
+
+        # Re-seed empty clusters with random points
+        empty = np.flatnonzero(counts == 0)
+        if len(empty):
+            sums[empty] = vectors[rng.choice(len(vectors), len(empty), replace=False)]
+        centroids = normalize_rows(sums)
+    return centroids
+
+
+def assign_to_centroids(vectors, centroids, chunk_size=65536):
+    """Return the index of the most similar centroid for each vector"""
+    assignments = np.empty(len(vectors), dtype=np.int64)
+    for start in range(0, len(vectors), chunk_size):
+        assignments[start:start + chunk_size] = np.argmax(vectors[start:start + chunk_size] @ centroids.T, axis=1)
+    return assignments
+
+
+class IVFIndex:
+    """Approximate nearest-neighbour index over unit-normalized embeddings (cosine similarity).
+
+    Vectors are partitioned into `nlist` clusters with spherical k-means (an
+    inverted file). A query only scores the vectors in its `nprobe` most similar
+    clusters, which trades a little recall for far fewer comparisons: raise
+    `nprobe` for better recall, lower it for lower latency. With `nlist=1` the
+    index is an exact search.
+
+    Vectors are stored grouped by cluster so each probed cluster is scored with a
+    single matrix-vector product over a contiguous slice.
+    """
+
+    def __init__(self, dim, nlist=None, nprobe=8):
+        self.dim = dim
+        self.nlist = nlist
+        self.nprobe = nprobe
+
+        self.centroids = None
+        self._vectors = np.zeros((0, dim), dtype=np.float32)
+        self._ids = np.zeros(0, dtype=np.int64)
+        self._lists = np.zeros(0, dtype=np.int64)
+        self._alive = np.zeros(0, dtype=bool)
+        self._offsets = None  # cluster c lives in rows [offsets[c], offsets[c + 1])
+        self._id_to_row = None
+
+    def __len__(self):
+        return int(self._alive.sum())
+
+    @staticmethod
+    def default_nlist(n):
+        # Small collections are cheaper to scan exactly
+        if n < 1000:
+            return 1
+        return int(4 * np.sqrt(n))
+
+    def build(self, vectors, ids=None, iterations=10, max_training_points=256, seed=0):
+        """Train the clusters on `vectors` and add them to the (emptied) index"""
+        vectors = normalize_rows(vectors)
+        nlist = self.nlist or self.default_nlist(len(vectors))
+
+        # k-means only needs a sample: up to max_training_points per cluster
+        rng = np.random.default_rng(seed)
+        sample_size = min(len(vectors), nlist * max_training_points)
+        sample = vectors[rng.choice(len(vectors), sample_size, replace=False)] if sample_size < len(vectors) else vectors
+        self.centroids = spherical_kmeans(sample, nlist, iterations=iterations, seed=seed)
+        self.nlist = len(self.centroids)
+
+        self._vectors = np.zeros((0, self.dim), dtype=np.float32)
+        self._ids = np.zeros(0, dtype=np.int64)
+        self._lists = np.zeros(0, dtype=np.int64)
+        self._alive = np.zeros(0, dtype=bool)
+        self.add(vectors, ids)
+        return self
+
+    def add(self, vectors, ids=None):
+        """Add vectors to the trained index. Ids default to consecutive integers"""
+        if self.centroids is None:
+            raise RuntimeError("Index has not been built yet, call build() first")
+
+        vectors = normalize_rows(vectors)
+        if ids is None:
+            start = int(self._ids.max()) + 1 if len(self._ids) else 0
+            ids = np.arange(start, start + len(vectors))
+        ids = np.asarray(ids, dtype=np.int64)
+
+        self._vectors = np.concatenate([self._vectors, vectors])
+        self._ids = np.concatenate([self._ids, ids])
+        self._lists = np.concatenate([self._lists, assign_to_centroids(vectors, self.centroids)])
+        self._alive = np.concatenate([self._alive, np.ones(len(vectors), dtype=bool)])
+        self._offsets = None
+        return ids
+
+    def delete(self, ids):
+        """Remove vectors by id. Returns the number of vectors removed"""
+        self._ensure_grouped()
+        removed = 0
+        for id_ in np.atleast_1d(ids):
+            row = self._id_to_row.get(int(id_))
+            if row is not None and self._alive[row]:
+                self._alive[row] = False
+                removed += 1
+        # Drop the tombstones once they make up a large part of the index
+        if (~self._alive).sum() > 0.25 * len(self._alive):
+            self.compact()
+        return removed
+
+    def compact(self):
+        """Physically remove deleted vectors"""
+        keep = self._alive
+        self._vectors = self._vectors[keep]
+        self._ids = self._ids[keep]
+        self._lists = self._lists[keep]
+        self._alive = self._alive[keep]
+        self._offsets = None
+
+    def search(self, queries, k=10, nprobe=None):
+        """Return (scores, ids), each of shape (n_queries, k), best match first.
+
+        Missing results (fewer than k vectors in the probed clusters) have id -1.
+        """
+        self._ensure_grouped()
+        queries = normalize_rows(queries)
+        nprobe = min(nprobe or self.nprobe, self.nlist)
+
+        all_scores = np.full((len(queries), k), -np.inf, dtype=np.float32)
+        all_ids = np.full((len(queries), k), -1, dtype=np.int64)
+        probes = np.argsort(-(queries @ self.centroids.T), axis=1)[:, :nprobe]
+
+        for q, (query, clusters) in enumerate(zip(queries, probes)):
+            rows = np.concatenate([np.arange(self._offsets[c], self._offsets[c + 1]) for c in clusters])
+            scores = np.concatenate([self._vectors[self._offsets[c]:self._offsets[c + 1]] @ query for c in clusters])
+            scores[~self._alive[rows]] = -np.inf
+
+            best_scores, positions = top_k(scores, k)
+            found = np.isfinite(best_scores)
+            all_scores[q, :found.sum()] = best_scores[found]
+            all_ids[q, :found.sum()] = self._ids[rows[positions[found]]]
+        return all_scores, all_ids
+
+    def exact_search(self, queries, k=10):
+        """Brute-force search over every vector, used as the ground truth for recall"""
+        queries = normalize_rows(queries)
+        all_scores = np.full((len(queries), k), -np.inf, dtype=np.float32)
+        all_ids = np.full((len(queries), k), -1, dtype=np.int64)
+        for q, query in enumerate(queries):
+            scores = self._vectors @ query
+            scores[~self._alive] = -np.inf
+            best_scores, positions = top_k(scores, k)
+            found = np.isfinite(best_scores)
+            all_scores[q, :found.sum()] = best_scores[found]
+            all_ids[q, :found.sum()] = self._ids[positions[found]]
+        return all_scores, all_ids
+
+    def recall_report(self, queries, k=10, nprobes=(1, 2, 4, 8, 16, 32)):
+        """Compare recall@k and latency of the index against exact search for several nprobe values"""
+        start = time.perf_counter()
+        _, exact_ids = self.exact_search(queries, k)
+        exact_ms = (time.perf_counter() - start) * 1000 / len(queries)
+
+        report = [{'nprobe': 'exact', 'recall': 1.0, 'latency_ms': round(exact_ms, 3)}]
+        for nprobe in sorted({min(n, self.nlist) for n in nprobes}):
+            start = time.perf_counter()
+            _, ids = self.search(queries, k, nprobe=nprobe)
+            latency_ms = (time.perf_counter() - start) * 1000 / len(queries)
+
+            hits = sum(len(set(found[found >= 0]) & set(truth[truth >= 0])) for found, truth in zip(ids, exact_ids))
+            total = sum(int((truth >= 0).sum()) for truth in exact_ids)
+            report.append({
+                'nprobe': nprobe,
+                'recall': round(hits / max(total, 1), 4),
+                'latency_ms': round(latency_ms, 3),
+            })
+        return report
+
+    def save(self, path):
+        """Save the index to a single .npz file"""
+        self._ensure_grouped()
+        np.savez(
+            path,
+            dim=self.dim,
+            nprobe=self.nprobe,
+            centroids=self.centroids,
+            vectors=self._vectors,
+            ids=self._ids,
+            lists=self._lists,
+            alive=self._alive,
+        )
+
+    @classmethod
+    def load(cls, path):
+        data = np.load(path)
+        index = cls(int(data['dim']), nlist=len(data['centroids']), nprobe=int(data['nprobe']))
+        index.centroids = data['centroids']
+        index._vectors = data['vectors']
+        index._ids = data['ids']
+        index._lists = data['lists']
+        index._alive = data['alive']
+        return index
+
+    def _ensure_grouped(self):
+        if self.centroids is None:
+            raise RuntimeError("Index has not been built yet, call build() first")
+        if self._offsets is not None:
+            return
+
+        # Keep every cluster in a contiguous block of rows
+        order = np.argsort(self._lists, kind='stable')
+        self._vectors = self._vectors[order]
+        self._ids = self._ids[order]
+        self._lists = self._lists[order]
+        self._alive = self._alive[order]
+        self._offsets = np.concatenate([[0], np.cumsum(np.bincount(self._lists, minlength=self.nlist))])
+        self._id_to_row = {int(id_): row for row, id_ in enumerate(self._ids)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build an IVF index over a text corpus and report recall vs exact search")
+    parser.add_argument('corpus', help="Text file with one document per line")
+    parser.add_argument('--queries', help="Text file with one query per line (defaults to a sample of the corpus)")
+    parser.add_argument('--k', type=int, default=10)
+    parser.add_argument('--nlist', type=int, default=None)
+    parser.add_argument('--save', help="Where to save the built index (.npz)")
+    args = parser.parse_args()
+
+    from nlp_engine import NLPEngine
+
+    engine = NLPEngine()
+    with open(args.corpus) as f:
+        corpus = [line.strip() for line in f if line.strip()]
+    if args.queries:
+        with open(args.queries) as f:
+            queries = [line.strip() for line in f if line.strip()]
+    else:
+        queries = corpus[::max(1, len(corpus) // 100)][:100]
+
+    embeddings = engine.get_embeddings(corpus).numpy()
+    start = time.perf_counter()
+    index = IVFIndex(embeddings.shape[1], nlist=args.nlist).build(embeddings)
+    print(f"Built index over {len(index)} documents with {index.nlist} clusters in {time.perf_counter() - start:.2f}s")
+
+    for row in index.recall_report(engine.get_embeddings(queries).numpy(), k=args.k):
+        print(f"nprobe={row['nprobe']:>6}  recall@{args.k}={row['recall']:.4f}  latency={row['latency_ms']:.3f} ms/query")
+
+    if args.save:
+        index.save(args.save)
+        print(f"Saved index to {args.save}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,267 @@
+import itertools
+import multiprocessing
+import os
+import pickle
+import queue
+import threading
+from concurrent.futures import Future
+
+# Model -> engine methods that run it, used to route requests to workers owning the model
+TASK_METHODS = {
+    'sentiment': ['analyze_sentiment', 'analyze_sentiment_batch'],
+    'summarizer': ['summarize_text', 'summarize_long_text', 'summarize_compressed_text', 'summarize_batch'],
+    'ner': ['extract_entities', 'extract_entities_long', 'extract_entities_batch'],
+    'qa': ['answer_question', 'answer_question_long', 'answer_question_batch'],
+    'generator': ['generate_text', 'generate_text_batch'],
+    'sentence_model': ['get_embeddings'],
+}
+METHOD_TASKS = {method: task for task, methods in TASK_METHODS.items() for method in methods}
+
+
+def available_cpus():
+    """Return the CPUs this process may run on, or None where affinity isn't supported (e.g. macOS)"""
+    if not hasattr(os, 'sched_getaffinity'):
+        return None
+    return sorted(os.sched_getaffinity(0))
+
+
+def cpu_total():
+    """Number of CPUs available to this process"""
+    cpus = available_cpus()
+    return len(cpus) if cpus is not None else (os.cpu_count() or 1)
+
+
+def split_cpus(num_workers, cpus=None):
+    """Give each worker its own contiguous slice of the CPUs this process may run on.
+
+    Without CPU affinity support the workers aren't pinned, every slice is None.
+    """
+    cpus = sorted(cpus) if cpus is not None else available_cpus()
+    if cpus is None:
+        return [None] * num_workers
+    per_worker = max(1, len(cpus) // num_workers)
+    slices = []
+    for i in range(num_workers):
+        start = (i * per_worker) % len(cpus)
+        slices.append(cpus[start:start + per_worker])
+    return slices
+
+
+def _worker_main(index, config, requests, results):
+    # Pin the process and size torch's thread pools before torch creates them
+    if config['cpus'] and hasattr(os, 'sched_setaffinity'):
+        os.sched_setaffinity(0, config['cpus'])
+    if config['intra_op_threads']:
+        os.environ['OMP_NUM_THREADS'] = str(config['intra_op_threads'])
+        os.environ['MKL_NUM_THREADS'] = str(config['intra_op_threads'])
+
+    import torch
+    if config['intra_op_threads']:
+        torch.set_num_threads(config['intra_op_threads'])
+    if config['inter_op_threads']:
+        torch.set_num_interop_threads(config['inter_op_threads'])
+
+    from nlp_engine import NLPEngine
+
+    try:
+        engine = NLPEngine(**config['engine_kwargs'])
+        for task in config['preload']:
+            engine.models.get(task)
+    except Exception as e:
+        results.put((index, None, 'error', _picklable(e)))
+        return
+    results.put((index, None, 'ready', {'pid': os.getpid(), 'cpus': config['cpus'], 'threads': torch.get_num_threads()}))
+
+    while True:
+        request = requests.get()
+        if request is None:
+            return
+        request_id, method, args, kwargs = request
+        try:
+            result = getattr(engine, method)(*args, **kwargs)
+            # The queue pickles on a background thread, where a failure would never reach the caller
+            pickle.dumps(result)
+            results.put((index, request_id, 'ok', result))
+        except Exception as e:
+            results.put((index, request_id, 'error', _picklable(e)))
+
+
+def _picklable(exception):
+    try:
+        pickle.dumps(exception)
+        return exception
+    except Exception:
+        return RuntimeError(f"{type(exception).__name__}: {exception}")
+
+
+class _Worker:
+    def __init__(self, index, tasks, config, context, results):
+        self.index = index
+        self.tasks = set(tasks) if tasks else set(TASK_METHODS)
+        self.config = config
+        self.requests = context.Queue()
+        self.process = context.Process(
+            target=_worker_main, args=(index, config, self.requests, results), name=f"nlp-worker-{index}", daemon=True
+        )
+        self.outstanding = {}  # request id -> Future
+        self.completed = 0
+        self.info = None
+
+
+class WorkerPool:
+    """Run NLPEngine calls on a pool of worker processes, each owning its own engine.
+
+    Every worker is pinned to its own slice of the CPUs (`cpu_affinity='auto'`)
+    and sizes torch's intra-op thread pool to that slice, so N workers use the
+    machine's cores without oversubscribing them. Where CPU affinity isn't
+    available (macOS) the workers aren't pinned but still split the thread
+    budget between them. A worker can own a subset of
+    the tasks (`worker_tasks`, e.g. [['sentiment', 'ner'], ['summarizer']]);
+    each call goes to the least loaded worker that owns its task.
+
+    The pool exposes the engine's methods (blocking) and `submit()` (returns a
+    Future), so it can stand in for an NLPEngine. Streaming isn't supported
+    across processes.
+    """
+
+    def __init__(self, num_workers=None, worker_tasks=None, intra_op_threads=None, inter_op_threads=1,
+                 cpu_affinity='auto', engine_kwargs=None, preload=False):
+        if worker_tasks is not None:
+            num_workers = len(worker_tasks)
+        num_workers = num_workers or cpu_total()
+        worker_tasks = worker_tasks or [None] * num_workers
+        # Unpinned workers still share the cores rather than each sizing its pool to all of them
+        default_threads = max(1, cpu_total() // num_workers)
+
+        if cpu_affinity == 'auto':
+            cpu_slices = split_cpus(num_workers)
+        elif cpu_affinity:
+            cpu_slices = cpu_affinity
+        else:
+            cpu_slices = [None] * num_workers
+
+        # Spawn rather than fork: forking a process that already runs torch threads can deadlock
+        context = multiprocessing.get_context('spawn')
+        self._results = context.Queue()
+        self._workers = []
+        for index, (tasks, cpus) in enumerate(zip(worker_tasks, cpu_slices)):
+            config = {
+                'cpus': cpus,
+                'intra_op_threads': intra_op_threads or (len(cpus) if cpus else default_threads),
+                'inter_op_threads': inter_op_threads,
+                'engine_kwargs': engine_kwargs or {},
+                'preload': list(tasks or TASK_METHODS) if preload else [],
+            }
+            self._workers.append(_Worker(index, tasks, config, context, self._results))
+
+        self._ids = itertools.count()
+        self._lock = threading.Lock()
+        self._closed = False
+        self._ready = threading.Event()
+        self._start_error = None
+
+        for worker in self._workers:
+            worker.process.start()
+        self._collector = threading.Thread(target=self._collect, name="worker-pool-results", daemon=True)
+        self._collector.start()
+        self._ready.wait()
+        if self._start_error:
+            self.shutdown()
+            raise self._start_error
+
+    def __getattr__(self, name):
+        if name in METHOD_TASKS:
+            def call(*args, **kwargs):
+                return self.submit(name, *args, **kwargs).result()
+            call.__name__ = name
+            return call
+        raise AttributeError(name)
+
+    def submit(self, method, *args, **kwargs):
+        """Send a call to the least loaded worker owning the method's task, returns a Future"""
+        if self._closed:
+            raise RuntimeError("Worker pool has been shut down")
+        task = METHOD_TASKS[method]
+        future = Future()
+        with self._lock:
+            candidates = [w for w in self._workers if task in w.tasks and w.process.is_alive()]
+            if not candidates:
+                raise RuntimeError(f"No live worker serves '{task}'")
+            worker = min(candidates, key=lambda w: (len(w.outstanding), w.completed))
+            request_id = next(self._ids)
+            worker.outstanding[request_id] = future
+        worker.requests.put((request_id, method, args, kwargs))
+        return future
+
+    def stats(self):
+        """Return the tasks, pinning and load of every worker"""
+        with self._lock:
+            return [
+                {
+                    'worker': worker.index,
+                    'pid': worker.info['pid'] if worker.info else None,
+                    'alive': worker.process.is_alive(),
+                    'tasks': sorted(worker.tasks),
+                    'cpus': worker.config['cpus'],
+                    'torch_threads': worker.info['threads'] if worker.info else None,
+                    'outstanding': len(worker.outstanding),
+                    'completed': worker.completed,
+                }
+                for worker in self._workers
+            ]
+
+    def shutdown(self):
+        """Stop the workers once they have served their queued requests"""
+        self._closed = True
+        for worker in self._workers:
+            if worker.process.is_alive():
+                worker.requests.put(None)
+        for worker in self._workers:
+            worker.process.join()
+
+    def _collect(self):
+        pending_start = {worker.index for worker in self._workers}
+        while True:
+            try:
+                index, request_id, status, payload = self._results.get(timeout=1)
+            except queue.Empty:
+                if self._fail_dead_workers(pending_start):
+                    return
+                continue
+
+            worker = self._workers[index]
+            if request_id is None:
+                # Startup message
+                pending_start.discard(index)
+                if status == 'ready':
+                    worker.info = payload
+                elif self._start_error is None:
+                    self._start_error = payload
+                if not pending_start:
+                    self._ready.set()
+                continue
+
+            with self._lock:
+                future = worker.outstanding.pop(request_id)
+                worker.completed += 1
+            if status == 'ok':
+                future.set_result(payload)
+            else:
+                future.set_exception(payload)
+
+    def _fail_dead_workers(self, pending_start):
+        """Fail the calls of workers that died, returns True once every worker has exited"""
+        with self._lock:
+            for worker in self._workers:
+                if worker.process.is_alive():
+                    continue
+                for future in worker.outstanding.values():
+                    future.set_exception(RuntimeError(f"Worker {worker.index} exited with code {worker.process.exitcode}"))
+                worker.outstanding.clear()
+                if worker.index in pending_start:
+                    pending_start.discard(worker.index)
+                    if self._start_error is None:
+                        self._start_error = RuntimeError(f"Worker {worker.index} exited during startup")
+                    if not pending_start:
+                        self._ready.set()
+            return all(not worker.process.is_alive() for worker in self._workers)
@@ -1,64 +1,422 @@
-import torch
-from transformers import pipeline
-from sentence_transformers import SentenceTransformer
+import functools
+import os
+from collections import deque
+import numpy as np
+
+# torch, transformers and sentence-transformers take seconds to import, so they (and
+# the engine modules built on them) are only imported once a task first needs them
+from engine.batching import run_bucketed, token_lengths
+from engine.embedding_cache import EmbeddingCache, normalize_text
+from engine.instrumentation import METRICS, instrument_pipeline, instrument_sentence_model, timed
+from engine.model_manager import ModelManager
+from engine.summarization import summarize_compressed, summarize_long
+
+
+# Engine attribute -> (pipeline task, model id, extra pipeline arguments)
+PIPELINES = {
+    'sentiment': ('sentiment-analysis', 'distilbert-base-uncased-finetuned-sst-2-english', {}),
+    'summarizer': ('summarization', 'facebook/bart-large-cnn', {}),
+    'ner': ('ner', 'dslim/bert-base-NER', {'aggregation_strategy': 'simple'}),
+    'qa': ('question-answering', 'deepset/roberta-base-squad2', {}),
+    'generator': ('text-generation', 'gpt2', {}),
+    # Draft model for speculative decoding, it must share the generator's tokenizer
+    'draft_generator': ('text-generation', 'distilgpt2', {}),
+}
+SENTENCE_MODEL = 'sentence-transformers/all-MiniLM-L6-v2'
+
+
+class _ManagedModel:
+    """Engine attribute that resolves to a model loaded on demand by the engine's ModelManager"""
+
+    def __set_name__(self, owner, name):
+        self.name = name
+
+    def __get__(self, engine, owner=None):
+        if engine is None:
+            return self
+        return engine.models.get(self.name)
+
 
 class NLPEngine:
-    def __init__(self, device=-1):
+    sentiment = _ManagedModel()
+    summarizer = _ManagedModel()
+    ner = _ManagedModel()
+    qa = _ManagedModel()
+    generator = _ManagedModel()
+    draft_generator = _ManagedModel()
+    sentence_model = _ManagedModel()
+
+    def __init__(self, device=-1, memory_budget_mb=None, preload=(), on_model_event=None, embedding_cache_dir=None,
+                 quantized=None, quantized_cache_dir=None, model_ids=None, shared_weights_dir=None, model_pack=None,
+                 verify_model_pack=None, warmup=None, speculative=None, draft_tokens=None, sentiment_cascade=None,
+                 cascade_threshold=None):
         device_name = 'cuda' if device == 0 else 'mps' if device == 'mps' else 'cpu'
         print(f"Initializing NLPEngine on device: {device_name}")
 
-        self.sentiment = pipeline(
-            'sentiment-analysis',
-            model='distilbert-base-uncased-finetuned-sst-2-english',
-            device=device
-        )
-        self.summarizer = pipeline(
-            'summarization',
-            model='facebook/bart-large-cnn',
-            device=device
-        )
-        self.ner = pipeline(
-            'ner',
-            model='dslim/bert-base-NER',
-            aggregation_strategy='simple',
-            device=device
-        )
-        self.qa = pipeline(
-            'question-answering',
-            model='deepset/roberta-base-squad2',
-            device=device
-        )
-        self.generator = pipeline(
-            'text-generation',
-            model='gpt2',
-            device=device
-        )
+        self.device = device
+
+        # Model id (or local path) per model, any of them can be overridden, e.g. {'generator': 'distilgpt2'}
+        self.model_ids = {name: model_id for name, (_, model_id, _) in PIPELINES.items()}
+        self.model_ids['sentence_model'] = SENTENCE_MODEL
+
+        # A model pack (see engine/model_pack.py) replaces the model ids by local snapshots,
+        # loaded strictly offline (local_files_only, see _load_options)
+        if model_pack is None:
+            model_pack = os.environ.get('NLP_MODEL_PACK')
+        if verify_model_pack is None:
+            verify_model_pack = os.environ.get('NLP_MODEL_PACK_VERIFY', '') == '1'
+        self.model_pack = {}
+        if model_pack:
+            from engine.model_pack import load_model_pack
+            self.model_pack = load_model_pack(model_pack, verify=verify_model_pack)
+            self.model_ids.update(self.model_pack)
+        self.model_ids.update(model_ids or {})
+
+        # Models are only loaded the first time a task needs them. With a memory budget,
+        # the least recently used idle models are evicted once the budget is exceeded.
+        if memory_budget_mb is None and os.environ.get('NLP_MEMORY_BUDGET_MB'):
+            memory_budget_mb = float(os.environ['NLP_MEMORY_BUDGET_MB'])
+        self.models = ModelManager(memory_budget_mb=memory_budget_mb, on_event=self._log_model_event)
+        if on_model_event:
+            self.models.add_listener(on_model_event)
+
+        # Opt-in dynamic int8 quantization of the linear layers (CPU only). Quantized
+        # models are cached on disk so the quantization is only done once.
+        if quantized is None:
+            quantized = os.environ.get('NLP_QUANTIZE', '') == '1'
+        self.quantized = quantized and device == -1
+        if quantized and not self.quantized:
+            print("Dynamic int8 quantization is only supported on CPU, using fp32 models.")
+        if self.quantized:
+            from engine.quantization import QuantizedModelCache
+            self.quantized_cache = QuantizedModelCache(quantized_cache_dir or os.environ.get(
+                'NLP_QUANTIZED_CACHE_DIR',
+                os.path.join(os.path.expanduser('~'), '.cache', 'hf-ecosystem', 'quantized')
+            ))
+
+        # Opt-in weights memory-mapped from safetensors files, so every engine process on
+        # the host shares one physical copy (CPU only: the mapped tensors live in host
+        # memory). Quantized models can't be mapped this way.
+        if shared_weights_dir is None:
+            shared_weights_dir = os.environ.get('NLP_SHARED_WEIGHTS_DIR')
+        self.shared_weights = None
+        if shared_weights_dir and device != -1:
+            print("Shared weights are only supported on CPU, loading private copies.")
+        elif shared_weights_dir and self.quantized:
+            print("Shared weights aren't supported for quantized models, loading private copies.")
+        elif shared_weights_dir:
+            from engine.shared_weights import SharedWeightStore
+            self.shared_weights = SharedWeightStore(shared_weights_dir)
+
+        # Opt-in speculative (assisted) decoding for generate_text: the draft model proposes
+        # `draft_tokens` tokens at a time and GPT-2 checks them all in one forward pass.
+        # Greedy outputs are the same as without it.
+        if speculative is None:
+            speculative = os.environ.get('NLP_SPECULATIVE', '') == '1'
+        self.speculative = speculative
+        self.draft_tokens = draft_tokens or int(os.environ.get('NLP_DRAFT_TOKENS', 5))
+
+        # Opt-in sentiment cascade: a linear model distilled from DistilBERT (see
+        # engine/sentiment_cascade.py) answers the texts it is confident about and only
+        # the others go through the transformer
+        if sentiment_cascade is None:
+            sentiment_cascade = os.environ.get('NLP_SENTIMENT_CASCADE')
+        if cascade_threshold is None:
+            cascade_threshold = float(os.environ.get('NLP_CASCADE_THRESHOLD', 0.9))
+        self.sentiment_cascade = None
+        if sentiment_cascade:
+            from engine.sentiment_cascade import HashedNgramClassifier, SentimentCascade
+            self.sentiment_cascade = SentimentCascade(HashedNgramClassifier.load(sentiment_cascade), cascade_threshold)
+
+        for name in PIPELINES:
+            self.models.register(name, functools.partial(self._load_pipeline, name))
         ## For initial tests of semantic search
         # self.retriever = pipeline(
         #     'feature-extraction',
         #     model='sentence-transformers/all-MiniLM-L6-v2',
         #     device=device
         # )
-        self.sentence_model = SentenceTransformer('sentence-transformers/all-MiniLM-L6-v2')
+        self.sentence_model_name = self.model_ids['sentence_model']
+        self.models.register('sentence_model', self._load_sentence_model)
+
+        # Embeddings are cached by content, in memory and in a memory-mapped file on disk
+        # that survives restarts. Pass embedding_cache_dir=False to keep them in memory only.
+        if embedding_cache_dir is None:
+            embedding_cache_dir = os.environ.get(
+                'NLP_EMBEDDING_CACHE_DIR',
+                os.path.join(os.path.expanduser('~'), '.cache', 'hf-ecosystem', 'embeddings')
+            )
+        # Quantized embeddings differ slightly from fp32 ones, keep them apart
+        cache_model_name = f"{self.sentence_model_name}-int8" if self.quantized else self.sentence_model_name
+        self.embedding_cache = EmbeddingCache(cache_model_name, cache_dir=embedding_cache_dir or None)
+
+        # Time to first token and tokens/sec of recent streamed generations
+        self.generation_stats = deque(maxlen=100)
+
+        for name in preload:
+            self.models.get(name)
+
+        # Optional warmup calls on every model (or the packed ones), so the first
+        # requests don't run cold. The time each model took is kept in startup_report.
+        if warmup is None:
+            warmup = int(os.environ.get('NLP_WARMUP_PASSES', 0))
+        self.startup_report = {}
+        if warmup:
+            from engine.model_pack import warm_up
+            self.startup_report = warm_up(self, list(self.model_pack) or None, passes=warmup)
+            for name, report in self.startup_report.items():
+                print(f"Warmed up '{name}': load {report['load_seconds']}s, first call {report['first_call_seconds']}s, "
+                      f"warm call {report['warm_call_seconds']}s")
 
         print("NLPEngine initialized successfully.")
 
+    def _load_options(self, name):
+        """Loading arguments of a model: packed models never look up the hub"""
+        if name in self.model_pack and self.model_ids[name] == self.model_pack[name]:
+            return {'local_files_only': True}
+        return {}
+
+    def _load_pipeline(self, name):
+        from transformers import AutoTokenizer, pipeline
+
+        task, _, kwargs = PIPELINES[name]
+        model_id = self.model_ids[name]
+        # model_kwargs also reach the config and tokenizer the pipeline loads
+        kwargs = {**kwargs, 'model_kwargs': self._load_options(name)}
+        if self.quantized:
+            model = self.quantized_cache.get_or_create(
+                model_id,
+                lambda: pipeline(task, model=model_id, device=self.device, **kwargs).model
+            )
+            tokenizer = AutoTokenizer.from_pretrained(model_id, **self._load_options(name))
+            loaded = pipeline(task, model=model, tokenizer=tokenizer, device=self.device, **kwargs)
+        else:
+            loaded = pipeline(task, model=model_id, device=self.device, **kwargs)
+            if self.shared_weights:
+                self.shared_weights.share(model_id, loaded.model)
+
+        if name == 'draft_generator':
+            # Always propose draft_tokens tokens, instead of transformers' adaptive number
+            loaded.model.generation_config.num_assistant_tokens_schedule = 'constant'
+        if name == 'generator':
+            # GPT-2 has no padding token, reuse EOS and pad on the left so batched prompts can be generated together
+            loaded.tokenizer.pad_token_id = loaded.model.config.eos_token_id
+            loaded.tokenizer.padding_side = 'left'
+        # Per-stage timings, token counts and batch sizes, see engine/instrumentation.py
+        return instrument_pipeline(loaded, name)
+
+    def _load_sentence_model(self):
+        from sentence_transformers import SentenceTransformer
+
+        options = self._load_options('sentence_model')
+        if self.quantized:
+            model = self.quantized_cache.get_or_create(
+                self.sentence_model_name, lambda: SentenceTransformer(self.sentence_model_name, **options)
+            )
+        else:
+            model = SentenceTransformer(self.sentence_model_name, **options)
+            if self.shared_weights:
+                self.shared_weights.share(self.sentence_model_name, model)
+        return instrument_sentence_model(model)
+
+    @staticmethod
+    def _log_model_event(event):
+        size_mb = event['bytes'] / 1024 ** 2
+        resident_mb = event['resident_bytes'] / 1024 ** 2
+        if event['event'] == 'load':
+            print(f"Loaded model '{event['model']}' ({size_mb:.0f} MB) in {event['seconds']}s, resident: {resident_mb:.0f} MB")
+        else:
+            print(f"Evicted model '{event['model']}' ({size_mb:.0f} MB, {event['reason']}), resident: {resident_mb:.0f} MB")
+
+    @timed
     def analyze_sentiment(self, text):
-        return self.sentiment(text)
+        if self.sentiment_cascade:
+            return self.sentiment_cascade.classify([text], self._sentiment_batch)[0]
+        with self.models.use('sentiment') as sentiment:
+            return sentiment(text)
 
+    @timed
     def summarize_text(self, text, max_length=150, min_length=30):
-        return self.summarizer(text, max_length=max_length, min_length=min_length, do_sample=False)
+        with self.models.use('summarizer') as summarizer:
+            return summarizer(text, max_length=max_length, min_length=min_length, do_sample=False)
+
+    @timed
+    def summarize_long_text(self, text, max_length=150, min_length=30, chunk_tokens=900, overlap_sentences=1, max_depth=3):
+        """Summarize a document longer than BART's 1024-token context by map-reduce over sentence chunks"""
+        return summarize_long(
+            self,
+            text,
+            max_length=max_length,
+            min_length=min_length,
+            chunk_tokens=chunk_tokens,
+            overlap_sentences=overlap_sentences,
+            max_depth=max_depth
+        )
+
+    @timed
+    def summarize_compressed_text(self, text, max_length=150, min_length=30, token_budget=400, redundancy=0.85):
+        """Summarize only the most central, non-redundant sentences, up to `token_budget` tokens"""
+        return summarize_compressed(
+            self,
+            text,
+            max_length=max_length,
+            min_length=min_length,
+            token_budget=token_budget,
+            redundancy=redundancy
+        )
 
+    @timed
     def extract_entities(self, text):
-        return self.ner(text)
+        with self.models.use('ner') as ner:
+            return ner(text)
+
+    @timed
+    def extract_entities_long(self, text, window_tokens=400, overlap_tokens=64):
+        """Extract entities from a text longer than BERT's 512-token context with overlapping windows"""
+        from engine.entity_extraction import extract_entities_long
+        return extract_entities_long(self, text, window_tokens=window_tokens, overlap_tokens=overlap_tokens)
 
+    @timed
     def answer_question(self, question, context):
-        return self.qa(question=question, context=context)
+        with self.models.use('qa') as qa:
+            return qa(question=question, context=context)
+
+    @timed
+    def answer_question_long(self, question, context, passage_tokens=300, top_k=3):
+        """Answer a question over a long context by running the QA model only on the most relevant passages"""
+        from engine.question_answering import answer_question_long
+        return answer_question_long(self, question, context, passage_tokens=passage_tokens, top_k=top_k)
+
+    @timed
+    def generate_text(self, prompt, max_length=50, num_return_sequences=1, seed=None, speculative=None, do_sample=None):
+        from transformers import set_seed
+        # do_sample=False decodes greedily, None keeps the model's generation config
+        sampling = {} if do_sample is None else {'do_sample': do_sample}
+        if self._use_speculative(speculative, num_return_sequences):
+            return self._generate_assisted(prompt, max_length, seed, sampling)
+        with self.models.use('generator') as generator:
+            if seed is not None:
+                set_seed(seed)
+            # max_new_tokens=None: the pipeline's default (256 in recent transformers) would override max_length
+            return generator(prompt, max_length=max_length, max_new_tokens=None, num_return_sequences=num_return_sequences,
+                             **sampling)
+
+    def _use_speculative(self, speculative, num_return_sequences):
+        # Assisted generation only extends one sequence at a time
+        return (self.speculative if speculative is None else speculative) and num_return_sequences == 1
+
+    def _generate_assisted(self, prompt, max_length, seed, sampling):
+        from transformers import set_seed
+        with self.models.use('draft_generator') as draft, self.models.use('generator') as generator:
+            draft.model.generation_config.num_assistant_tokens = self.draft_tokens
+            if seed is not None:
+                set_seed(seed)
+            return generator(prompt, max_length=max_length, max_new_tokens=None, assistant_model=draft.model, **sampling)
+
+    def stream_text(self, prompt, max_length=50, temperature=1.0, top_p=1.0):
+        """Generate text from a prompt, yielding chunks as they are decoded"""
+        from engine.streaming import GenerationStream
+        return GenerationStream(
+            self.models,
+            prompt,
+            max_length=max_length,
+            temperature=temperature,
+            top_p=top_p,
+            on_complete=self._record_stream
+        )
+
+    def _record_stream(self, stats):
+        self.generation_stats.append(stats)
+        if stats['time_to_first_token_ms'] is not None:
+            METRICS.observe('nlp_time_to_first_token_seconds', stats['time_to_first_token_ms'] / 1000, task='generator')
+
+    # Batch entry points: a list of inputs in, one result per input out (same shape as the
+    # single-input methods), in the original order. Inputs are bucketed by token length
+    # so each forward pass only pads to similarly sized inputs.
+
+    @timed
+    def analyze_sentiment_batch(self, texts, batch_size=32):
+        if self.sentiment_cascade:
+            return self.sentiment_cascade.classify(texts, functools.partial(self._sentiment_batch, batch_size=batch_size))
+        return self._sentiment_batch(texts, batch_size)
+
+    def _sentiment_batch(self, texts, batch_size=32):
+        with self.models.use('sentiment') as sentiment:
+            return run_bucketed(
+                texts,
+                lambda batch: [[result] for result in sentiment(batch, batch_size=len(batch))],
+                token_lengths(sentiment.tokenizer, texts),
+                batch_size
+            )
+
+    @timed
+    def summarize_batch(self, texts, max_length=150, min_length=30, batch_size=4):
+        with self.models.use('summarizer') as summarizer:
+            def summarize(batch):
+                # Inputs past the model's context are truncated instead of failing the whole batch
+                results = summarizer(batch, max_length=max_length, min_length=min_length, do_sample=False, truncation=True, batch_size=len(batch))
+                return [result if isinstance(result, list) else [result] for result in results]
+
+            return run_bucketed(texts, summarize, token_lengths(summarizer.tokenizer, texts), batch_size)
 
-    def generate_text(self, prompt, max_length=50, num_return_sequences=1):
-        return self.generator(prompt, max_length=max_length, num_return_sequences=num_return_sequences)
+    @timed
+    def extract_entities_batch(self, texts, batch_size=16):
+        with self.models.use('ner') as ner:
+            return run_bucketed(
+                texts,
+                lambda batch: ner(batch, batch_size=len(batch)),
+                token_lengths(ner.tokenizer, texts),
+                batch_size
+            )
 
-    def get_embeddings(self, text_or_texts):
+    @timed
+    def answer_question_batch(self, questions, contexts, batch_size=16):
+        if len(questions) != len(contexts):
+            raise ValueError("questions and contexts must have the same length")
+
+        with self.models.use('qa') as qa:
+            def answer(batch):
+                results = qa(
+                    question=[question for question, _ in batch],
+                    context=[context for _, context in batch],
+                    batch_size=len(batch)
+                )
+                # The pipeline unwraps single-item batches into a plain dict
+                return [results] if isinstance(results, dict) else results
+
+            lengths = token_lengths(qa.tokenizer, [f"{q} {c}" for q, c in zip(questions, contexts)])
+            return run_bucketed(list(zip(questions, contexts)), answer, lengths, batch_size)
+
+    @timed
+    def generate_text_batch(self, prompts, max_length=50, num_return_sequences=1, batch_size=8, seed=None, speculative=None,
+                            do_sample=None):
+        from transformers import set_seed
+        sampling = {} if do_sample is None else {'do_sample': do_sample}
+        if self._use_speculative(speculative, num_return_sequences):
+            return [self._generate_assisted(prompt, max_length, seed, sampling) for prompt in prompts]
+        with self.models.use('generator') as generator:
+            if seed is not None and do_sample is not False:
+                # A seeded sample must not depend on which other prompts share the batch,
+                # so sample each prompt on its own, re-seeded, exactly like generate_text
+                results = []
+                for prompt in prompts:
+                    set_seed(seed)
+                    results.append(generator(prompt, max_length=max_length, max_new_tokens=None,
+                                             num_return_sequences=num_return_sequences, **sampling))
+                return results
+            return run_bucketed(
+                prompts,
+                lambda batch: generator(batch, max_length=max_length, max_new_tokens=None,
+                                        num_return_sequences=num_return_sequences, batch_size=len(batch), **sampling),
+                token_lengths(generator.tokenizer, prompts),
+                batch_size,
+                # max_length counts the padded prompt, so padding would cut a short prompt's
+                # generation short: only prompts of the same token length share a batch
+                exact=True
+            )
+
+    @timed
+    def get_embeddings(self, text_or_texts, batch_size=32):
 
         ## For initial tests of semantic search
         ## I tried to manually calculate and adjust the embedding sizes, until i directly used the sentence transformer from HF
@@ -67,7 +425,28 @@ class NLPEngine:
         #     return torch.mean(torch.tensor(embeddings[0]), dim=0)
         # else:
         #     return torch.stack([torch.mean(torch.tensor(emb), dim=0) for emb in embeddings])
-        return torch.tensor(self.sentence_model.encode(text_or_texts))
+        import torch
+
+        single = isinstance(text_or_texts, str)
+        texts = [normalize_text(text) for text in ([text_or_texts] if single else text_or_texts)]
+        if not texts:
+            return torch.empty((0, 0))
+
+        # Only texts that have never been embedded before go through the model
+        keys = [self.embedding_cache.key(text) for text in texts]
+        cached = self.embedding_cache.get_many(keys)
+        missing = {key: text for key, text in zip(keys, texts) if key not in cached}
+        if missing:
+            with self.models.use('sentence_model') as sentence_model:
+                # encode() already sorts its inputs by length before batching
+                vectors = sentence_model.encode(list(missing.values()), batch_size=batch_size)
+            self.embedding_cache.put_many(list(missing), vectors)
+            cached.update(zip(missing, vectors))
+
+        # from_numpy shares the stacked array's memory instead of copying it again,
+        # and .numpy() on the result is a view as well
+        embeddings = torch.from_numpy(np.stack([cached[key] for key in keys]))
+        return embeddings[0] if single else embeddings
 
 if __name__ == "__main__":
     pass
@@ -1,21 +1,27 @@
 import streamlit as st
-import torch
+import importlib
 import sys
 import os
 
 # Add the parent directory to sys.path
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-# Import components
-from components.sentiment_analyzer import show_sentiment_analyzer
-from components.text_summarizer import show_text_summarizer
-from components.entity_extractor import show_entity_extractor
-from components.question_answerer import show_question_answerer
-from components.text_generator import show_text_generator
-from components.semantic_search import show_semantic_search
+# Task -> (component module, function showing it). Components, and the libraries they
+# use, are only imported the first time their task is selected.
+TASK_COMPONENTS = {
+    "Sentiment Analysis": ("components.sentiment_analyzer", "show_sentiment_analyzer"),
+    "Text Summarization": ("components.text_summarizer", "show_text_summarizer"),
+    "Named Entity Recognition": ("components.entity_extractor", "show_entity_extractor"),
+    "Question Answering": ("components.question_answerer", "show_question_answerer"),
+    "Text Generation": ("components.text_generator", "show_text_generator"),
+    "Semantic Search": ("components.semantic_search", "show_semantic_search"),
+}
 
-# Import NLP Engine
+# Import NLP Engine (torch and transformers are only imported once a model is needed)
 from nlp_engine import NLPEngine
+from engine.scheduler import MicroBatchScheduler
+from engine.instrumentation import METRICS, serve_metrics
+from engine.result_cache import MemoizedEngine, ResultCache
 
 # Set page config
 st.set_page_config(
@@ -28,6 +34,8 @@ st.set_page_config(
 # Cache the NLP Engine initialization
 @st.cache_resource
 def get_nlp_engine():
+    import torch
+
     with st.spinner('Loading NLP models... This might take a while.'):
         # Check for available hardware acceleration
         if torch.cuda.is_available():
@@ -42,9 +50,37 @@ def get_nlp_engine():
         
         return NLPEngine(device=device)
 
+# One scheduler shared by every browser session, so concurrent requests are batched together
+@st.cache_resource
+def get_scheduler():
+    return MicroBatchScheduler(
+        get_nlp_engine(),
+        max_batch_size=int(os.environ.get("NLP_MAX_BATCH_SIZE", 16)),
+        max_wait_ms=float(os.environ.get("NLP_BATCH_MAX_WAIT_MS", 10))
+    )
+
+# Repeated requests (reruns, the example texts) are answered from a result cache shared by every session
+@st.cache_resource
+def get_memoized_engine():
+    if os.environ.get("NLP_RESULT_CACHE", "1") == "0":
+        return get_scheduler()
+    return MemoizedEngine(
+        get_scheduler(),
+        ResultCache(
+            max_items=int(os.environ.get("NLP_RESULT_CACHE_SIZE", 1024)),
+            ttl_seconds=float(os.environ.get("NLP_RESULT_CACHE_TTL", 3600)),
+            cache_dir=os.environ.get("NLP_RESULT_CACHE_DIR")
+        )
+    )
+
+# Prometheus-style metrics at http://localhost:$NLP_METRICS_PORT/metrics, started once per process
+@st.cache_resource
+def get_metrics_server():
+    port = os.environ.get("NLP_METRICS_PORT")
+    return serve_metrics(int(port)) if port else None
+
 def main():
-    # Initialize NLP Engine
-    nlp_engine = get_nlp_engine()
+    get_metrics_server()
     
     # Sidebar
     st.sidebar.title("🤗 HuggingFace Ecosystem - NLP Playground")
@@ -53,14 +89,7 @@ def main():
     # Model selection
     task = st.sidebar.selectbox(
         "Choose NLP Task",
-        [
-            "Sentiment Analysis",
-            "Text Summarization",
-            "Named Entity Recognition",
-            "Question Answering",
-            "Text Generation",
-            "Semantic Search"
-        ]
+        list(TASK_COMPONENTS)
     )
     
     st.sidebar.markdown("---")
@@ -81,19 +110,97 @@ def main():
     unsafe_allow_html=True
     )
     
-    # Main content
-    if task == "Sentiment Analysis":
-        show_sentiment_analyzer(nlp_engine)
-    elif task == "Text Summarization":
-        show_text_summarizer(nlp_engine)
-    elif task == "Named Entity Recognition":
-        show_entity_extractor(nlp_engine)
-    elif task == "Question Answering":
-        show_question_answerer(nlp_engine)
-    elif task == "Text Generation":
-        show_text_generator(nlp_engine)
-    elif task == "Semantic Search":
-        show_semantic_search(nlp_engine)
+    # Initialize NLP Engine (behind the result cache and the micro-batching scheduler),
+    # after the sidebar so it shows while the engine starts
+    nlp_engine = get_memoized_engine()
+
+    # Main content (timed as the "render" stage, model calls included)
+    module_name, function_name = TASK_COMPONENTS[task]
+    show_component = getattr(importlib.import_module(module_name), function_name)
+    with METRICS.span('render', task=task):
+        show_component(nlp_engine)
+
+    # Models are loaded on demand, show what is currently resident
+    show_model_memory(nlp_engine)
+    show_scheduler_stats(nlp_engine)
+    show_result_cache_stats(nlp_engine)
+    if st.sidebar.checkbox("Show performance metrics"):
+        show_performance_metrics()
+
+def show_model_memory(nlp_engine):
+    """Display the resident models and recent load/evict events in the sidebar"""
+    stats = nlp_engine.models.stats()
+    resident_mb = stats['resident_bytes'] / 1024 ** 2
+    budget = stats['memory_budget_bytes']
+    budget_label = f"{budget / 1024 ** 2:.0f} MB" if budget else "no limit"
+
+    with st.sidebar.expander(f"Loaded models ({resident_mb:.0f} MB / {budget_label})"):
+        for name, info in stats['models'].items():
+            st.markdown(f"- `{name}`: {info['bytes'] / 1024 ** 2:.0f} MB")
+        events = list(nlp_engine.models.events)[-5:]
+        if events:
+            st.markdown("**Recent events**")
+            for event in reversed(events):
+                st.markdown(f"- {event['event']} `{event['model']}` ({event['bytes'] / 1024 ** 2:.0f} MB)")
+
+def show_scheduler_stats(scheduler):
+    """Display queue depth and achieved batch sizes of the request scheduler in the sidebar"""
+    stats = scheduler.stats()
+    if not stats:
+        return
+
+    with st.sidebar.expander("Request batching"):
+        st.table([
+            {
+                "Task": task,
+                "Queued": task_stats['queue_depth'],
+                "Requests": task_stats['requests'],
+                "Avg batch": task_stats['mean_batch_size'],
+                "Max batch": task_stats['max_batch_size'],
+                "Avg wait (ms)": task_stats['mean_wait_ms'],
+            }
+            for task, task_stats in stats.items()
+        ])
+
+def show_result_cache_stats(nlp_engine):
+    """Display hit/miss/eviction counters of the result cache in the sidebar"""
+    result_cache = getattr(nlp_engine, 'result_cache', None)
+    if result_cache is None:
+        return
+
+    stats = result_cache.stats()
+    lookups = stats['hits'] + stats['disk_hits'] + stats['misses'] + stats['coalesced']
+    hit_rate = (lookups - stats['misses']) / lookups * 100 if lookups else 0
+    with st.sidebar.expander(f"Result cache ({hit_rate:.0f}% hits)"):
+        st.table([{"Counter": name.replace('_', ' ').capitalize(), "Value": value} for name, value in stats.items()])
+
+def show_performance_metrics():
+    """Display per-stage timings, token counts and batch sizes over the recent requests in the sidebar"""
+    rows = METRICS.snapshot()
+    if not rows:
+        st.sidebar.caption("No requests recorded yet.")
+        return
+
+    with st.sidebar.expander("Performance metrics", expanded=True):
+        # Timings in milliseconds, counts as they are
+        for title, names, scale in [
+            ("Engine calls (ms)", ['nlp_request_seconds'], 1000),
+            ("Stages (ms)", ['nlp_stage_seconds', 'nlp_generation_step_seconds', 'nlp_time_to_first_token_seconds'], 1000),
+            ("Tokens and batch sizes", ['nlp_input_tokens', 'nlp_generated_tokens', 'nlp_batch_size'], 1),
+        ]:
+            table = [
+                {
+                    "Metric": ' '.join([row['name'].replace('nlp_', '')] + list(row['labels'].values())),
+                    "Count": row['count'],
+                    "p50": round(row['p50'] * scale, 1),
+                    "p95": round(row['p95'] * scale, 1),
+                    "p99": round(row['p99'] * scale, 1),
+                }
+                for row in rows if row['name'] in names
+            ]
+            if table:
+                st.markdown(f"**{title}**")
+                st.table(table)
 
 if __name__ == "__main__":
     main()
@@ -17,11 +17,29 @@ def show_entity_extractor(nlp_engine):
         height=150
     )
     
+    # Long document options
+    with st.expander("Long document mode"):
+        long_document = st.checkbox(
+            "Process the text in overlapping windows",
+            value=False,
+            help="BERT only reads the first 512 tokens of its input. In long document mode the text is split into overlapping windows that are processed as one batch, and the entities found in them are merged."
+        )
+        window_tokens = st.slider(
+            "Window size (tokens)",
+            min_value=128,
+            max_value=500,
+            value=400,
+            step=16
+        )
+    
     # Process button
     if st.button("Extract Entities"):
         with st.spinner("Extracting entities..."):
             # Get entities
-            entities = nlp_engine.extract_entities(text_input)
+            if long_document:
+                entities = nlp_engine.extract_entities_long(text_input, window_tokens=window_tokens)
+            else:
+                entities = nlp_engine.extract_entities(text_input)
             
             # Display results
             st.markdown("### Results")
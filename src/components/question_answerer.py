@@ -23,6 +23,27 @@ def show_question_answerer(nlp_engine):
         "What is Paris known for?"
     )
     
+    # Long document options
+    with st.expander("Long document mode"):
+        long_document = st.checkbox(
+            "Only read the most relevant passages",
+            value=False,
+            help="For long contexts: the context is split into passages, the passages most similar to the question are picked with sentence embeddings, and the QA model only reads those."
+        )
+        passage_tokens = st.slider(
+            "Passage size (tokens)",
+            min_value=100,
+            max_value=400,
+            value=300,
+            step=50
+        )
+        top_k = st.slider(
+            "Passages to read",
+            min_value=1,
+            max_value=10,
+            value=3
+        )
+    
     # Process button
     if st.button("Answer Question"):
         if not context or not question:
@@ -30,7 +51,15 @@ def show_question_answerer(nlp_engine):
         else:
             with st.spinner("Finding answer..."):
                 # Get answer
-                answer = nlp_engine.answer_question(question=question, context=context)
+                if long_document:
+                    answer = nlp_engine.answer_question_long(
+                        question=question,
+                        context=context,
+                        passage_tokens=passage_tokens,
+                        top_k=top_k
+                    )
+                else:
+                    answer = nlp_engine.answer_question(question=question, context=context)
                 
                 # Display results
                 st.markdown("### Answer")
@@ -38,6 +67,8 @@ def show_question_answerer(nlp_engine):
                 
                 # Display confidence score
                 st.markdown(f"**Confidence Score**: {round(answer['score']*100, 2)}%")
+                if 'passages_read' in answer:
+                    st.caption(f"Read {answer['passages_read']} of {answer['passages_total']} passages")
                 
                 # Display answer in context
                 st.markdown("### Answer in Context")
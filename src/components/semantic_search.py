@@ -1,6 +1,69 @@
 import streamlit as st
 import torch
+import atexit
+import os
+import shutil
+import tempfile
+import weakref
 from utils.ui_helpers import plot_similarity_heatmap
+from engine.exact_search import MemmapExactIndex
+from engine.near_duplicates import embed_collection, exact_near_duplicates, find_near_duplicates
+from engine.quantized_embeddings import QuantizedEmbeddingIndex
+from engine.vector_index import IVFIndex
+
+# Cache the corpus index so a new query doesn't rebuild it
+@st.cache_resource(max_entries=4, show_spinner=False)
+def get_corpus_index(_nlp_engine, corpus):
+    """Embed the corpus and build an approximate nearest-neighbour index over it"""
+    corpus_embeddings = _nlp_engine.get_embeddings(list(corpus)).numpy()
+    return IVFIndex(corpus_embeddings.shape[1]).build(corpus_embeddings)
+
+# Files of the memory-mapped indexes, in one directory removed when the app exits
+_INDEX_DIR = None
+
+def _remove_index_files(path):
+    for file_path in (path, path + '.json'):
+        if os.path.exists(file_path):
+            os.remove(file_path)
+
+def _build_file_backed_index(_nlp_engine, corpus, make_index, chunk_size=4096):
+    """Embed the corpus chunk by chunk into `make_index(path, dim)`, an index storing its vectors in a file at `path`.
+
+    The file is deleted once the index is garbage collected (evicted from the
+    Streamlit cache), or with the whole index directory when the app exits.
+    """
+    global _INDEX_DIR
+    if _INDEX_DIR is None:
+        _INDEX_DIR = tempfile.mkdtemp(prefix='corpus-indexes-')
+        atexit.register(shutil.rmtree, _INDEX_DIR, ignore_errors=True)
+    with tempfile.NamedTemporaryFile(suffix='.f32', prefix='corpus-', dir=_INDEX_DIR, delete=False) as f:
+        path = f.name
+
+    index = None
+    for start in range(0, len(corpus), chunk_size):
+        chunk_embeddings = _nlp_engine.get_embeddings(list(corpus[start:start + chunk_size])).numpy()
+        if index is None:
+            index = make_index(path, chunk_embeddings.shape[1])
+        index.add(chunk_embeddings)
+    if index is None:
+        _remove_index_files(path)
+    else:
+        weakref.finalize(index, _remove_index_files, path)
+    return index
+
+@st.cache_resource(max_entries=4, show_spinner=False)
+def get_exact_corpus_index(_nlp_engine, corpus, chunk_size=4096):
+    """Embed the corpus chunk by chunk into a memory-mapped file for exact search"""
+    return _build_file_backed_index(
+        _nlp_engine, corpus, lambda path, dim: MemmapExactIndex(path, dim=dim, dtype='float16'), chunk_size
+    )
+
+@st.cache_resource(max_entries=4, show_spinner=False)
+def get_compressed_corpus_index(_nlp_engine, corpus, precision, chunk_size=4096):
+    """Embed the corpus chunk by chunk into compact codes, with the float32 embeddings memory-mapped for rescoring"""
+    return _build_file_backed_index(
+        _nlp_engine, corpus, lambda path, dim: QuantizedEmbeddingIndex(dim, precision, full_precision_path=path), chunk_size
+    )
 
 def show_semantic_search(nlp_engine):
     """Display the semantic search UI component"""
@@ -12,7 +75,7 @@ def show_semantic_search(nlp_engine):
     """)
     
     # Create tabs for different modes
-    tab1, tab2 = st.tabs(["Semantic Search", "Text Similarity"])
+    tab1, tab2, tab3 = st.tabs(["Semantic Search", "Text Similarity", "Near Duplicates"])
     
     # TAB 1: Semantic Search
     with tab1:
@@ -35,37 +98,65 @@ def show_semantic_search(nlp_engine):
             "What is the forecast for today?"
         )
         
+        # Search settings
+        with st.expander("Search settings"):
+            search_method = st.radio(
+                "Search method",
+                ["Approximate", "Exact", "Compressed"],
+                horizontal=True,
+                help="Approximate search uses a clustered index and is much faster on large corpora. Exact search scans every embedding (from a memory-mapped file) and always returns the true best matches. Compressed search keeps the embeddings in memory at a lower precision and rescores the best candidates exactly."
+            )
+            precision = st.selectbox(
+                "Storage precision",
+                ["int8", "float16", "binary"],
+                help="Compressed search only: int8 uses 4x and binary 32x less memory than float32 embeddings. Binary candidates are pre-ranked by Hamming distance. The final scores are always exact."
+            )
+            top_k = st.slider(
+                "Number of results",
+                min_value=1,
+                max_value=50,
+                value=10,
+                help="How many of the most similar texts to show"
+            )
+            nprobe = st.slider(
+                "Clusters to search",
+                min_value=1,
+                max_value=64,
+                value=8,
+                help="Approximate search only: large corpora are split into clusters and only the clusters closest to the query are searched. More clusters means better recall but slower search."
+            )
+        
         # Process button
         if st.button("Search", key="search_button"):
             if not corpus or not query:
                 st.error("Please provide both corpus texts and a search query.")
             else:
                 with st.spinner("Computing similarities..."):
-                    # Get embeddings
+                    # Get embeddings (the corpus index is only rebuilt when the corpus changes)
                     query_embedding = nlp_engine.get_embeddings(query)
-                    corpus_embeddings = nlp_engine.get_embeddings(corpus)
                     
-                    # Ensure query embedding is 2D for comparison
-                    if query_embedding.ndim == 1:
-                        query_embedding = query_embedding.unsqueeze(0)
-                    
-                    # Compute similarities
-                    similarities = torch.nn.functional.cosine_similarity(
-                        query_embedding, 
-                        corpus_embeddings, 
-                        dim=1
-                    ).tolist()
+                    # Find the most similar texts
+                    if search_method == "Exact":
+                        index = get_exact_corpus_index(nlp_engine, tuple(corpus))
+                        scores, ids = index.search(query_embedding.numpy(), k=top_k)
+                    elif search_method == "Compressed":
+                        index = get_compressed_corpus_index(nlp_engine, tuple(corpus), precision)
+                        scores, ids = index.search(query_embedding.numpy(), k=top_k)
+                    else:
+                        index = get_corpus_index(nlp_engine, tuple(corpus))
+                        scores, ids = index.search(query_embedding.numpy(), k=top_k, nprobe=nprobe)
+                    matches = [(corpus[i], float(score)) for i, score in zip(ids[0], scores[0]) if i >= 0]
                     
                     # Display results
                     st.markdown("### Search Results")
                     
                     # Plot similarities
-                    fig = plot_similarity_heatmap(query, corpus, similarities)
+                    fig = plot_similarity_heatmap(query, [text for text, _ in matches], [score for _, score in matches])
                     st.plotly_chart(fig, use_container_width=True)
                     
                     # Show sorted results in a table
                     results = []
-                    for i, (text, score) in enumerate(sorted(zip(corpus, similarities), key=lambda x: x[1], reverse=True)):
+                    for i, (text, score) in enumerate(matches):
                         results.append({
                             "Rank": i + 1,
                             "Text": text,
@@ -135,6 +226,48 @@ def show_semantic_search(nlp_engine):
                     else:
                         st.error(f"Similarity Score: {similarity_percentage}% (Not Very Similar)")
     
+    # TAB 3: Near Duplicates
+    with tab3:
+        st.markdown("### Find Near-Duplicate Texts")
+        
+        # Collection input
+        collection_text = st.text_area(
+            "Enter texts (one text per line)",
+            "The meeting has been moved to Friday afternoon.\nThe meeting was moved to Friday afternoon.\nOur quarterly revenue grew by 12 percent.\nThe meeting has been rescheduled to Friday afternoon.\nQuarterly revenue grew 12%.",
+            height=150,
+            help="Texts whose embeddings are at least as similar as the threshold are grouped together"
+        )
+        collection = [text.strip() for text in collection_text.split('\n') if text.strip()]
+        
+        threshold = st.slider(
+            "Similarity threshold",
+            min_value=0.5,
+            max_value=1.0,
+            value=0.9,
+            step=0.01,
+            help="Minimum cosine similarity for two texts to count as near-duplicates"
+        )
+        
+        # Process button
+        if st.button("Find Duplicates", key="duplicates_button"):
+            if len(collection) < 2:
+                st.error("Please provide at least two texts.")
+            else:
+                with st.spinner("Comparing texts..."):
+                    vectors = embed_collection(nlp_engine, collection)
+                    # Small sets compare every pair, larger ones only texts sharing an LSH bucket
+                    if len(collection) <= 5000:
+                        groups, _ = exact_near_duplicates(vectors, threshold)
+                    else:
+                        groups, _ = find_near_duplicates(vectors, threshold)
+                    
+                    st.markdown("### Duplicate Groups")
+                    if not groups:
+                        st.info("No near-duplicates found at this threshold.")
+                    for number, group in enumerate(groups):
+                        st.markdown(f"**Group {number + 1}** ({len(group)} texts)")
+                        st.table([{"Line": i + 1, "Text": collection[i]} for i in group])
+    
     # Example section
     with st.expander("Example texts to try"):
         st.markdown("""
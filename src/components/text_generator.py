@@ -64,23 +64,33 @@ def show_text_generator(nlp_engine):
         if not prompt:
             st.error("Please provide a prompt.")
         else:
-            with st.spinner("Generating text..."):
-                # Get generated text
-                # Note: The current NLPEngine implementation doesn't support temperature and top_p,
-                # but we're adding UI controls for future enhancement
-                generated_texts = nlp_engine.generate_text(
+            # Display results
+            st.markdown("### Generated Text")
+            
+            for i in range(num_sequences):
+                st.markdown(f"**Completion {i+1}:**")
+                placeholder = st.empty()
+                
+                # Stream the completion as it is generated. Leaving the `with` block early
+                # (e.g. the page is rerun mid-generation) cancels the generation.
+                generated_text = prompt
+                with nlp_engine.stream_text(
                     prompt,
                     max_length=max_length,
-                    num_return_sequences=num_sequences
-                )
-                
-                # Display results
-                st.markdown("### Generated Text")
+                    temperature=temperature,
+                    top_p=top_p
+                ) as stream:
+                    for chunk in stream:
+                        generated_text += chunk
+                        placeholder.markdown(generated_text)
                 
-                for i, text in enumerate(generated_texts):
-                    st.markdown(f"**Completion {i+1}:**")
-                    st.markdown(f"{text['generated_text']}")
-                    st.markdown("---")
+                stats = stream.stats
+                if stats and stats['time_to_first_token_ms'] is not None:
+                    st.caption(
+                        f"First token after {stats['time_to_first_token_ms']:.0f} ms · "
+                        f"{stats['tokens']} tokens · {stats['tokens_per_sec'] or 0:.1f} tokens/sec"
+                    )
+                st.markdown("---")
     
     # Example section
     with st.expander("Example prompts to try"):
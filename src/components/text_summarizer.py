@@ -46,6 +46,48 @@ The quick brown fox jumps over the lazy dog. The quick brown fox jumps over the
             help="Maximum length of the summary in words"
         )
     
+    # Long document options
+    with st.expander("Long document mode"):
+        long_document = st.checkbox(
+            "Summarize in chunks",
+            value=False,
+            help="BART only reads the first 1024 tokens of its input. In long document mode the text is split into chunks on sentence boundaries, each chunk is summarized and the partial summaries are summarized again."
+        )
+        chunk_tokens = st.slider(
+            "Chunk size (tokens)",
+            min_value=200,
+            max_value=1000,
+            value=900,
+            step=50
+        )
+        overlap_sentences = st.slider(
+            "Overlap between chunks (sentences)",
+            min_value=0,
+            max_value=5,
+            value=1
+        )
+        max_depth = st.slider(
+            "Maximum reduction rounds",
+            min_value=1,
+            max_value=5,
+            value=3
+        )
+    
+    # Pre-compression options
+    with st.expander("Pre-compression"):
+        compress = st.checkbox(
+            "Only summarize the most informative sentences",
+            value=False,
+            help="Sentences are ranked by how central they are to the text (sentence embeddings), near-repeats are dropped, and only the top sentences up to the token budget are passed to BART. Shorter inputs are summarized faster."
+        )
+        token_budget = st.slider(
+            "Token budget",
+            min_value=100,
+            max_value=1000,
+            value=400,
+            step=50
+        )
+    
     # Process button
     if st.button("Generate Summary"):
         if len(text_input.split()) < min_length:
@@ -53,19 +95,42 @@ The quick brown fox jumps over the lazy dog. The quick brown fox jumps over the
         else:
             with st.spinner("Generating summary..."):
                 # Get summary
-                summary_result = nlp_engine.summarize_text(
-                    text_input,
-                    max_length=max_length,
-                    min_length=min_length
-                )
+                stages = None
+                compression = None
+                if long_document:
+                    long_summary = nlp_engine.summarize_long_text(
+                        text_input,
+                        max_length=max_length,
+                        min_length=min_length,
+                        chunk_tokens=chunk_tokens,
+                        overlap_sentences=overlap_sentences,
+                        max_depth=max_depth
+                    )
+                    summary_text = long_summary['summary_text']
+                    stages = long_summary['stages']
+                elif compress:
+                    compression = nlp_engine.summarize_compressed_text(
+                        text_input,
+                        max_length=max_length,
+                        min_length=min_length,
+                        token_budget=token_budget
+                    )
+                    summary_text = compression['summary_text']
+                else:
+                    summary_result = nlp_engine.summarize_text(
+                        text_input,
+                        max_length=max_length,
+                        min_length=min_length
+                    )
+                    summary_text = summary_result[0]['summary_text']
                 
                 # Display results
                 st.markdown("### Summary")
-                st.info(summary_result[0]['summary_text'])
+                st.info(summary_text)
                 
                 # Display statistics
                 input_word_count = len(text_input.split())
-                summary_word_count = len(summary_result[0]['summary_text'].split())
+                summary_word_count = len(summary_text.split())
                 reduction = round((1 - summary_word_count / input_word_count) * 100, 1)
                 
                 st.markdown(f"""
@@ -74,6 +139,30 @@ The quick brown fox jumps over the lazy dog. The quick brown fox jumps over the
                 - Summary: {summary_word_count} words
                 - Reduction: {reduction}%
                 """)
+                
+                # Display what the pre-compression kept
+                if compression:
+                    st.markdown(f"""
+                    **Pre-compression:**
+                    - Sentences kept: {compression['sentences_kept']} of {compression['sentences_total']}
+                    - Tokens passed to BART: {compression['kept_tokens']} of {compression['input_tokens']}
+                    """)
+                    if compression['truncated']:
+                        st.caption("No sentence fit the token budget, the most central one was cut to fit.")
+                
+                # Display per-stage timings of the long document mode
+                if stages:
+                    st.markdown("**Stages:**")
+                    st.table([
+                        {
+                            "Stage": stage['stage'],
+                            "Round": stage['depth'],
+                            "Inputs": stage['inputs'],
+                            "Input tokens": stage['input_tokens'],
+                            "Time (s)": stage['seconds'],
+                        }
+                        for stage in stages
+                    ])
     
     # Example section
     with st.expander("Example texts to try"):
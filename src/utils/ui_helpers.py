@@ -1,13 +1,15 @@
 import streamlit as st
-import pandas as pd
-import plotly.express as px
-import matplotlib.pyplot as plt
 import json
 from typing import Dict, List, Any, Union
-import torch
+from engine.instrumentation import timed_stage
+
+# pandas and plotly are imported inside the functions that use them, so loading a
+# component doesn't pay for them until it actually displays a table or a chart
 
 def display_json_as_table(data: Union[Dict, List]):
     """Display JSON data as a formatted table"""
+    import pandas as pd
+
     if isinstance(data, list):
         # Convert list of dicts to dataframe if possible
         try:
@@ -25,8 +27,11 @@ def display_json_as_table(data: Union[Dict, List]):
             # Fall back to JSON display
             st.json(data)
 
+@timed_stage('ui_postprocess')
 def format_sentiment_result(result: List[Dict]):
     """Format sentiment analysis result for display"""
+    import pandas as pd
+
     if not result:
         return {}
     
@@ -51,8 +56,11 @@ def format_sentiment_result(result: List[Dict]):
         'score': round(item['score'] * 100, 2)
     }
 
+@timed_stage('ui_postprocess')
 def plot_sentiment_gauge(score: float, color: str):
     """Create a gauge chart for sentiment score"""
+    import plotly.express as px
+
     fig = px.pie(
         values=[score, 100-score],
         names=['Score', ''],
@@ -69,8 +77,11 @@ def plot_sentiment_gauge(score: float, color: str):
     
     return fig
 
+@timed_stage('ui_postprocess')
 def format_ner_results(ner_results: List[Dict]):
     """Format NER results for display"""
+    import pandas as pd
+
     # Convert to DataFrame for easier display
     if not ner_results:
         return pd.DataFrame()
@@ -87,41 +98,45 @@ def format_ner_results(ner_results: List[Dict]):
     
     return pd.DataFrame(entities_data)
 
+@timed_stage('ui_postprocess')
 def highlight_entities_in_text(text: str, entities: List[Dict]):
     """Highlight entities in text for display"""
     if not entities:
         return text
     
-    # Sort entities by start position in reverse order
-    # to avoid index shifting when replacing
-    sorted_entities = sorted(entities, key=lambda x: x['start'], reverse=True)
+    # Define color based on entity type
+    color_map = {
+        'PER': '#FFD700',  # Person - Gold
+        'ORG': '#98FB98',  # Organization - Pale Green
+        'LOC': '#ADD8E6',  # Location - Light Blue
+        'MISC': '#FFA07A'   # Miscellaneous - Light Salmon
+    }
     
-    # Convert text to HTML with highlights
-    html_text = text
-    for entity in sorted_entities:
+    # Build the HTML in one pass from left to right: the text before each entity,
+    # then the highlighted entity, joined once at the end
+    parts = []
+    position = 0
+    for entity in sorted(entities, key=lambda x: x['start']):
         start = entity['start']
         end = entity['end']
-        entity_text = text[start:end]
+        if start < position:
+            continue  # Overlaps the previous entity
         entity_type = entity['entity_group']
-        
-        # Define color based on entity type
-        color_map = {
-            'PER': '#FFD700',  # Person - Gold
-            'ORG': '#98FB98',  # Organization - Pale Green
-            'LOC': '#ADD8E6',  # Location - Light Blue
-            'MISC': '#FFA07A'   # Miscellaneous - Light Salmon
-        }
-        
         color = color_map.get(entity_type, '#D3D3D3')  # Default to light gray
         
-        # Replace text with highlighted version
-        highlight = f'<span style="background-color: {color}; padding: 0px 2px; border-radius: 3px;" title="{entity_type} ({round(entity["score"]*100)}%)">{entity_text}</span>'
-        html_text = html_text[:start] + highlight + html_text[end:]
+        parts.append(text[position:start])
+        parts.append(f'<span style="background-color: {color}; padding: 0px 2px; border-radius: 3px;" title="{entity_type} ({round(entity["score"]*100)}%)">{text[start:end]}</span>')
+        position = end
+    parts.append(text[position:])
     
-    return html_text
+    return ''.join(parts)
 
+@timed_stage('ui_postprocess')
 def plot_similarity_heatmap(query: str, texts: List[str], similarities: List[float]):
     """Create a bar chart for similarity scores"""
+    import pandas as pd
+    import plotly.express as px
+
     # Create a DataFrame with the data
     df = pd.DataFrame({
         'Text': texts,
@@ -149,6 +164,7 @@ def plot_similarity_heatmap(query: str, texts: List[str], similarities: List[flo
     
     return fig
 
+@timed_stage('ui_postprocess')
 def display_text_with_answer(context: str, answer: Dict):
     """Display context text with highlighted answer"""
     if not answer or 'start' not in answer or 'end' not in answer:
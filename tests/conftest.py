@@ -0,0 +1,21 @@
+import os
+import sys
+
+import pytest
+
+# Import the engine and benchmark packages from the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture(scope='session')
+def tiny_engine(tmp_path_factory):
+    """An NLPEngine running offline on the tiny random models from benchmarks/tiny_models.py"""
+    for module in ('torch', 'transformers', 'sentence_transformers', 'tokenizers'):
+        pytest.importorskip(module)
+    os.environ['HF_HUB_OFFLINE'] = '1'
+    os.environ['TRANSFORMERS_OFFLINE'] = '1'
+    from benchmarks.tiny_models import load_or_build_tiny_models
+    from nlp_engine import NLPEngine
+
+    model_ids = load_or_build_tiny_models(str(tmp_path_factory.mktemp('tiny-models')))
+    return NLPEngine(device=-1, embedding_cache_dir=False, quantized=False, speculative=False, model_ids=model_ids)
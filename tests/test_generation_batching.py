@@ -0,0 +1,45 @@
+SHORT_PROMPT = "Hi"
+LONG_PROMPT = "The city council voted to approve the development project after a long debate about traffic, jobs and parks."
+
+
+def test_batched_greedy_generation_matches_single_calls(tiny_engine):
+    # A short prompt batched with a long one must not lose new tokens to the long prompt's padding
+    batched = tiny_engine.generate_text_batch([SHORT_PROMPT, LONG_PROMPT], max_length=40, do_sample=False)
+    assert batched[0] == tiny_engine.generate_text(SHORT_PROMPT, max_length=40, do_sample=False)
+    assert batched[1] == tiny_engine.generate_text(LONG_PROMPT, max_length=40, do_sample=False)
+
+
+def test_scheduled_generation_matches_single_calls(tiny_engine):
+    from engine.scheduler import MicroBatchScheduler
+
+    scheduler = MicroBatchScheduler(tiny_engine, max_wait_ms=200)
+    try:
+        # Queued together, so the scheduler runs them as one generate_text_batch call
+        futures = [scheduler.submit('generate_text', prompt, max_length=40, do_sample=False)
+                   for prompt in (SHORT_PROMPT, LONG_PROMPT)]
+        results = [future.result() for future in futures]
+    finally:
+        scheduler.shutdown()
+    assert scheduler.stats()['generate_text']['batches'] == 1
+    assert results[0] == tiny_engine.generate_text(SHORT_PROMPT, max_length=40, do_sample=False)
+    assert results[1] == tiny_engine.generate_text(LONG_PROMPT, max_length=40, do_sample=False)
+
+
+def test_memoized_batched_generation_matches_single_calls(tiny_engine):
+    from concurrent.futures import ThreadPoolExecutor
+
+    from engine.result_cache import MemoizedEngine, ResultCache
+    from engine.scheduler import MicroBatchScheduler
+
+    scheduler = MicroBatchScheduler(tiny_engine, max_wait_ms=200)
+    memoized = MemoizedEngine(scheduler, ResultCache())
+    prompts = (SHORT_PROMPT, LONG_PROMPT)
+    try:
+        with ThreadPoolExecutor(max_workers=2) as pool:
+            list(pool.map(lambda prompt: memoized.generate_text(prompt, max_length=40, do_sample=False), prompts))
+        # Served from the cache, filled by the batched call
+        cached = [memoized.generate_text(prompt, max_length=40, do_sample=False) for prompt in prompts]
+    finally:
+        scheduler.shutdown()
+    assert memoized.result_cache.stats()['hits'] == 2
+    assert cached == [tiny_engine.generate_text(prompt, max_length=40, do_sample=False) for prompt in prompts]
@@ -0,0 +1,29 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip('numpy')
+
+from engine.server import NLPServer
+
+
+def _exchange(raw_request):
+    """Send `raw_request` to a server on an ephemeral port, return the raw response"""
+    async def run():
+        server = NLPServer(engine=None)
+        listener = await asyncio.start_server(server._handle_connection, '127.0.0.1', 0)
+        port = listener.sockets[0].getsockname()[1]
+        async with listener:
+            reader, writer = await asyncio.open_connection('127.0.0.1', port)
+            writer.write(raw_request)
+            await writer.drain()
+            response = await asyncio.wait_for(reader.read(), timeout=5)
+            writer.close()
+            return response
+    return asyncio.run(run())
+
+
+def test_negative_content_length_is_a_bad_request():
+    response = _exchange(b"POST /sentiment HTTP/1.1\r\nContent-Length: -5\r\n\r\n")
+    assert response.startswith(b"HTTP/1.1 400 ")
+    assert b"Invalid Content-Length" in response